@@ -14,7 +14,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rproject.proto\"\xa4\x01\n\x14ProtoUserInformation\x12\x0f\n\x07user_id\x18\x01 \x01(\x04\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x10\n\x08\x62irthday\x18\x03 \x01(\r\x12,\n\x06gender\x18\x04 \x01(\x0e\x32\x1c.ProtoUserInformation.Gender\")\n\x06Gender\x12\x08\n\x04MALE\x10\x00\x12\n\n\x06\x46\x45MALE\x10\x01\x12\t\n\x05OTHER\x10\x02\"\x97\x01\n\rProtoSnapshot\x12\x10\n\x08\x64\x61tetime\x18\x01 \x01(\x04\x12\x13\n\x04pose\x18\x02 \x01(\x0b\x32\x05.Pose\x12 \n\x0b\x63olor_image\x18\x03 \x01(\x0b\x32\x0b.ColorImage\x12 \n\x0b\x64\x65pth_image\x18\x04 \x01(\x0b\x32\x0b.DepthImage\x12\x1b\n\x08\x66\x65\x65lings\x18\x05 \x01(\x0b\x32\t.Feelings\"\xb8\x01\n\x04Pose\x12&\n\x0btranslation\x18\x01 \x01(\x0b\x32\x11.Pose.Translation\x12 \n\x08rotation\x18\x02 \x01(\x0b\x32\x0e.Pose.Rotation\x1a.\n\x0bTranslation\x12\t\n\x01x\x18\x01 \x01(\x01\x12\t\n\x01y\x18\x02 \x01(\x01\x12\t\n\x01z\x18\x03 \x01(\x01\x1a\x36\n\x08Rotation\x12\t\n\x01x\x18\x01 \x01(\x01\x12\t\n\x01y\x18\x02 \x01(\x01\x12\t\n\x01z\x18\x03 \x01(\x01\x12\t\n\x01w\x18\x04 \x01(\x01\"9\n\nColorImage\x12\r\n\x05width\x18\x01 \x01(\r\x12\x0e\n\x06height\x18\x02 \x01(\r\x12\x0c\n\x04\x64\x61ta\x18\x03 \x01(\x0c\"9\n\nDepthImage\x12\r\n\x05width\x18\x01 \x01(\r\x12\x0e\n\x06height\x18\x02 \x01(\r\x12\x0c\n\x04\x64\x61ta\x18\x03 \x03(\x02\"Q\n\x08\x46\x65\x65lings\x12\x0e\n\x06hunger\x18\x01 \x01(\x02\x12\x0e\n\x06thirst\x18\x02 \x01(\x02\x12\x12\n\nexhaustion\x18\x03 \x01(\x02\x12\x11\n\thappiness\x18\x04 \x01(\x02\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rproject.proto\"\xa4\x01\n\x14ProtoUserInformation\x12\x0f\n\x07user_id\x18\x01 \x01(\x04\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x10\n\x08\x62irthday\x18\x03 \x01(\r\x12,\n\x06gender\x18\x04 \x01(\x0e\x32\x1c.ProtoUserInformation.Gender\")\n\x06Gender\x12\x08\n\x04MALE\x10\x00\x12\n\n\x06\x46\x45MALE\x10\x01\x12\t\n\x05OTHER\x10\x02\"\x97\x01\n\rProtoSnapshot\x12\x10\n\x08\x64\x61tetime\x18\x01 \x01(\x04\x12\x13\n\x04pose\x18\x02 \x01(\x0b\x32\x05.Pose\x12 \n\x0b\x63olor_image\x18\x03 \x01(\x0b\x32\x0b.ColorImage\x12 \n\x0b\x64\x65pth_image\x18\x04 \x01(\x0b\x32\x0b.DepthImage\x12\x1b\n\x08\x66\x65\x65lings\x18\x05 \x01(\x0b\x32\t.Feelings\"h\n\x12ProtoSnapshotBatch\x12/\n\x10user_information\x18\x01 \x01(\x0b\x32\x15.ProtoUserInformation\x12!\n\tsnapshots\x18\x02 \x03(\x0b\x32\x0e.ProtoSnapshot\"\xb8\x01\n\x04Pose\x12&\n\x0btranslation\x18\x01 \x01(\x0b\x32\x11.Pose.Translation\x12 \n\x08rotation\x18\x02 \x01(\x0b\x32\x0e.Pose.Rotation\x1a.\n\x0bTranslation\x12\t\n\x01x\x18\x01 \x01(\x01\x12\t\n\x01y\x18\x02 \x01(\x01\x12\t\n\x01z\x18\x03 \x01(\x01\x1a\x36\n\x08Rotation\x12\t\n\x01x\x18\x01 \x01(\x01\x12\t\n\x01y\x18\x02 \x01(\x01\x12\t\n\x01z\x18\x03 \x01(\x01\x12\t\n\x01w\x18\x04 \x01(\x01\"\x96\x01\n\nColorImage\x12\r\n\x05width\x18\x01 \x01(\r\x12\x0e\n\x06height\x18\x02 \x01(\r\x12\x0c\n\x04\x64\x61ta\x18\x03 \x01(\x0c\x12\x11\n\tdata_hash\x18\x04 \x01(\x0c\x12\"\n\x06\x66ormat\x18\x05 \x01(\x0e\x32\x12.ColorImage.Format\"$\n\x06\x46ormat\x12\x07\n\x03RAW\x10\x00\x12\x08\n\x04JPEG\x10\x01\x12\x07\n\x03PNG\x10\x02\"\xbb\x01\n\nDepthImage\x12\r\n\x05width\x18\x01 \x01(\r\x12\x0e\n\x06height\x18\x02 \x01(\r\x12\x0c\n\x04\x64\x61ta\x18\x03 \x03(\x02\x12\x13\n\x0bpacked_data\x18\x04 \x01(\x0c\x12-\n\x0fpacked_encoding\x18\x05 \x01(\x0e\x32\x14.DepthImage.Encoding\"<\n\x08\x45ncoding\x12\x0b\n\x07\x46LOAT32\x10\x00\x12\x0b\n\x07\x46LOAT16\x10\x01\x12\x16\n\x12UINT16_MILLIMETRES\x10\x02\"Q\n\x08\x46\x65\x65lings\x12\x0e\n\x06hunger\x18\x01 \x01(\x02\x12\x0e\n\x06thirst\x18\x02 \x01(\x02\x12\x12\n\nexhaustion\x18\x03 \x01(\x02\x12\x11\n\thappiness\x18\x04 \x01(\x02\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -27,16 +27,22 @@ if _descriptor._USE_C_DESCRIPTORS == False:
   _globals['_PROTOUSERINFORMATION_GENDER']._serialized_end=182
   _globals['_PROTOSNAPSHOT']._serialized_start=185
   _globals['_PROTOSNAPSHOT']._serialized_end=336
-  _globals['_POSE']._serialized_start=339
-  _globals['_POSE']._serialized_end=523
-  _globals['_POSE_TRANSLATION']._serialized_start=421
-  _globals['_POSE_TRANSLATION']._serialized_end=467
-  _globals['_POSE_ROTATION']._serialized_start=469
-  _globals['_POSE_ROTATION']._serialized_end=523
-  _globals['_COLORIMAGE']._serialized_start=525
-  _globals['_COLORIMAGE']._serialized_end=582
-  _globals['_DEPTHIMAGE']._serialized_start=584
-  _globals['_DEPTHIMAGE']._serialized_end=641
-  _globals['_FEELINGS']._serialized_start=643
-  _globals['_FEELINGS']._serialized_end=724
+  _globals['_PROTOSNAPSHOTBATCH']._serialized_start=338
+  _globals['_PROTOSNAPSHOTBATCH']._serialized_end=442
+  _globals['_POSE']._serialized_start=445
+  _globals['_POSE']._serialized_end=629
+  _globals['_POSE_TRANSLATION']._serialized_start=527
+  _globals['_POSE_TRANSLATION']._serialized_end=573
+  _globals['_POSE_ROTATION']._serialized_start=575
+  _globals['_POSE_ROTATION']._serialized_end=629
+  _globals['_COLORIMAGE']._serialized_start=632
+  _globals['_COLORIMAGE']._serialized_end=782
+  _globals['_COLORIMAGE_FORMAT']._serialized_start=746
+  _globals['_COLORIMAGE_FORMAT']._serialized_end=782
+  _globals['_DEPTHIMAGE']._serialized_start=785
+  _globals['_DEPTHIMAGE']._serialized_end=972
+  _globals['_DEPTHIMAGE_ENCODING']._serialized_start=912
+  _globals['_DEPTHIMAGE_ENCODING']._serialized_end=972
+  _globals['_FEELINGS']._serialized_start=974
+  _globals['_FEELINGS']._serialized_end=1055
 # @@protoc_insertion_point(module_scope)
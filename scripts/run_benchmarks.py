@@ -0,0 +1,205 @@
+import argparse
+import io
+import os
+import struct
+import tempfile
+import timeit
+
+import numpy as np
+
+from src.constants import FLOAT_SIZE_IN_BYTES
+from src.drivers import ProtobufDriver
+from src.snapshot import Snapshot
+from src.utils import from_bytes, swap_red_and_blue
+
+DEPTH_IMAGE_WIDTH = 224
+DEPTH_IMAGE_HEIGHT = 172
+COLOR_IMAGE_WIDTH = 1920
+COLOR_IMAGE_HEIGHT = 1080
+
+
+def depth_image_per_pixel(file: io.BytesIO, num_pixels: int) -> tuple:
+    # The original decoding path: one read and one unpack per pixel.
+    depth_image = []
+    for _ in range(num_pixels):
+        depth_image.append(
+            from_bytes(
+                data=file.read(FLOAT_SIZE_IN_BYTES),
+                data_type="float",
+                endianness="<",
+            )
+        )
+    return tuple(depth_image)
+
+
+def depth_image_vectorized(file: io.BytesIO, num_pixels: int) -> np.ndarray:
+    data = file.read(FLOAT_SIZE_IN_BYTES * num_pixels)
+    return np.frombuffer(data, dtype="<f4", count=num_pixels)
+
+
+def depth_image_vectorized_tuple(file: io.BytesIO, num_pixels: int) -> tuple:
+    # Materializing the pixels as a tuple of Python floats.
+    return tuple(depth_image_vectorized(file, num_pixels).tolist())
+
+
+def benchmark_depth(repeat: int):
+    num_pixels = DEPTH_IMAGE_WIDTH * DEPTH_IMAGE_HEIGHT
+    data = struct.pack(
+        f"<{num_pixels}f", *np.random.rand(num_pixels).tolist()
+    )
+    assert depth_image_per_pixel(
+        io.BytesIO(data), num_pixels
+    ) == depth_image_vectorized_tuple(io.BytesIO(data), num_pixels)
+
+    results = {}
+    for name, decode in [
+        ("per pixel", depth_image_per_pixel),
+        ("vectorized", depth_image_vectorized),
+        ("as tuple", depth_image_vectorized_tuple),
+    ]:
+        results[name] = min(
+            timeit.repeat(
+                lambda: decode(io.BytesIO(data), num_pixels),
+                number=1,
+                repeat=repeat,
+            )
+        )
+        print(f"{name:>12}: {results[name] * 1000:.3f} ms per depth image")
+    for name in ["vectorized", "as tuple"]:
+        print(
+            f"Speedup of '{name}' on a "
+            f"{DEPTH_IMAGE_WIDTH}x{DEPTH_IMAGE_HEIGHT} depth image: "
+            f"{results['per pixel'] / results[name]:.1f}x"
+        )
+
+
+def bgr_to_rgb_per_pixel(bgr: bytes) -> bytearray:
+    # The original conversion: a loop over the pixels.
+    rgb = bytearray()
+    for i in range(0, len(bgr), 3):
+        pixel = bgr[i:i + 3]
+        rgb.extend(reversed(pixel))
+    return rgb
+
+
+def bgr_snapshot(bgr: bytes) -> Snapshot:
+    return Snapshot(
+        timestamp=0,
+        translation=(0.0, 0.0, 0.0),
+        rotation=(0.0, 0.0, 0.0, 0.0),
+        color_image_width=COLOR_IMAGE_WIDTH,
+        color_image_height=COLOR_IMAGE_HEIGHT,
+        color_image=bgr,
+        depth_image_width=0,
+        depth_image_height=0,
+        depth_image=(),
+        feelings=(0.0, 0.0, 0.0, 0.0),
+        color_image_order="bgr",
+    )
+
+
+def deferred_bgr_to_rgb(bgr: bytes) -> bytes:
+    # Building a snapshot of a BGR image and then accessing its RGB pixels,
+    # which converts them on first access.
+    return bgr_snapshot(bgr).color_image
+
+
+def benchmark_bgr_to_rgb(repeat: int):
+    bgr = os.urandom(3 * COLOR_IMAGE_WIDTH * COLOR_IMAGE_HEIGHT)
+    assert bgr_to_rgb_per_pixel(bgr) == swap_red_and_blue(bgr)
+    assert deferred_bgr_to_rgb(bgr) == swap_red_and_blue(bgr)
+
+    results = {}
+    for name, convert in [
+        ("per pixel", bgr_to_rgb_per_pixel),
+        ("slices", swap_red_and_blue),
+        ("deferred", deferred_bgr_to_rgb),
+    ]:
+        results[name] = min(
+            timeit.repeat(lambda: convert(bgr), number=1, repeat=repeat)
+        )
+        print(f"{name:>12}: {results[name] * 1000:.3f} ms per color image")
+    for name in ["slices", "deferred"]:
+        print(
+            f"Speedup of '{name}' on a "
+            f"{COLOR_IMAGE_WIDTH}x{COLOR_IMAGE_HEIGHT} color image: "
+            f"{results['per pixel'] / results[name]:.1f}x"
+        )
+
+
+def protobuf_sample(num_snapshots: int) -> bytes:
+    # A sample without user information, which the driver isn't asked for.
+    snapshot = Snapshot(
+        timestamp=0,
+        translation=(0.0, 0.0, 0.0),
+        rotation=(0.0, 0.0, 0.0, 0.0),
+        color_image_width=COLOR_IMAGE_WIDTH,
+        color_image_height=COLOR_IMAGE_HEIGHT,
+        color_image=os.urandom(3 * COLOR_IMAGE_WIDTH * COLOR_IMAGE_HEIGHT),
+        depth_image_width=DEPTH_IMAGE_WIDTH,
+        depth_image_height=DEPTH_IMAGE_HEIGHT,
+        depth_image=np.random.rand(
+            DEPTH_IMAGE_WIDTH * DEPTH_IMAGE_HEIGHT
+        ).astype("<f4"),
+        feelings=(0.0, 0.0, 0.0, 0.0),
+    )
+    return snapshot.serialize() * num_snapshots
+
+
+def benchmark_parallel_protobuf(repeat: int, num_snapshots: int = 64):
+    with tempfile.NamedTemporaryFile(suffix=".mind") as file:
+        file.write(protobuf_sample(num_snapshots=num_snapshots))
+        file.flush()
+
+        def sequential():  # noqa: ANN202
+            driver = ProtobufDriver(file.name)
+            while driver.get_snapshot() is not None:
+                pass
+
+        def parallel():  # noqa: ANN202
+            for _ in ProtobufDriver(file.name).iter_snapshots_parallel():
+                pass
+
+        results = {}
+        for name, decode in [
+            ("sequential", sequential),
+            ("parallel", parallel),
+        ]:
+            results[name] = min(
+                timeit.repeat(decode, number=1, repeat=repeat)
+            )
+            print(
+                f"{name:>12}: {results[name] * 1000:.3f} ms per "
+                f"{num_snapshots} snapshots"
+            )
+    print(
+        f"Speedup of 'parallel' on {os.cpu_count()} CPUs: "
+        f"{results['sequential'] / results['parallel']:.1f}x"
+    )
+
+
+BENCHMARKS = {
+    "bgr_to_rgb": benchmark_bgr_to_rgb,
+    "depth": benchmark_depth,
+    "parallel_protobuf": benchmark_parallel_protobuf,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks script.")
+
+    parser.add_argument(
+        "benchmark",
+        type=str,
+        choices=sorted(BENCHMARKS),
+        help="The name of the benchmark to run.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=10,
+        help="How many times to repeat each measurement (the best is kept).",
+    )
+    args = parser.parse_args()
+
+    BENCHMARKS[args.benchmark](repeat=args.repeat)
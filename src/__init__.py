@@ -1,6 +1,7 @@
 import click
 
 from .client import run
+from .convert import convert
 from .reader import read
 from .server import run_server
 from .web import run_webserver
@@ -17,6 +18,7 @@ def client():
 
 
 # TODO: Remove 'run_server' and 'run_webserver' from here.
+client.add_command(convert)
 client.add_command(read)
 client.add_command(run)
 server.add_command(run_server)
@@ -0,0 +1,70 @@
+from typing import List, Optional, Union
+
+import numpy as np
+
+
+class SnapshotBatch:
+    """
+    A batch of consecutive snapshots, held column by column in numpy arrays
+    instead of as a `Snapshot` object per snapshot, for analyses that go
+    over many snapshots at once.
+    Color images aren't included, and the columns of fields that weren't
+    read are `None`.
+
+    :param timestamps: The timestamps, a uint64 array of shape (N,).
+    :type timestamps: np.ndarray
+    :param translations: The translations (x, y, z), a float64 array of
+        shape (N, 3).
+    :type translations: Optional[np.ndarray]
+    :param rotations: The rotations (x, y, z, w), a float64 array of shape
+        (N, 4).
+    :type rotations: Optional[np.ndarray]
+    :param feelings: The feelings (hunger, thirst, exhaustion, happiness), a
+        float32 array of shape (N, 4).
+    :type feelings: Optional[np.ndarray]
+    :param depth_images: The depth images, a float32 array of shape
+        (N, height, width) when they all have the same dimensions, and
+        otherwise a list of N arrays of shape (height, width).
+    :type depth_images: Optional[Union[np.ndarray, List[np.ndarray]]]
+
+    """
+    def __init__(
+        self,
+        timestamps: np.ndarray,
+        translations: Optional[np.ndarray],
+        rotations: Optional[np.ndarray],
+        feelings: Optional[np.ndarray],
+        depth_images: Optional[Union[np.ndarray, List[np.ndarray]]],
+    ):
+        for column in [translations, rotations, feelings, depth_images]:
+            assert column is None or len(column) == len(timestamps)
+        self.timestamps = timestamps
+        self.translations = translations
+        self.rotations = rotations
+        self.feelings = feelings
+        self.depth_images = depth_images
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(<{len(self)} snapshots>)"
+
+
+def stack_depth_images(
+    depth_images: List[np.ndarray],
+) -> Union[np.ndarray, List[np.ndarray]]:
+    """
+    Stack depth images into a single array, if they all have the same
+    dimensions.
+
+    :param depth_images: Depth images of shape (height, width).
+    :type depth_images: List[np.ndarray]
+    :return: An array of shape (N, height, width), or `depth_images` itself
+        if their dimensions differ.
+    :rtype: Union[np.ndarray, List[np.ndarray]]
+
+    """
+    if len({depth_image.shape for depth_image in depth_images}) > 1:
+        return depth_images
+    return np.stack(depth_images)
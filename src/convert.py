@@ -0,0 +1,86 @@
+import time
+from typing import Callable
+
+import click
+
+from furl import furl
+
+from .drivers import BinaryWriter, ColumnarWriter, ProtobufWriter
+from .reader import Reader
+
+BYTES_IN_MEGABYTE = 2 ** 20
+
+
+def find_writer(scheme: str) -> Callable:
+    writers = {
+        "binary": BinaryWriter,
+        "columnar": ColumnarWriter,
+        "protobuf": ProtobufWriter,
+    }
+    for writer_scheme, cls in writers.items():
+        if scheme == writer_scheme:
+            return cls
+    else:
+        raise Exception(f"Scheme '{scheme}' is not supported.")
+
+
+def convert_sample(src_url: str, dst_url: str) -> tuple:
+    """
+    Transcode a sample to another format, one snapshot at a time, so memory
+    stays constant however large the sample is.
+    Snapshots are read lazily and their images are written as they are
+    stored, e.g. without swapping the channels of color images between two
+    binary samples.
+
+    :param src_url: scheme://path of the sample to read, e.g.
+        binary:///samples/sample.mind.gz.
+    :type src_url: str
+    :param dst_url: scheme://path of the sample to write, compressed if the
+        path ends with the suffix of a codec, e.g. `.gz` or `.xz`, and
+        block-framed if it ends with `.blocks`.
+    :type dst_url: str
+    :return: The number of snapshots and of (uncompressed) bytes written,
+        and the time it took in seconds.
+    :rtype: tuple
+
+    """
+    start = time.perf_counter()
+    reader = Reader(url=src_url, lazy=True)
+    parsed_dst_url = furl(url=dst_url)
+    writer = find_writer(scheme=parsed_dst_url.scheme)(
+        path=str(parsed_dst_url.path),
+        user_information=reader.user_information,
+    )
+    num_snapshots = 0
+    with writer:
+        for snapshot in reader:
+            writer.write(snapshot=snapshot)
+            num_snapshots += 1
+    return num_snapshots, writer.num_bytes, time.perf_counter() - start
+
+
+@click.command()
+@click.argument("src_url")
+@click.argument("dst_url")
+def convert(src_url: str, dst_url: str):
+    """
+    Transcode a sample between the binary, protobuf and columnar formats,
+    and their compressed and block-framed variants.
+
+    :param src_url: scheme://path of the sample to read.
+    :type src_url: str
+    :param dst_url: scheme://path of the sample to write.
+    :type dst_url: str
+
+    """
+    num_snapshots, num_bytes, seconds = convert_sample(
+        src_url=src_url, dst_url=dst_url
+    )
+    # Guards against a zero duration on coarse clocks.
+    seconds = max(seconds, 1e-9)
+    print(
+        f"Converted {num_snapshots} snapshots "
+        f"({num_bytes / BYTES_IN_MEGABYTE:.1f} MB) in {seconds:.2f} s: "
+        f"{num_snapshots / seconds:.1f} snapshots/s, "
+        f"{num_bytes / BYTES_IN_MEGABYTE / seconds:.1f} MB/s."
+    )
@@ -1,7 +1,12 @@
-from .binary import BinaryDriver
-from .protobuf import ProtobufDriver
+from .binary import BinaryDriver, BinaryWriter
+from .columnar import ColumnarDriver, ColumnarWriter
+from .protobuf import ProtobufDriver, ProtobufWriter
 
 __all__ = [
     "BinaryDriver",
+    "BinaryWriter",
+    "ColumnarDriver",
+    "ColumnarWriter",
     "ProtobufDriver",
+    "ProtobufWriter",
 ]
@@ -1,29 +1,83 @@
-import gzip
 import io
+import struct
 from collections import namedtuple
+from typing import BinaryIO, Optional
+
+import numpy as np
 
 from .protobuf import UserInformation
+from ..batch import SnapshotBatch, stack_depth_images
 from ..constants import (
     CHAR_SIZE_IN_BYTES,
-    DOUBLE_SIZE_IN_BYTES,
     FLOAT_SIZE_IN_BYTES,
     UINT32_SIZE_IN_BYTES,
     UINT64_SIZE_IN_BYTES,
 )
-from ..snapshot import Snapshot
-from ..utils import from_bytes
+from ..snapshot import (
+    EMPTY_COLOR_IMAGE,
+    EMPTY_DIM,
+    EMPTY_FEELINGS,
+    EMPTY_ROTATION,
+    EMPTY_TRANSLATION,
+    LazySnapshot,
+    SNAPSHOT_FIELDS,
+    Snapshot,
+)
+from ..utils import (
+    from_bytes,
+    open_for_reading,
+    open_for_writing,
+    skip,
+)
 
-NUM_BYTES_TIMESTAMP = UINT64_SIZE_IN_BYTES
-NUM_BYTES_DIMENSION = UINT32_SIZE_IN_BYTES
-NUM_BYTES_PIXEL_COLOR_IMAGE = 3  # RGB format.
+NUM_BYTES_PIXEL_COLOR_IMAGE = 3  # BGR format.
+
+# Precompiled little-endian layouts of the fixed-size snapshot sections.
+# Timestamp, translation (x, y, z), rotation (x, y, z, w) and the color image
+# dimensions (height, width).
+SNAPSHOT_HEADER = struct.Struct("<Q3d4dII")
+# Height and width of the depth image.
+DIMENSIONS = struct.Struct("<II")
+# Where the color image dimensions are in the snapshot header.
+COLOR_IMAGE_DIMENSIONS_OFFSET = SNAPSHOT_HEADER.size - DIMENSIONS.size
+# The snapshot header as a numpy record, to decode many headers at once.
+SNAPSHOT_HEADER_DTYPE = np.dtype([
+    ("timestamp", "<u8"),
+    ("translation", "<f8", (3,)),
+    ("rotation", "<f8", (4,)),
+    ("color_image_height", "<u4"),
+    ("color_image_width", "<u4"),
+])
+# Hunger, thirst, exhaustion and happiness.
+FEELINGS = struct.Struct("<4f")
+
+Translation = namedtuple("translation", ["x", "y", "z"])
+Rotation = namedtuple("rotation", ["x", "y", "z", "w"])
+Feelings = namedtuple(
+    "feelings", ["hunger", "thirst", "exhaustion", "happiness"]
+)
+# ID and username length, followed by the username, birthday and gender.
+USER_INFORMATION_HEADER = struct.Struct("<QI")
+USER_INFORMATION_FOOTER = struct.Struct("<Ic")
 
 
 class BinaryDriver:
-    def __init__(self, path: str):
-        if path.endswith(".gz"):
-            self.file: io.BufferedReader = gzip.open(path, "rb")
-        else:
-            self.file: io.BufferedReader = open(path, "rb")
+    def __init__(
+        self,
+        path: str,
+        use_mmap: bool = False,
+        lazy: bool = False,
+        fields: Optional[tuple] = None,
+    ):
+        # Compressed samples are decompressed as they are read, and in
+        # zero-copy mode uncompressed ones are memory-mapped so that reads
+        # return views into the file.
+        self.file: BinaryIO = open_for_reading(path, use_mmap=use_mmap)
+        # Whether snapshots keep their images undecoded until they're used.
+        self.lazy = lazy
+        # The snapshot fields to read, the others are seeked past and left
+        # empty.
+        self.fields = SNAPSHOT_FIELDS if fields is None else fields
 
     def get_user_information(self) -> UserInformation:
         id: int = from_bytes(
@@ -56,118 +110,78 @@ class BinaryDriver:
         )
 
     def get_snapshot(self) -> Snapshot:
-        binary_timestamp = self.file.read(NUM_BYTES_TIMESTAMP)
-        if binary_timestamp == b"":
+        binary_header = self.file.read(SNAPSHOT_HEADER.size)
+        if binary_header == b"":
             # EOF reached.
             self.file.close()
             return None
-        timestamp = from_bytes(
-            data=binary_timestamp, data_type="uint64", endianness="<"
-        )
-        Translation = namedtuple("translation", ["x", "y", "z"])
-        translation = Translation(
-            x=from_bytes(
-                data=self.file.read(DOUBLE_SIZE_IN_BYTES),
-                data_type="double",
-                endianness="<",
-            ),
-            y=from_bytes(
-                data=self.file.read(DOUBLE_SIZE_IN_BYTES),
-                data_type="double",
-                endianness="<",
-            ),
-            z=from_bytes(
-                data=self.file.read(DOUBLE_SIZE_IN_BYTES),
-                data_type="double",
-                endianness="<",
-            ),
-        )
-        Rotation = namedtuple("rotation", ["x", "y", "z", "w"])
-        rotation = Rotation(
-            x=from_bytes(
-                data=self.file.read(DOUBLE_SIZE_IN_BYTES),
-                data_type="double",
-                endianness="<",
-            ),
-            y=from_bytes(
-                data=self.file.read(DOUBLE_SIZE_IN_BYTES),
-                data_type="double",
-                endianness="<",
-            ),
-            z=from_bytes(
-                data=self.file.read(DOUBLE_SIZE_IN_BYTES),
-                data_type="double",
-                endianness="<",
-            ),
-            w=from_bytes(
-                data=self.file.read(DOUBLE_SIZE_IN_BYTES),
-                data_type="double",
-                endianness="<",
-            ),
+        (
+            timestamp,
+            *pose,
+            color_image_height,
+            color_image_width,
+        ) = SNAPSHOT_HEADER.unpack(binary_header)
+        translation = (
+            Translation(*pose[:3]) if "translation" in self.fields
+            else EMPTY_TRANSLATION
         )
-        color_image_height = from_bytes(
-            data=self.file.read(NUM_BYTES_DIMENSION),
-            data_type="uint32",
-            endianness="<",
-        )
-        color_image_width = from_bytes(
-            data=self.file.read(NUM_BYTES_DIMENSION),
-            data_type="uint32",
-            endianness="<",
-        )
-        color_image = from_bgr_to_rgb(
-            bgr=self.file.read(
-                NUM_BYTES_PIXEL_COLOR_IMAGE * color_image_width * color_image_height  # noqa: E501
-            )
+        rotation = (
+            Rotation(*pose[3:]) if "rotation" in self.fields
+            else EMPTY_ROTATION
         )
-        assert (
-            len(color_image) == NUM_BYTES_PIXEL_COLOR_IMAGE * color_image_width * color_image_height  # noqa: E501
+        num_bytes_color_image = (
+            NUM_BYTES_PIXEL_COLOR_IMAGE * color_image_width * color_image_height  # noqa: E501
         )
-        depth_image_height = from_bytes(
-            data=self.file.read(NUM_BYTES_DIMENSION),
-            data_type="uint32",
-            endianness="<",
+        if "color_image" in self.fields:
+            # Kept in BGR order, `Snapshot` swaps the channels only if needed.
+            color_image = self.file.read(num_bytes_color_image)
+            assert len(color_image) == num_bytes_color_image
+        else:
+            self.file.seek(num_bytes_color_image, io.SEEK_CUR)
+            color_image_width = color_image_height = EMPTY_DIM
+            color_image = EMPTY_COLOR_IMAGE
+        depth_image_height, depth_image_width = DIMENSIONS.unpack(
+            self.file.read(DIMENSIONS.size)
         )
-        depth_image_width = from_bytes(
-            data=self.file.read(NUM_BYTES_DIMENSION),
-            data_type="uint32",
-            endianness="<",
+        num_bytes_depth_image = (
+            FLOAT_SIZE_IN_BYTES * depth_image_width * depth_image_height
         )
-        depth_image = []
-        for _ in range(depth_image_width * depth_image_height):
-            depth_image.append(
-                from_bytes(
-                    data=self.file.read(FLOAT_SIZE_IN_BYTES),
-                    data_type="float",
-                    endianness="<",
-                )
+        if "depth_image" in self.fields:
+            # The depth image and the feelings are adjacent, so both are read
+            # at once and the depth image is decoded in a single vectorized
+            # call. The resulting array is a read-only view of the data that
+            # was read, which in zero-copy mode is the mapped file itself.
+            binary_tail = self.file.read(num_bytes_depth_image + FEELINGS.size)
+            depth_image_buffer = memoryview(binary_tail)[
+                :num_bytes_depth_image
+            ]
+        else:
+            self.file.seek(num_bytes_depth_image, io.SEEK_CUR)
+            binary_tail = self.file.read(FEELINGS.size)
+            num_bytes_depth_image = 0
+            depth_image_width = depth_image_height = EMPTY_DIM
+            depth_image_buffer = b""
+        if "feelings" in self.fields:
+            feelings = Feelings(
+                *FEELINGS.unpack_from(binary_tail, num_bytes_depth_image)
             )
-        Feelings = namedtuple(
-            "feelings", ["hunger", "thirst", "exhaustion", "happiness"]
-        )
-        feelings = Feelings(
-            hunger=from_bytes(
-                data=self.file.read(FLOAT_SIZE_IN_BYTES),
-                data_type="float",
-                endianness="<",
-            ),
-            thirst=from_bytes(
-                data=self.file.read(FLOAT_SIZE_IN_BYTES),
-                data_type="float",
-                endianness="<",
-            ),
-            exhaustion=from_bytes(
-                data=self.file.read(FLOAT_SIZE_IN_BYTES),
-                data_type="float",
-                endianness="<",
-            ),
-            happiness=from_bytes(
-                data=self.file.read(FLOAT_SIZE_IN_BYTES),
-                data_type="float",
-                endianness="<",
-            ),
-        )
+        else:
+            feelings = EMPTY_FEELINGS
 
+        if self.lazy:
+            return LazySnapshot(
+                timestamp=timestamp,
+                translation=translation,
+                rotation=rotation,
+                color_image_width=color_image_width,
+                color_image_height=color_image_height,
+                color_image_buffer=color_image,
+                depth_image_width=depth_image_width,
+                depth_image_height=depth_image_height,
+                depth_image_buffer=depth_image_buffer,
+                feelings=feelings,
+                color_image_order="bgr",
+            )
         return Snapshot(
             timestamp=timestamp,
             translation=translation,
@@ -177,14 +191,229 @@ class BinaryDriver:
             color_image=color_image,
             depth_image_width=depth_image_width,
             depth_image_height=depth_image_height,
-            depth_image=tuple(depth_image),
+            depth_image=np.frombuffer(depth_image_buffer, dtype="<f4"),
             feelings=feelings,
+            color_image_order="bgr",
+        )
+
+    def get_batch(self, size: int) -> Optional[SnapshotBatch]:
+        """
+        Read up to `size` snapshots into a columnar batch, without reading
+        their color images.
+        The headers and the feelings of the snapshots are collected as raw
+        bytes and decoded at once into arrays, so no Python object is
+        created per field.
+
+        :param size: The maximal number of snapshots in the batch.
+        :type size: int
+        :return: The batch, or `None` if there are no snapshots left.
+        :rtype: Optional[SnapshotBatch]
+
+        """
+        binary_headers = bytearray()
+        binary_feelings = bytearray()
+        depth_images = []
+        for _ in range(size):
+            binary_header = self.file.read(SNAPSHOT_HEADER.size)
+            if len(binary_header) == 0:
+                break
+            binary_headers += binary_header
+            color_image_height, color_image_width = DIMENSIONS.unpack_from(
+                binary_header, COLOR_IMAGE_DIMENSIONS_OFFSET
+            )
+            self.file.seek(
+                NUM_BYTES_PIXEL_COLOR_IMAGE * color_image_width * color_image_height,  # noqa: E501
+                io.SEEK_CUR,
+            )
+            depth_image_height, depth_image_width = DIMENSIONS.unpack(
+                self.file.read(DIMENSIONS.size)
+            )
+            num_depth_pixels = depth_image_width * depth_image_height
+            num_bytes_depth_image = FLOAT_SIZE_IN_BYTES * num_depth_pixels
+            if "depth_image" in self.fields:
+                binary_tail = self.file.read(
+                    num_bytes_depth_image + FEELINGS.size
+                )
+                depth_images.append(
+                    np.frombuffer(
+                        binary_tail, dtype="<f4", count=num_depth_pixels
+                    ).reshape(depth_image_height, depth_image_width)
+                )
+            else:
+                self.file.seek(num_bytes_depth_image, io.SEEK_CUR)
+                binary_tail = self.file.read(FEELINGS.size)
+                num_bytes_depth_image = 0
+            binary_feelings += binary_tail[num_bytes_depth_image:]
+        if not binary_headers:
+            # EOF reached.
+            self.file.close()
+            return None
+
+        headers = np.frombuffer(binary_headers, dtype=SNAPSHOT_HEADER_DTYPE)
+        return SnapshotBatch(
+            timestamps=headers["timestamp"].copy(),
+            translations=(
+                headers["translation"].copy()
+                if "translation" in self.fields else None
+            ),
+            rotations=(
+                headers["rotation"].copy()
+                if "rotation" in self.fields else None
+            ),
+            feelings=(
+                np.frombuffer(binary_feelings, dtype="<f4").reshape(-1, 4)
+                if "feelings" in self.fields else None
+            ),
+            depth_images=(
+                stack_depth_images(depth_images=depth_images)
+                if "depth_image" in self.fields else None
+            ),
+        )
+
+    def scan_snapshot(self) -> Optional[tuple]:
+        """
+        Skip the next snapshot, reading only its timestamp and the
+        dimensions of its images, which precede their pixels.
+
+        :return: The snapshot's timestamp, and the (width, height) of its
+            color and depth images, or `None` if there are no snapshots
+            left.
+        :rtype: Optional[tuple]
+
+        """
+        binary_header = self.file.read(SNAPSHOT_HEADER.size)
+        if len(binary_header) < SNAPSHOT_HEADER.size:
+            return None
+        (
+            timestamp,
+            *_,
+            color_image_height,
+            color_image_width,
+        ) = SNAPSHOT_HEADER.unpack(binary_header)
+        self.file.seek(
+            NUM_BYTES_PIXEL_COLOR_IMAGE * color_image_width * color_image_height,  # noqa: E501
+            io.SEEK_CUR,
+        )
+        depth_image_height, depth_image_width = DIMENSIONS.unpack(
+            self.file.read(DIMENSIONS.size)
+        )
+        self.file.seek(
+            FLOAT_SIZE_IN_BYTES * depth_image_width * depth_image_height + FEELINGS.size,  # noqa: E501
+            io.SEEK_CUR,
         )
+        return (
+            timestamp,
+            (color_image_width, color_image_height),
+            (depth_image_width, depth_image_height),
+        )
+
+    def skip_snapshot(self) -> Optional[tuple]:
+        """
+        Skip the next snapshot without decoding its images.
+
+        :return: The snapshot's offset, length and timestamp, or `None` if
+            there is no complete snapshot left, in which case the position is
+            left unchanged.
+        :rtype: Optional[tuple]
+
+        """
+        offset = self.file.tell()
+        binary_header = self.file.read(SNAPSHOT_HEADER.size)
+        if len(binary_header) < SNAPSHOT_HEADER.size:
+            self.file.seek(offset)
+            return None
+        (
+            timestamp,
+            *_,
+            color_image_height,
+            color_image_width,
+        ) = SNAPSHOT_HEADER.unpack(binary_header)
+        if not skip(
+            file=self.file,
+            size=NUM_BYTES_PIXEL_COLOR_IMAGE * color_image_width * color_image_height,  # noqa: E501
+        ):
+            self.file.seek(offset)
+            return None
+        binary_dimensions = self.file.read(DIMENSIONS.size)
+        if len(binary_dimensions) < DIMENSIONS.size:
+            self.file.seek(offset)
+            return None
+        depth_image_height, depth_image_width = DIMENSIONS.unpack(
+            binary_dimensions
+        )
+        if not skip(
+            file=self.file,
+            size=FLOAT_SIZE_IN_BYTES * depth_image_width * depth_image_height + FEELINGS.size,  # noqa: E501
+        ):
+            self.file.seek(offset)
+            return None
+        return offset, self.file.tell() - offset, timestamp
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def seek(self, offset: int):
+        self.file.seek(offset)
+
+
+class BinaryWriter:
+    """
+    A writer of samples in the binary format read by `BinaryDriver`,
+    compressed if the path ends with `.gz`.
+
+    :param path: A path to the sample file.
+    :type path: str
+    :param user_information: The user information of the sample.
+    :type user_information: UserInformation
+
+    """
+    def __init__(self, path: str, user_information: UserInformation):
+        self.file = open_for_writing(path)
+        self.num_bytes = 0
+        username = user_information.username.encode("utf-8")
+        self._write(
+            USER_INFORMATION_HEADER.pack(user_information.id, len(username))
+        )
+        self._write(username)
+        self._write(
+            USER_INFORMATION_FOOTER.pack(
+                user_information.birthday,
+                user_information.gender.encode("utf-8"),
+            )
+        )
+
+    def write(self, snapshot: Snapshot):
+        self._write(
+            SNAPSHOT_HEADER.pack(
+                snapshot.timestamp,
+                *snapshot.translation,
+                *snapshot.rotation,
+                snapshot.color_image_height,
+                snapshot.color_image_width,
+            )
+        )
+        # Snapshots read from binary samples are still in BGR order, and are
+        # written without swapping their channels twice.
+        self._write(snapshot.get_color_image(order="bgr"))
+        self._write(
+            DIMENSIONS.pack(
+                snapshot.depth_image_height, snapshot.depth_image_width
+            )
+        )
+        self._write(
+            np.ascontiguousarray(snapshot.depth_image, dtype="<f4")
+        )
+        self._write(FEELINGS.pack(*snapshot.feelings))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self) -> "BinaryWriter":
+        return self
 
+    def __exit__(self, *args: tuple):
+        self.close()
 
-def from_bgr_to_rgb(bgr: bytes) -> bytes:
-    rgb = bytearray()
-    for i in range(0, len(bgr), NUM_BYTES_PIXEL_COLOR_IMAGE):
-        pixel = bgr[i:i + 3]
-        rgb.extend(reversed(pixel))
-    return rgb
+    def _write(self, data: bytes):
+        self.file.write(data)
+        self.num_bytes += memoryview(data).nbytes
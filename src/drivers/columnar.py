@@ -0,0 +1,393 @@
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+from ..batch import SnapshotBatch, stack_depth_images
+from ..constants import FLOAT_SIZE_IN_BYTES
+from ..snapshot import (
+    EMPTY_COLOR_IMAGE,
+    EMPTY_DIM,
+    EMPTY_FEELINGS,
+    EMPTY_ROTATION,
+    EMPTY_TRANSLATION,
+    LazySnapshot,
+    NUM_BYTES_PIXEL_COLOR_IMAGE,
+    SNAPSHOT_FIELDS,
+    Snapshot,
+)
+from ..user_information import UserInformation
+
+MANIFEST_FILE_NAME = "manifest.json"
+COLUMNAR_FORMAT = "columnar"
+COLUMNAR_VERSION = 1
+# The fixed-width columns, one element per snapshot, and the dtype and shape
+# of their elements. Image dimensions are (height, width), and image offsets
+# are byte offsets into the image files.
+COLUMNS = {
+    "timestamp": ("<u8", ()),
+    "translation": ("<f8", (3,)),
+    "rotation": ("<f8", (4,)),
+    "color_image_dimensions": ("<u4", (2,)),
+    "color_image_offset": ("<u8", ()),
+    "depth_image_dimensions": ("<u4", (2,)),
+    "depth_image_offset": ("<u8", ()),
+    "feelings": ("<f4", (4,)),
+}
+# The variable-width images, RGB pixels and little-endian 32-bit floats,
+# stored back to back.
+IMAGES = ("color_image", "depth_image")
+
+
+def column_path(path: str, name: str) -> str:
+    return os.path.join(path, f"{name}.bin")
+
+
+class ColumnarDriver:
+    """
+    A driver of columnar samples, directories in which every snapshot field
+    is stored in a file of its own, as a fixed-width array with an element
+    per snapshot, and the images are stored back to back in two more files.
+    A JSON manifest holds the user information and the number of snapshots.
+    The files are memory-mapped, so a field is scanned at disk speed without
+    touching the others, e.g. with `Reader.iter_batches`, and a snapshot is
+    read at any position without an index.
+
+    :param path: A path to the sample directory.
+    :type path: str
+    :param use_mmap: Ignored, columnar samples are always memory-mapped.
+    :type use_mmap: bool
+    :param lazy: Whether snapshots keep their images undecoded until they're
+        used.
+    :type lazy: bool
+    :param fields: The snapshot fields to read, the others are left empty.
+    :type fields: Optional[tuple]
+
+    """
+    def __init__(
+        self,
+        path: str,
+        use_mmap: bool = True,
+        lazy: bool = False,
+        fields: Optional[tuple] = None,
+    ):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE_NAME)) as file:
+            self.manifest = json.load(file)
+        if any([
+            self.manifest.get("format") != COLUMNAR_FORMAT,
+            self.manifest.get("version") != COLUMNAR_VERSION,
+        ]):
+            raise Exception(f"'{path}' isn't a supported columnar sample.")
+        self.num_snapshots = self.manifest["num_snapshots"]
+        self.columns = {
+            name: self._map(name=name, dtype=dtype, shape=shape)
+            for name, (dtype, shape) in COLUMNS.items()
+        }
+        self.images = {
+            name: self._map(name=name, dtype="u1", shape=None)
+            for name in IMAGES
+        }
+        self.lazy = lazy
+        self.fields = SNAPSHOT_FIELDS if fields is None else fields
+        self._position = 0
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self.columns["timestamp"]
+
+    def get_user_information(self) -> UserInformation:
+        return UserInformation(**self.manifest["user_information"])
+
+    def get_snapshot(self) -> Snapshot:
+        if self._position >= self.num_snapshots:
+            # EOF reached.
+            return None
+        i = self._position
+        self._position += 1
+        columns = self.columns
+        translation = (
+            tuple(columns["translation"][i].tolist())
+            if "translation" in self.fields else EMPTY_TRANSLATION
+        )
+        rotation = (
+            tuple(columns["rotation"][i].tolist())
+            if "rotation" in self.fields else EMPTY_ROTATION
+        )
+        if "color_image" in self.fields:
+            color_image_height, color_image_width = (
+                columns["color_image_dimensions"][i].tolist()
+            )
+            color_image = self._image(
+                name="color_image",
+                i=i,
+                size=NUM_BYTES_PIXEL_COLOR_IMAGE * color_image_width * color_image_height,  # noqa: E501
+            )
+        else:
+            color_image_width = color_image_height = EMPTY_DIM
+            color_image = EMPTY_COLOR_IMAGE
+        if "depth_image" in self.fields:
+            depth_image_height, depth_image_width = (
+                columns["depth_image_dimensions"][i].tolist()
+            )
+            depth_image_buffer = self._image(
+                name="depth_image",
+                i=i,
+                size=FLOAT_SIZE_IN_BYTES * depth_image_width * depth_image_height,  # noqa: E501
+            )
+        else:
+            depth_image_width = depth_image_height = EMPTY_DIM
+            depth_image_buffer = b""
+        feelings = (
+            tuple(columns["feelings"][i].tolist())
+            if "feelings" in self.fields else EMPTY_FEELINGS
+        )
+
+        if self.lazy:
+            return LazySnapshot(
+                timestamp=int(columns["timestamp"][i]),
+                translation=translation,
+                rotation=rotation,
+                color_image_width=color_image_width,
+                color_image_height=color_image_height,
+                color_image_buffer=color_image,
+                depth_image_width=depth_image_width,
+                depth_image_height=depth_image_height,
+                depth_image_buffer=depth_image_buffer,
+                feelings=feelings,
+            )
+        return Snapshot(
+            timestamp=int(columns["timestamp"][i]),
+            translation=translation,
+            rotation=rotation,
+            color_image_width=color_image_width,
+            color_image_height=color_image_height,
+            color_image=color_image,
+            depth_image_width=depth_image_width,
+            depth_image_height=depth_image_height,
+            depth_image=np.frombuffer(depth_image_buffer, dtype="<f4"),
+            feelings=feelings,
+        )
+
+    def get_batch(self, size: int) -> Optional[SnapshotBatch]:
+        """
+        Read up to `size` snapshots into a columnar batch, without reading
+        their color images.
+        The batch's columns are views into the mapped files, and so are its
+        depth images when they all have the same dimensions.
+
+        :param size: The maximal number of snapshots in the batch.
+        :type size: int
+        :return: The batch, or `None` if there are no snapshots left.
+        :rtype: Optional[SnapshotBatch]
+
+        """
+        start = self._position
+        end = min(start + size, self.num_snapshots)
+        if start >= end:
+            # EOF reached.
+            return None
+        self._position = end
+        columns = self.columns
+
+        depth_images = None
+        if "depth_image" in self.fields:
+            dimensions = columns["depth_image_dimensions"][start:end]
+            # As Python integers, since mixing uint64 with int gives floats.
+            offsets = columns["depth_image_offset"][start:end].tolist()
+            if (dimensions == dimensions[0]).all():
+                # The images are back to back, so they are viewed at once.
+                height, width = dimensions[0].tolist()
+                num_bytes_depth_images = (
+                    (end - start) * FLOAT_SIZE_IN_BYTES * width * height
+                )
+                depth_images = self.images["depth_image"][
+                    offsets[0]:offsets[0] + num_bytes_depth_images
+                ].view("<f4").reshape(end - start, height, width)
+            else:
+                depth_images = stack_depth_images(
+                    depth_images=[
+                        self.images["depth_image"][
+                            offset:offset + FLOAT_SIZE_IN_BYTES * width * height  # noqa: E501
+                        ].view("<f4").reshape(height, width)
+                        for (height, width), offset in zip(
+                            dimensions.tolist(), offsets
+                        )
+                    ]
+                )
+        return SnapshotBatch(
+            timestamps=columns["timestamp"][start:end],
+            translations=(
+                columns["translation"][start:end]
+                if "translation" in self.fields else None
+            ),
+            rotations=(
+                columns["rotation"][start:end]
+                if "rotation" in self.fields else None
+            ),
+            feelings=(
+                columns["feelings"][start:end]
+                if "feelings" in self.fields else None
+            ),
+            depth_images=depth_images,
+        )
+
+    def scan_snapshot(self) -> Optional[tuple]:
+        """
+        Skip the next snapshot, reading only its timestamp and the
+        dimensions of its images.
+
+        :return: The snapshot's timestamp, and the (width, height) of its
+            color and depth images, or `None` if there are no snapshots
+            left.
+        :rtype: Optional[tuple]
+
+        """
+        if self._position >= self.num_snapshots:
+            return None
+        i = self._position
+        self._position += 1
+        color_image_height, color_image_width = (
+            self.columns["color_image_dimensions"][i].tolist()
+        )
+        depth_image_height, depth_image_width = (
+            self.columns["depth_image_dimensions"][i].tolist()
+        )
+        return (
+            int(self.columns["timestamp"][i]),
+            (color_image_width, color_image_height),
+            (depth_image_width, depth_image_height),
+        )
+
+    def skip_snapshot(self) -> Optional[tuple]:
+        """
+        Skip the next snapshot.
+        Positions in columnar samples are snapshot numbers, so every
+        snapshot's length is 1.
+
+        :return: The snapshot's position, length and timestamp, or `None` if
+            there are no snapshots left.
+        :rtype: Optional[tuple]
+
+        """
+        if self._position >= self.num_snapshots:
+            return None
+        i = self._position
+        self._position += 1
+        return i, 1, int(self.columns["timestamp"][i])
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int):
+        self._position = offset
+
+    def _map(
+        self, name: str, dtype: str, shape: Optional[tuple]
+    ) -> np.ndarray:
+        path = column_path(path=self.path, name=name)
+        if shape is None:
+            # Images are mapped whole.
+            if os.path.getsize(path) == 0:
+                return np.empty(0, dtype=dtype)
+            return np.memmap(path, dtype=dtype, mode="r")
+        # Snapshots appended after the manifest was last written are ignored.
+        shape = (self.num_snapshots, *shape)
+        if self.num_snapshots == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+    def _image(self, name: str, i: int, size: int) -> memoryview:
+        offset = int(self.columns[f"{name}_offset"][i])
+        return memoryview(self.images[name][offset:offset + size])
+
+
+class ColumnarWriter:
+    """
+    A writer of columnar samples (see `ColumnarDriver`).
+    Snapshots are appended to the column files as they are written, and the
+    manifest is rewritten when the writer is closed, so readers never see a
+    snapshot that wasn't completely written.
+
+    :param path: A path to the sample directory, which is created if needed.
+    :type path: str
+    :param user_information: The user information of the sample.
+    :type user_information: UserInformation
+
+    """
+    def __init__(self, path: str, user_information: UserInformation):
+        self.path = path
+        self.user_information = user_information
+        self.num_snapshots = 0
+        self.num_bytes = 0
+        os.makedirs(path, exist_ok=True)
+        self._files = {
+            name: open(column_path(path=path, name=name), "wb")
+            for name in [*COLUMNS, *IMAGES]
+        }
+        self._image_sizes = {name: 0 for name in IMAGES}
+        self._write_manifest()
+
+    def write(self, snapshot: Snapshot):
+        color_image = snapshot.color_image
+        depth_image = np.asarray(snapshot.depth_image, dtype="<f4")
+        values = {
+            "timestamp": snapshot.timestamp,
+            "translation": snapshot.translation,
+            "rotation": snapshot.rotation,
+            "color_image_dimensions": (
+                snapshot.color_image_height, snapshot.color_image_width
+            ),
+            "color_image_offset": self._image_sizes["color_image"],
+            "depth_image_dimensions": (
+                snapshot.depth_image_height, snapshot.depth_image_width
+            ),
+            "depth_image_offset": self._image_sizes["depth_image"],
+            "feelings": snapshot.feelings,
+        }
+        for name, (dtype, _) in COLUMNS.items():
+            data = np.asarray(values[name], dtype=dtype).tobytes()
+            self._files[name].write(data)
+            self.num_bytes += len(data)
+        for name, image in [
+            ("color_image", color_image),
+            ("depth_image", depth_image),
+        ]:
+            self._files[name].write(image)
+            self._image_sizes[name] += memoryview(image).nbytes
+            self.num_bytes += memoryview(image).nbytes
+        self.num_snapshots += 1
+
+    def close(self):
+        for file in self._files.values():
+            file.close()
+        self._write_manifest()
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *args: tuple):
+        self.close()
+
+    def _write_manifest(self):
+        manifest = {
+            "format": COLUMNAR_FORMAT,
+            "version": COLUMNAR_VERSION,
+            "num_snapshots": self.num_snapshots,
+            "user_information": {
+                "id": self.user_information.id,
+                "username": self.user_information.username,
+                "birthday": self.user_information.birthday,
+                "gender": self.user_information.gender,
+            },
+            "columns": {
+                name: {"dtype": dtype, "shape": list(shape)}
+                for name, (dtype, shape) in COLUMNS.items()
+            },
+        }
+        manifest_path = os.path.join(self.path, MANIFEST_FILE_NAME)
+        temporary_path = f"{manifest_path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(manifest, file, indent=4)
+        os.replace(temporary_path, manifest_path)
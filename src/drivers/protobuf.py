@@ -1,20 +1,71 @@
-import gzip
-import io
+import collections
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Optional
+
+import numpy as np
 
 from project_pb2 import ProtoSnapshot, ProtoUserInformation
 
+from ..batch import SnapshotBatch, stack_depth_images
 from ..constants import UINT32_SIZE_IN_BYTES
-from ..snapshot import Snapshot
+from ..snapshot import (
+    LazySnapshot,
+    SNAPSHOT_FIELDS,
+    Snapshot,
+    make_projection,
+    scan_into_columns,
+    scan_serialized,
+)
 from ..user_information import UserInformation
-from ..utils import from_bytes
+from ..utils import (
+    decode_varint,
+    from_bytes,
+    open_for_reading,
+    open_for_writing,
+    skip,
+)
+from ..utils.wire import (
+    MAX_VARINT_SIZE_IN_BYTES,
+    WIRE_TYPE_VARINT,
+    make_tag,
+    project_fields,
+)
+
+# `ProtoSnapshot.datetime` is field number 1, so when it is set it is the
+# first field of a serialized snapshot.
+TIMESTAMP_TAG = make_tag(field_number=1, wire_type=WIRE_TYPE_VARINT)
+MAX_TIMESTAMP_SIZE_IN_BYTES = 1 + MAX_VARINT_SIZE_IN_BYTES
+# The minimal size of the records handed to a worker process at once, large
+# enough for the parsing to outweigh sending them and the snapshots back.
+DEFAULT_CHUNK_SIZE_IN_BYTES = 2 ** 22
+# The columns of a batch that `scan_into_columns` fills in: the field they
+# hold, their name, the number of values per snapshot and their type.
+BATCH_COLUMNS = (
+    ("translation", "translations", 3, np.float64),
+    ("rotation", "rotations", 4, np.float64),
+    ("feelings", "feelings", 4, np.float32),
+)
+IMAGE_FIELDS = ("color_image", "depth_image")
 
 
 class ProtobufDriver:
-    def __init__(self, path: str):
-        if path.endswith(".gz"):
-            self.file: io.BufferedReader = gzip.open(path, "rb")
-        else:
-            self.file: io.BufferedReader = open(path, "rb")
+    def __init__(
+        self,
+        path: str,
+        use_mmap: bool = False,
+        lazy: bool = False,
+        fields: Optional[tuple] = None,
+    ):
+        # Compressed samples are decompressed as they are read, and in
+        # zero-copy mode uncompressed ones are memory-mapped so that reads
+        # return views into the file.
+        self.file: BinaryIO = open_for_reading(path, use_mmap=use_mmap)
+        # Whether snapshots keep their images undecoded until they're used.
+        self.lazy = lazy
+        # The snapshot fields to read, the others are skipped on the wire
+        # and left empty.
+        self.fields = fields
 
     def get_user_information(self) -> UserInformation:
         size = from_bytes(
@@ -50,6 +101,256 @@ class ProtobufDriver:
             data_type="uint32",
             endianness="<",
         )
-        parsed = ProtoSnapshot()
-        parsed.ParseFromString(self.file.read(size))
-        return Snapshot.from_parsed(parsed=parsed)
+        data = self.file.read(size)
+        if self.lazy:
+            return LazySnapshot.from_serialized(data=data, fields=self.fields)
+        return parse_snapshot(data=data, fields=self.fields)
+
+    def get_batch(self, size: int) -> Optional[SnapshotBatch]:
+        """
+        Read up to `size` snapshots into a columnar batch, without parsing
+        their color images.
+        The records are scanned on the wire, without parsing them into
+        messages: their fixed-size fields are decoded straight into
+        preallocated arrays, and their depth images are located in them and
+        copied once, into the batch's array.
+
+        :param size: The maximal number of snapshots in the batch.
+        :type size: int
+        :return: The batch, or `None` if there are no snapshots left.
+        :rtype: Optional[SnapshotBatch]
+
+        """
+        fields = self.fields or SNAPSHOT_FIELDS
+        # Zeroed, as proto3 leaves zeros out of the records.
+        columns = {"timestamps": np.zeros(size, dtype=np.uint64)}
+        for field, column, shape, dtype in BATCH_COLUMNS:
+            if field in fields:
+                columns[column] = np.zeros((size, shape), dtype=dtype)
+        depth_images = []
+        num_snapshots = 0
+        for row in range(size):
+            binary_size = self.file.read(UINT32_SIZE_IN_BYTES)
+            if binary_size == b"":
+                break
+            record_size = from_bytes(
+                data=binary_size,
+                data_type="uint32",
+                endianness="<",
+            )
+            depth_image_width, depth_image_height, depth_image_buffer = (
+                scan_into_columns(
+                    data=self.file.read(record_size),
+                    row=row,
+                    columns=columns,
+                    depth_image="depth_image" in fields,
+                )
+            )
+            depth_images.append(
+                np.frombuffer(depth_image_buffer, dtype="<f4").reshape(
+                    depth_image_height, depth_image_width
+                )
+            )
+            num_snapshots += 1
+        if num_snapshots == 0:
+            # EOF reached.
+            self.file.close()
+            return None
+        if num_snapshots < size:
+            columns = {
+                name: column[:num_snapshots].copy()
+                for name, column in columns.items()
+            }
+
+        return SnapshotBatch(
+            timestamps=columns["timestamps"],
+            translations=columns.get("translations"),
+            rotations=columns.get("rotations"),
+            feelings=columns.get("feelings"),
+            depth_images=(
+                stack_depth_images(depth_images=depth_images)
+                if "depth_image" in fields else None
+            ),
+        )
+
+    def iter_snapshots_parallel(
+        self,
+        workers: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE_IN_BYTES,
+    ) -> Iterator[Snapshot]:
+        """
+        Yield the remaining snapshots in the order they were recorded, while
+        a pool of processes parses them.
+        Records are framed by their size prefixes alone, which is cheap, and
+        are handed to the workers in chunks. Only a few chunks are in flight
+        at a time, so memory stays bounded however large the sample is.
+        Lazy snapshots hold views into the file, which can't be sent
+        between processes, so the snapshots yielded are always parsed.
+
+        :param workers: The number of worker processes, defaults to the
+            number of CPUs.
+        :type workers: Optional[int]
+        :param chunk_size: The minimal size in bytes of the records handed
+            to a worker at once.
+        :type chunk_size: int
+
+        """
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = collections.deque()
+            for chunk in self._iter_chunks(chunk_size=chunk_size):
+                pending.append(
+                    executor.submit(parse_snapshots, chunk, self.fields)
+                )
+                if len(pending) > 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def _iter_chunks(self, chunk_size: int) -> Iterator[List[bytes]]:
+        # The framing pass. Records are copied, since views into a mapped
+        # file can't be sent to another process.
+        chunk = []
+        num_bytes_chunk = 0
+        while (binary_size := self.file.read(UINT32_SIZE_IN_BYTES)) != b"":
+            size = from_bytes(
+                data=binary_size,
+                data_type="uint32",
+                endianness="<",
+            )
+            chunk.append(bytes(self.file.read(size)))
+            num_bytes_chunk += size
+            if num_bytes_chunk >= chunk_size:
+                yield chunk
+                chunk = []
+                num_bytes_chunk = 0
+        # EOF reached.
+        self.file.close()
+        if chunk:
+            yield chunk
+
+    def scan_snapshot(self) -> Optional[tuple]:
+        """
+        Skip the next snapshot, reading only its timestamp and the
+        dimensions of its images, which are located by scanning its wire
+        format without parsing or copying their pixels.
+
+        :return: The snapshot's timestamp, and the (width, height) of its
+            color and depth images, or `None` if there are no snapshots
+            left.
+        :rtype: Optional[tuple]
+
+        """
+        binary_size = self.file.read(UINT32_SIZE_IN_BYTES)
+        if len(binary_size) < UINT32_SIZE_IN_BYTES:
+            return None
+        size = from_bytes(
+            data=binary_size,
+            data_type="uint32",
+            endianness="<",
+        )
+        parsed, color_image, depth_image = scan_serialized(
+            data=self.file.read(size), fields=IMAGE_FIELDS
+        )
+        color_image_width, color_image_height, _ = color_image
+        depth_image_width, depth_image_height, _ = depth_image
+        return (
+            parsed.datetime,
+            (color_image_width, color_image_height),
+            (depth_image_width, depth_image_height),
+        )
+
+    def skip_snapshot(self) -> Optional[tuple]:
+        """
+        Skip the next snapshot without parsing it.
+
+        :return: The snapshot's offset, length and timestamp, or `None` if
+            there is no complete snapshot left, in which case the position is
+            left unchanged.
+        :rtype: Optional[tuple]
+
+        """
+        offset = self.file.tell()
+        binary_size = self.file.read(UINT32_SIZE_IN_BYTES)
+        if len(binary_size) < UINT32_SIZE_IN_BYTES:
+            self.file.seek(offset)
+            return None
+        size = from_bytes(
+            data=binary_size,
+            data_type="uint32",
+            endianness="<",
+        )
+        prefix_size = min(size, MAX_TIMESTAMP_SIZE_IN_BYTES)
+        prefix = self.file.read(prefix_size)
+        if len(prefix) < prefix_size or not skip(
+            file=self.file, size=size - prefix_size
+        ):
+            self.file.seek(offset)
+            return None
+        if len(prefix) > 0 and prefix[0] == TIMESTAMP_TAG:
+            timestamp, _ = decode_varint(data=prefix, position=1)
+        else:
+            # Default values aren't serialized in proto3.
+            timestamp = 0
+        return offset, self.file.tell() - offset, timestamp
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def seek(self, offset: int):
+        self.file.seek(offset)
+
+
+class ProtobufWriter:
+    """
+    A writer of samples in the size-prefixed protobuf format read by
+    `ProtobufDriver`, compressed if the path ends with `.gz`.
+
+    :param path: A path to the sample file.
+    :type path: str
+    :param user_information: The user information of the sample.
+    :type user_information: UserInformation
+
+    """
+    def __init__(self, path: str, user_information: UserInformation):
+        self.file = open_for_writing(path)
+        self.num_bytes = 0
+        self._write(user_information.serialize())
+
+    def write(self, snapshot: Snapshot):
+        self._write(snapshot.serialize())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self) -> "ProtobufWriter":
+        return self
+
+    def __exit__(self, *args: tuple):
+        self.close()
+
+    def _write(self, data: bytes):
+        self.file.write(data)
+        self.num_bytes += len(data)
+
+
+def parse_snapshot(data: bytes, fields: Optional[tuple] = None) -> Snapshot:
+    """
+    Parse a serialized `ProtoSnapshot`, reading only the given `fields` of
+    `SNAPSHOT_FIELDS`, if any.
+    """
+    if fields is not None:
+        data = project_fields(
+            data=data, projection=make_projection(fields=fields)
+        )
+    parsed = ProtoSnapshot()
+    parsed.ParseFromString(data)
+    return Snapshot.from_parsed(parsed=parsed)
+
+
+def parse_snapshots(
+    records: List[bytes], fields: Optional[tuple] = None
+) -> List[Snapshot]:
+    # Runs in the worker processes of `iter_snapshots_parallel`. The depth
+    # images are sent back as single buffers, which unpickle quickly.
+    return [parse_snapshot(data=data, fields=fields) for data in records]
@@ -0,0 +1,254 @@
+import bisect
+import collections
+import os
+import struct
+import sys
+from array import array
+from typing import Counter, Iterable, List, Optional, Union
+
+from .drivers import BinaryDriver, ProtobufDriver
+
+INDEX_MAGIC = b"MIDX"
+INDEX_VERSION = 3
+# Magic, version, sample file size and modification time (in nanoseconds),
+# end offset and number of snapshots.
+INDEX_HEADER = struct.Struct("<4sBQQQQ")
+
+
+class SampleIndex:
+    """
+    An offset index of the snapshots in a sample file.
+    For every snapshot it records its byte offset and length in the
+    (decompressed) sample, its timestamp and the dimensions of its images,
+    each in a compact array, and it is persisted next to the sample in a
+    sidecar file, one per driver.
+
+    :param end_offset: The offset in the sample where the next snapshot to
+        index starts.
+    :type end_offset: int
+
+    """
+    def __init__(self, end_offset: int):
+        self.offsets = array("Q")
+        self.lengths = array("Q")
+        self.timestamps = array("Q")
+        # The (width, height) of the color and depth images.
+        self.color_image_widths = array("I")
+        self.color_image_heights = array("I")
+        self.depth_image_widths = array("I")
+        self.depth_image_heights = array("I")
+        self.end_offset = end_offset
+        # The size and modification time of the sample file (compressed, if
+        # it is) when it was indexed.
+        self.sample_size = 0
+        self.sample_mtime = 0
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def columns(self) -> List[array]:
+        return [
+            self.offsets,
+            self.lengths,
+            self.timestamps,
+            self.color_image_widths,
+            self.color_image_heights,
+            self.depth_image_widths,
+            self.depth_image_heights,
+        ]
+
+    @property
+    def color_image_dimensions(self) -> Counter[tuple]:
+        """
+        The number of color images of every (width, height).
+        """
+        return collections.Counter(
+            zip(self.color_image_widths, self.color_image_heights)
+        )
+
+    @property
+    def depth_image_dimensions(self) -> Counter[tuple]:
+        """
+        The number of depth images of every (width, height).
+        """
+        return collections.Counter(
+            zip(self.depth_image_widths, self.depth_image_heights)
+        )
+
+    @classmethod
+    def open(
+        cls,
+        driver: Union[BinaryDriver, ProtobufDriver],
+        sample_path: str,
+        scheme: str,
+    ) -> "SampleIndex":
+        """
+        Load the sample's index from its sidecar file, bringing it up to date
+        if the sample has grown since, or build it from scratch.
+
+        :param driver: A driver of the sample, positioned at its first
+            snapshot.
+        :type driver: Union[BinaryDriver, ProtobufDriver]
+        :param sample_path: A path to the sample file.
+        :type sample_path: str
+        :param scheme: The scheme of the driver.
+        :type scheme: str
+
+        """
+        index_path = get_index_path(sample_path=sample_path, scheme=scheme)
+        stat = os.stat(sample_path)
+        start_offset = driver.tell()
+        index = cls.load(path=index_path)
+        if index is not None and (index.sample_size, index.sample_mtime) == (
+            stat.st_size, stat.st_mtime_ns
+        ):
+            return index
+        # A sample that changed is reindexed from its last indexed snapshot
+        # if it only grew, as when it is still being recorded, and from
+        # scratch if it is missing, corrupt, or was replaced.
+        if index is not None and index.sample_size > stat.st_size:
+            index = None
+        if index is not None and not index.is_prefix_of(driver=driver):
+            index = None
+        if index is None:
+            index = cls(end_offset=start_offset)
+        index.update(driver=driver)
+        index.sample_size = stat.st_size
+        index.sample_mtime = stat.st_mtime_ns
+        try:
+            index.save(path=index_path)
+        except OSError:
+            # The index still works from memory.
+            pass
+        return index
+
+    @classmethod
+    def from_timestamps(cls, timestamps: Iterable[int]) -> "SampleIndex":
+        """
+        An in-memory index of a sample whose positions are snapshot numbers,
+        e.g. a columnar sample, built from its timestamps alone, so without
+        image dimensions.
+        """
+        index = cls(end_offset=0)
+        index.timestamps.extend(int(timestamp) for timestamp in timestamps)
+        index.offsets.extend(range(len(index.timestamps)))
+        index.lengths.extend([1] * len(index.timestamps))
+        index.end_offset = len(index.timestamps)
+        return index
+
+    def update(self, driver: Union[BinaryDriver, ProtobufDriver]):
+        """
+        Index the snapshots that were appended after the last indexed one.
+        A trailing snapshot that wasn't completely written is left out, and
+        indexed by a later update.
+        """
+        driver.seek(self.end_offset)
+        while (record := driver.skip_snapshot()) is not None:
+            offset, length, timestamp = record
+            # The snapshot is complete, so it is scanned again for the
+            # dimensions of its images.
+            driver.seek(offset)
+            _, color_image_dimensions, depth_image_dimensions = (
+                driver.scan_snapshot()
+            )
+            self.offsets.append(offset)
+            self.lengths.append(length)
+            self.timestamps.append(timestamp)
+            self.color_image_widths.append(color_image_dimensions[0])
+            self.color_image_heights.append(color_image_dimensions[1])
+            self.depth_image_widths.append(depth_image_dimensions[0])
+            self.depth_image_heights.append(depth_image_dimensions[1])
+            self.end_offset = offset + length
+
+    def is_prefix_of(
+        self, driver: Union[BinaryDriver, ProtobufDriver]
+    ) -> bool:
+        """
+        Whether the last indexed snapshot is still where the index has it in
+        the sample, as it is in a sample that was only appended to.
+        """
+        if len(self) == 0:
+            return True
+        driver.seek(self.offsets[-1])
+        return driver.skip_snapshot() == (
+            self.offsets[-1], self.lengths[-1], self.timestamps[-1]
+        )
+
+    def find_range(
+        self,
+        start_timestamp: Optional[int] = None,
+        end_timestamp: Optional[int] = None,
+    ) -> range:
+        """
+        The indices of the snapshots whose timestamp `t` is in
+        `start_timestamp <= t < end_timestamp`, assuming snapshots are
+        recorded in chronological order.
+        """
+        start = (
+            0 if start_timestamp is None
+            else bisect.bisect_left(self.timestamps, start_timestamp)
+        )
+        end = (
+            len(self) if end_timestamp is None
+            else bisect.bisect_left(self.timestamps, end_timestamp)
+        )
+        return range(start, max(start, end))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SampleIndex"]:
+        try:
+            with open(path, "rb") as file:
+                header = file.read(INDEX_HEADER.size)
+                if len(header) < INDEX_HEADER.size:
+                    return None
+                (
+                    magic,
+                    version,
+                    sample_size,
+                    sample_mtime,
+                    end_offset,
+                    count,
+                ) = INDEX_HEADER.unpack(header)
+                if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                    return None
+                index = cls(end_offset=end_offset)
+                index.sample_size = sample_size
+                index.sample_mtime = sample_mtime
+                for column in index.columns:
+                    column.fromfile(file, count)
+        except (OSError, EOFError):
+            return None
+        if sys.byteorder == "big":
+            for column in index.columns:
+                column.byteswap()
+        return index
+
+    def save(self, path: str):
+        columns = self.columns
+        if sys.byteorder == "big":
+            columns = [array(column.typecode, column) for column in columns]
+            for column in columns:
+                column.byteswap()
+        # Write to a temporary file first so that readers never see a
+        # partially written index.
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(
+                INDEX_HEADER.pack(
+                    INDEX_MAGIC,
+                    INDEX_VERSION,
+                    self.sample_size,
+                    self.sample_mtime,
+                    self.end_offset,
+                    len(self),
+                )
+            )
+            for column in columns:
+                column.tofile(file)
+        os.replace(temporary_path, path)
+
+
+def get_index_path(sample_path: str, scheme: str) -> str:
+    # One index per driver, since their offsets differ.
+    return f"{sample_path}.{scheme}.idx"
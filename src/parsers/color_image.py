@@ -21,9 +21,14 @@ class ImageColorParser:
         color_image_width: int,
         color_image_height: int,
         color_image: bytes,
+        color_image_format: str = "raw",
     ):
         if color_image == b"":
             return
+        if color_image_format == "jpeg":
+            # Already compressed by the client, so written as is.
+            context.path("color_image.jpg").write_bytes(color_image)
+            return
 
         index = 0
         color_image_list = []
@@ -46,3 +51,6 @@ class ImageColorParser:
         )
         image.putdata(color_image_list)
         image.save(context.path("color_image.jpg"))
+
+    # Color images compressed in these formats are passed as is.
+    parse.color_image_formats = ("jpeg",)
@@ -1,3 +1,5 @@
+from typing import Union
+
 import matplotlib
 import matplotlib.pyplot as plt
 
@@ -13,9 +15,9 @@ def parse_depth_image(
     context: Context,
     depth_image_width: int,
     depth_image_height: int,
-    depth_image: tuple,
+    depth_image: Union[tuple, np.ndarray],
 ):
-    if depth_image == tuple():
+    if len(depth_image) == 0:
         return
 
     plt.imshow(
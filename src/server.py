@@ -1,18 +1,40 @@
+import collections
 import datetime as dt
+import hashlib
 import importlib
 import inspect
+import json
+import threading
 from pathlib import Path
+from typing import Dict
 
 import click
 
 import flask
 
-from project_pb2 import ProtoSnapshot, ProtoUserInformation
+from google.protobuf.message import DecodeError
+
+from project_pb2 import (
+    ColorImage,
+    ProtoSnapshot,
+    ProtoSnapshotBatch,
+    ProtoUserInformation,
+)
 
 from .constants import UINT32_SIZE_IN_BYTES
-from .snapshot import Snapshot
+from .snapshot import (
+    COLOR_IMAGE_CACHE_SIZE_HEADER,
+    COLOR_IMAGE_FORMATS,
+    COLOR_IMAGE_FORMATS_HEADER,
+    DEPTH_IMAGE_ENCODINGS,
+    DEPTH_IMAGE_ENCODINGS_HEADER,
+    InvalidColorImageError,
+    Snapshot,
+    UPLOAD_ENDPOINTS_HEADER,
+    hash_color_image,
+)
 from .user_information import UserInformation
-from .utils import from_bytes
+from .utils import RecordTooLargeError, from_bytes, read_size_prefixed
 
 
 class Context:
@@ -64,8 +86,150 @@ def load_parsers() -> dict:
     return parsers
 
 
+# Asks the client to send the request again, with its color images.
+UNKNOWN_COLOR_IMAGE_RESPONSE = (
+    {"status": "error", "error": "Unknown color image hash."},
+    409,
+)
+# A color image doesn't match the hash it was sent with.
+INVALID_COLOR_IMAGE_HASH_RESPONSE = (
+    {"status": "error", "error": "Color image doesn't match its hash."},
+    400,
+)
+# A snapshot couldn't be parsed, or its fields don't agree, e.g. its depth
+# image doesn't have as many pixels as its dimensions tell.
+INVALID_SNAPSHOT_RESPONSE = (
+    {"status": "error", "error": "Invalid snapshot."},
+    400,
+)
+# A color image is of an unknown format, or is an image file whose
+# dimensions aren't the ones it was sent with.
+INVALID_COLOR_IMAGE_RESPONSE = (
+    {"status": "error", "error": "Invalid color image."},
+    400,
+)
+# The stream ended in the middle of a record, e.g. since the client
+# disconnected.
+TRUNCATED_STREAM_RESPONSE = (
+    {"status": "error", "error": "Truncated stream."},
+    400,
+)
+# A record of a stream couldn't be parsed.
+INVALID_STREAM_RECORD_RESPONSE = (
+    {"status": "error", "error": "Invalid record."},
+    400,
+)
+# A record of a stream is larger than the server accepts.
+STREAM_RECORD_TOO_LARGE_RESPONSE = (
+    {"status": "error", "error": "Record too large."},
+    413,
+)
+# The largest record of a stream, in bytes, which bounds the memory a stream
+# takes, since the size of every record is read before the record itself.
+DEFAULT_MAX_STREAM_RECORD_SIZE_IN_BYTES = 2 ** 26
+# The endpoints snapshots may be uploaded to.
+UPLOAD_ENDPOINTS = ("snapshot", "snapshots", "stream")
+# How long clients may use the `/config` response before revalidating it.
+CONFIG_MAX_AGE_IN_SECONDS = 60
+# How many color images are kept per user, by default, so that clients may
+# refer to them by their hashes.
+DEFAULT_COLOR_IMAGE_CACHE_SIZE = 16
+# How many users' color images are kept, by default, since user IDs are
+# chosen by clients and would otherwise grow the cache without a bound.
+DEFAULT_COLOR_IMAGE_CACHE_USERS = 1024
+
+
+class ColorImageHashMismatchError(ValueError):
+    """
+    A received color image doesn't match the hash it was sent with.
+    """
+
+
+class ColorImageCache:
+    """
+    The color images most recently received from every user, kept by their
+    hashes in a least recently used cache of `size` images per user, so
+    that clients may send the hash of an unchanged image instead of the
+    image itself.
+    The images of the least recently active users are dropped whole beyond
+    `max_users` users, whose clients then send their images again.
+
+    :param size: The maximal number of images kept per user.
+    :type size: int
+    :param max_users: The maximal number of users whose images are kept.
+    :type max_users: int
+
+    """
+    def __init__(
+        self, size: int, max_users: int = DEFAULT_COLOR_IMAGE_CACHE_USERS
+    ):
+        assert max_users > 0
+        self.size = size
+        self.max_users = max_users
+        self._images: Dict[int, collections.OrderedDict] = (
+            collections.OrderedDict()
+        )
+        # Flask serves requests in threads.
+        self._lock = threading.Lock()
+
+    def resolve(self, user_id: int, parsed: ColorImage) -> bool:
+        """
+        Keep a received color image if it has a hash, or fill in the pixels
+        of an image that was referred to by its hash alone.
+
+        :param user_id: The ID of the user the image belongs to.
+        :type user_id: int
+        :param parsed: The received image, which is filled in in place.
+        :type parsed: ColorImage
+        :return: Whether the image is complete, i.e. it wasn't referred to
+            by a hash that isn't kept (anymore).
+        :rtype: bool
+        :raises ColorImageHashMismatchError: If the image doesn't match its
+            hash, which is checked so that no client may have another image
+            kept under the hash of the one it claims to be.
+
+        """
+        if not parsed.data_hash:
+            return True
+        if parsed.data and hash_color_image(color_image=parsed.data) != (
+            parsed.data_hash
+        ):
+            raise ColorImageHashMismatchError(
+                "The color image doesn't match its hash."
+            )
+        with self._lock:
+            images = self._images.get(user_id)
+            if images is None:
+                if not parsed.data:
+                    return False
+                images = self._images[user_id] = collections.OrderedDict()
+            self._images.move_to_end(user_id)
+            while len(self._images) > self.max_users:
+                self._images.popitem(last=False)
+            if parsed.data:
+                images[parsed.data_hash] = parsed.data
+                images.move_to_end(parsed.data_hash)
+                while len(images) > self.size:
+                    images.popitem(last=False)
+                return True
+            data = images.get(parsed.data_hash)
+            if data is None:
+                return False
+            images.move_to_end(parsed.data_hash)
+        parsed.data = data
+        return True
+
+
 class Server:
-    def __init__(self, host: str, port: int, data_dir_path: str):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        data_dir_path: str,
+        color_image_cache_size: int = DEFAULT_COLOR_IMAGE_CACHE_SIZE,
+        max_stream_record_size: int = DEFAULT_MAX_STREAM_RECORD_SIZE_IN_BYTES,
+        color_image_cache_users: int = DEFAULT_COLOR_IMAGE_CACHE_USERS,
+    ):
         self.host = host
         self.port = port
         self.app = flask.Flask(__name__)
@@ -77,33 +241,179 @@ class Server:
         ]
 
         self.parsed_snapshots = 0
+        self.color_images = ColorImageCache(
+            size=color_image_cache_size, max_users=color_image_cache_users
+        )
+        self.max_stream_record_size = max_stream_record_size
+
+        # The body of `/config` stays a plain list of fields for older
+        # clients, and newer ones find the rest in its headers.
+        self.config_headers = {
+            DEPTH_IMAGE_ENCODINGS_HEADER: ", ".join(DEPTH_IMAGE_ENCODINGS),
+            COLOR_IMAGE_CACHE_SIZE_HEADER: str(color_image_cache_size),
+            COLOR_IMAGE_FORMATS_HEADER: ", ".join(COLOR_IMAGE_FORMATS),
+            UPLOAD_ENDPOINTS_HEADER: ", ".join(UPLOAD_ENDPOINTS),
+            "Cache-Control": f"max-age={CONFIG_MAX_AGE_IN_SECONDS}",
+        }
+        self.config_etag = hashlib.blake2b(
+            json.dumps([self.supported_fields, self.config_headers]).encode(),
+            digest_size=8,
+        ).hexdigest()
 
+        # Clients revalidate their config with its ETag, and get an empty
+        # response if it didn't change.
         @self.app.route("/config", methods=["GET"])
         def config():  # noqa: ANN201
-            return self.supported_fields
+            response = flask.make_response(
+                (self.supported_fields, self.config_headers)
+            )
+            response.set_etag(self.config_etag)
+            return response.make_conditional(flask.request)
 
         @self.app.route("/snapshot", methods=["POST"])
         def snapshot():  # noqa: ANN201
             response = flask.request
-            user_information, snapshot = self.get_user_id_and_snapshot(
-                data=response.get_data()
+            try:
+                user_information, snapshot = self.get_user_id_and_snapshot(
+                    data=response.get_data()
+                )
+            except ColorImageHashMismatchError:
+                return INVALID_COLOR_IMAGE_HASH_RESPONSE
+            except InvalidColorImageError:
+                return INVALID_COLOR_IMAGE_RESPONSE
+            except (DecodeError, ValueError):
+                return INVALID_SNAPSHOT_RESPONSE
+            if snapshot is None:
+                return UNKNOWN_COLOR_IMAGE_RESPONSE
+            self.process_snapshot(
+                user_information=user_information, snapshot=snapshot
             )
-            context = Context(
-                user_id=user_information.id,
-                data_dir_path=self.data_dir_path,
-                timestamp=snapshot.timestamp
-            )
-            for required_fields, parser in self.parsers.items():
-                args = [
-                    snapshot[field] for field in required_fields
-                    if field in self.supported_fields
-                ]
-                parser(context, *args)
-
-            self.parsed_snapshots += 1
-            print(f"Server processed {self.parsed_snapshots} snapshots.")
             return {"status": "success"}
 
+        # Takes a serialized `ProtoSnapshotBatch`, whose user information is
+        # decoded once for all of its snapshots.
+        @self.app.route("/snapshots", methods=["POST"])
+        def snapshots():  # noqa: ANN201
+            snapshots = []
+            # All the images are resolved and the snapshots are checked
+            # before any of them is processed, so that a batch is either
+            # processed whole or sent again.
+            try:
+                parsed_batch = ProtoSnapshotBatch.FromString(
+                    flask.request.get_data()
+                )
+                user_information = UserInformation.from_parsed(
+                    parsed=parsed_batch.user_information
+                )
+                for parsed_snapshot in parsed_batch.snapshots:
+                    if not self.color_images.resolve(
+                        user_id=user_information.id,
+                        parsed=parsed_snapshot.color_image,
+                    ):
+                        return UNKNOWN_COLOR_IMAGE_RESPONSE
+                    snapshots.append(
+                        Snapshot.from_parsed(parsed=parsed_snapshot)
+                    )
+            except ColorImageHashMismatchError:
+                return INVALID_COLOR_IMAGE_HASH_RESPONSE
+            except InvalidColorImageError:
+                return INVALID_COLOR_IMAGE_RESPONSE
+            except (DecodeError, ValueError):
+                return INVALID_SNAPSHOT_RESPONSE
+            for snapshot in snapshots:
+                self.process_snapshot(
+                    user_information=user_information, snapshot=snapshot
+                )
+            num_snapshots = len(snapshots)
+            return {"status": "success", "snapshots": num_snapshots}
+
+        # Takes a serialized `ProtoUserInformation` followed by any number
+        # of serialized `ProtoSnapshot`s, each prefixed with its size, and
+        # usually sent in chunks as they are read. The records are parsed
+        # and processed as they arrive, so a whole sample costs a single
+        # request, and the memory of a single snapshot, whose size is
+        # bounded. Snapshots processed before an error stay processed, and
+        # the client is told how many there were.
+        @self.app.route("/stream", methods=["POST"])
+        def stream():  # noqa: ANN201
+            num_snapshots = 0
+            records = flask.request.stream
+            try:
+                data = read_size_prefixed(
+                    file=records, max_size=self.max_stream_record_size
+                )
+                if data is None:
+                    raise EOFError("The stream has no user information.")
+                user_information = UserInformation.from_parsed(
+                    parsed=ProtoUserInformation.FromString(data)
+                )
+                while True:
+                    data = read_size_prefixed(
+                        file=records, max_size=self.max_stream_record_size
+                    )
+                    if data is None:
+                        break
+                    parsed_snapshot = ProtoSnapshot.FromString(data)
+                    # Every snapshot is processed before the next is read, so
+                    # images referred to by their hashes are always resolved
+                    # in the order they were sent.
+                    if not self.color_images.resolve(
+                        user_id=user_information.id,
+                        parsed=parsed_snapshot.color_image,
+                    ):
+                        body, status = UNKNOWN_COLOR_IMAGE_RESPONSE
+                        return {**body, "snapshots": num_snapshots}, status
+                    self.process_snapshot(
+                        user_information=user_information,
+                        snapshot=Snapshot.from_parsed(parsed=parsed_snapshot),
+                    )
+                    num_snapshots += 1
+            except RecordTooLargeError:
+                body, status = STREAM_RECORD_TOO_LARGE_RESPONSE
+            except EOFError:
+                body, status = TRUNCATED_STREAM_RESPONSE
+            except ColorImageHashMismatchError:
+                body, status = INVALID_COLOR_IMAGE_HASH_RESPONSE
+            except InvalidColorImageError:
+                body, status = INVALID_COLOR_IMAGE_RESPONSE
+            except (DecodeError, ValueError, IndexError):
+                body, status = INVALID_STREAM_RECORD_RESPONSE
+            else:
+                return {"status": "success", "snapshots": num_snapshots}
+            return {**body, "snapshots": num_snapshots}, status
+
+    def process_snapshot(
+        self, user_information: UserInformation, snapshot: Snapshot
+    ):
+        context = Context(
+            user_id=user_information.id,
+            data_dir_path=self.data_dir_path,
+            timestamp=snapshot.timestamp
+        )
+        for required_fields, parser in self.parsers.items():
+            # Parsers that list the compressed formats they accept get color
+            # images of these formats as they were received, along with
+            # their format, instead of decoded.
+            kwargs = {}
+            encoded = False
+            if hasattr(parser, "color_image_formats"):
+                encoded = (
+                    snapshot.color_image_format in parser.color_image_formats
+                )
+                kwargs["color_image_format"] = (
+                    snapshot.color_image_format if encoded else "raw"
+                )
+            args = [
+                snapshot.encoded_color_image
+                if encoded and field == "color_image" else snapshot[field]
+                for field in required_fields
+                if field in self.supported_fields
+            ]
+            parser(context, *args, **kwargs)
+
+        self.parsed_snapshots += 1
+        print(f"Server processed {self.parsed_snapshots} snapshots.")
+
     def get_user_id_and_snapshot(self, data: bytes) -> tuple:
         msg_index = 0
         user_information_size = from_bytes(
@@ -139,6 +449,11 @@ class Server:
             msg_index == len(data)
         ), "Message length received doesn't match."
 
+        if not self.color_images.resolve(
+            user_id=user_information.id, parsed=parsed_snapshot.color_image
+        ):
+            # Referred to a color image by a hash that isn't kept.
+            return (user_information, None)
         snapshot = Snapshot.from_parsed(parsed=parsed_snapshot)
 
         return (user_information, snapshot)
@@ -150,7 +465,33 @@ class Server:
 @click.command()
 @click.argument("address")
 @click.argument("data_dir")
-def run_server(address: str, data_dir: str):
+@click.option(
+    "--color-image-cache-size",
+    type=int,
+    default=DEFAULT_COLOR_IMAGE_CACHE_SIZE,
+    help="How many color images to keep per user, so that clients may "
+    "refer to them by their hashes (0 disables it).",
+)
+@click.option(
+    "--color-image-cache-users",
+    type=int,
+    default=DEFAULT_COLOR_IMAGE_CACHE_USERS,
+    help="How many users' color images to keep, dropping those of the "
+    "least recently active users.",
+)
+@click.option(
+    "--max-stream-record-size",
+    type=int,
+    default=DEFAULT_MAX_STREAM_RECORD_SIZE_IN_BYTES,
+    help="The largest snapshot accepted in a stream, in bytes.",
+)
+def run_server(
+    address: str,
+    data_dir: str,
+    color_image_cache_size: int = DEFAULT_COLOR_IMAGE_CACHE_SIZE,
+    color_image_cache_users: int = DEFAULT_COLOR_IMAGE_CACHE_USERS,
+    max_stream_record_size: int = DEFAULT_MAX_STREAM_RECORD_SIZE_IN_BYTES,
+):
     """
     Runs a server that serves some data directory.
     Can be stopped by `Ctrl+C`.
@@ -159,8 +500,24 @@ def run_server(address: str, data_dir: str):
     :type address: str
     :param data_dir: A path to the data directory the server will serve.
     :type data_dir: str ot Path-like objects
+    :param color_image_cache_size: How many color images to keep per user,
+        so that clients may refer to them by their hashes.
+    :type color_image_cache_size: int
+    :param color_image_cache_users: How many users' color images to keep,
+        which bounds the memory they take.
+    :type color_image_cache_users: int
+    :param max_stream_record_size: The largest snapshot accepted in a
+        stream, in bytes, which bounds the memory a stream takes.
+    :type max_stream_record_size: int
 
     """
     ip, port = address.split(":", 1)
-    server = Server(host=ip, port=port, data_dir_path=data_dir)
+    server = Server(
+        host=ip,
+        port=port,
+        data_dir_path=data_dir,
+        color_image_cache_size=color_image_cache_size,
+        max_stream_record_size=max_stream_record_size,
+        color_image_cache_users=color_image_cache_users,
+    )
     server.run()
@@ -1,5 +1,9 @@
 import datetime as dt
+import hashlib
 import struct
+from typing import Dict, List, Optional, Union
+
+import numpy as np
 
 from project_pb2 import (
     ColorImage,
@@ -7,9 +11,50 @@ from project_pb2 import (
     Feelings,
     Pose,
     ProtoSnapshot,
+    ProtoSnapshotBatch,
+)
+
+from .constants import FLOAT_SIZE_IN_BYTES
+from .utils import (
+    decode_image,
+    decode_varint,
+    encode_image,
+    iter_fields,
+    read_image_size,
+    swap_red_and_blue,
+)
+from .utils.wire import (
+    Field,
+    WIRE_TYPE_FIXED32,
+    WIRE_TYPE_FIXED64,
+    WIRE_TYPE_LENGTH_DELIMITED,
+    WIRE_TYPE_VARINT,
+    encode_varint,
+    make_tag,
+    project_fields,
 )
 
 NUM_BYTES_PIXEL_COLOR_IMAGE = 3  # RGB format.
+COLOR_IMAGE_ORDERS = ("rgb", "bgr")
+# A color image is either "raw", RGB pixels, or an image file.
+COLOR_IMAGE_FORMATS = ("raw", "jpeg", "png")
+COLOR_IMAGE_PROTO_FORMATS = {
+    "raw": ColorImage.RAW,
+    "jpeg": ColorImage.JPEG,
+    "png": ColorImage.PNG,
+}
+COLOR_IMAGE_FORMATS_BY_PROTO_FORMAT = {
+    proto_format: format
+    for format, proto_format in COLOR_IMAGE_PROTO_FORMATS.items()
+}
+# The fields that can be left out of a snapshot, e.g. when reading a sample.
+SNAPSHOT_FIELDS = (
+    "translation",
+    "rotation",
+    "color_image",
+    "depth_image",
+    "feelings",
+)
 
 EMPTY_TRANSLATION = (0.0, 0.0, 0.0)
 EMPTY_ROTATION = (0.0, 0.0, 0.0, 0.0)
@@ -17,12 +62,90 @@ EMPTY_DIM = 0
 EMPTY_COLOR_IMAGE = b""
 EMPTY_DEPTH_IMAGE = ()
 EMPTY_FEELINGS = (0.0, 0.0, 0.0, 0.0)
+# The encodings of depth image pixels a server accepts are listed in this
+# header of its `/config` response: "repeated", a float per pixel in
+# `DepthImage.data`, which every server accepts, and the raw pixels in
+# `DepthImage.packed_data`, either "packed" as 32-bit floats or quantized,
+# losing precision for half the size, as "float16" or "uint16_mm", whole
+# millimetres.
+DEPTH_IMAGE_ENCODINGS_HEADER = "X-Depth-Image-Encodings"
+DEPTH_IMAGE_ENCODINGS = ("repeated", "packed", "float16", "uint16_mm")
+# The encodings that are lossy.
+QUANTIZED_DEPTH_IMAGE_ENCODINGS = ("float16", "uint16_mm")
+DEPTH_IMAGE_PACKED_ENCODINGS = {
+    "packed": DepthImage.FLOAT32,
+    "float16": DepthImage.FLOAT16,
+    "uint16_mm": DepthImage.UINT16_MILLIMETRES,
+}
+# The dtypes of the packed pixels, by `DepthImage.packed_encoding`.
+DEPTH_IMAGE_PACKED_DTYPES = {
+    DepthImage.FLOAT32: np.dtype("<f4"),
+    DepthImage.FLOAT16: np.dtype("<f2"),
+    DepthImage.UINT16_MILLIMETRES: np.dtype("<u2"),
+}
+MILLIMETRES_IN_METRE = 1000
+# A server that keeps the color images it received, by their hashes, lists
+# how many it keeps per user in this header of its `/config` response.
+COLOR_IMAGE_CACHE_SIZE_HEADER = "X-Color-Image-Cache-Size"
+COLOR_IMAGE_HASH_SIZE_IN_BYTES = 16
+# The formats of color images a server accepts are listed in this header of
+# its `/config` response, and servers that don't list it only accept "raw".
+COLOR_IMAGE_FORMATS_HEADER = "X-Color-Image-Formats"
+# A server that takes a whole sample as a stream of size-prefixed records
+# in a single request lists "stream" in this header of its `/config`
+# response, along with its other upload endpoints.
+UPLOAD_ENDPOINTS_HEADER = "X-Upload-Endpoints"
+# The tags of the fields of `ProtoSnapshotBatch`, both embedded messages.
+BATCH_USER_INFORMATION_TAG = bytes([
+    make_tag(
+        field_number=ProtoSnapshotBatch.USER_INFORMATION_FIELD_NUMBER,
+        wire_type=WIRE_TYPE_LENGTH_DELIMITED,
+    )
+])
+BATCH_SNAPSHOT_TAG = bytes([
+    make_tag(
+        field_number=ProtoSnapshotBatch.SNAPSHOTS_FIELD_NUMBER,
+        wire_type=WIRE_TYPE_LENGTH_DELIMITED,
+    )
+])
+
+
+class InvalidColorImageError(ValueError):
+    """
+    A received color image is of an unknown format, or is an image file
+    whose dimensions aren't the ones it is sent with.
+    """
 
 
 class Snapshot:
     """
     A class representing the third message in the protocol, a snapshot message.
+    The color image may be kept in BGR order, as stated by
+    `color_image_order`, or compressed, as stated by `color_image_format`,
+    in which case it is converted to RGB pixels only when the `color_image`
+    attribute is first accessed, and `encoded_color_image` gives it as is.
+    Snapshots are kept compact, since many of them are held at once while
+    reading ahead or batching: attributes are slots, the depth image is a
+    flat float32 array (whatever it is given as), the color image is kept
+    as the `bytes` or `memoryview` it is given as, and `datetime` is built
+    only when first accessed.
     """
+    __slots__ = (
+        "timestamp",
+        "translation",
+        "rotation",
+        "color_image_width",
+        "color_image_height",
+        "_color_image",
+        "color_image_order",
+        "color_image_format",
+        "depth_image_width",
+        "depth_image_height",
+        "_depth_image",
+        "feelings",
+        "_datetime",
+    )
+
     def __init__(
         self,
         timestamp: int,
@@ -33,30 +156,92 @@ class Snapshot:
         color_image: bytes,
         depth_image_width: int,
         depth_image_height: int,
-        depth_image: tuple,
+        depth_image: Union[tuple, np.ndarray],
         feelings: tuple,
+        color_image_order: str = "rgb",
+        color_image_format: str = "raw",
     ):
         self.timestamp = timestamp
-        self.datetime = dt.datetime.fromtimestamp(
-            self.timestamp / 1000, tz=dt.timezone.utc
-        )
+        self._datetime: Optional[dt.datetime] = None
         assert len(translation) == 3
         assert len(rotation) == 4
-        assert (
+        assert color_image_format in COLOR_IMAGE_FORMATS
+        assert color_image_format != "raw" or (
             len(color_image) == NUM_BYTES_PIXEL_COLOR_IMAGE * color_image_width * color_image_height  # noqa: E501
         )
         assert len(depth_image) == depth_image_width * depth_image_height
         assert len(feelings) == 4
+        assert color_image_order in COLOR_IMAGE_ORDERS
+        # Image files are always decoded to RGB.
+        assert color_image_format == "raw" or color_image_order == "rgb"
         self.translation = translation
         self.rotation = rotation
         self.color_image_width = color_image_width
         self.color_image_height = color_image_height
-        self.color_image = color_image
+        self._color_image = color_image
+        self.color_image_order = color_image_order
+        self.color_image_format = color_image_format
         self.depth_image_width = depth_image_width
         self.depth_image_height = depth_image_height
         self.depth_image = depth_image
         self.feelings = feelings
 
+    @property
+    def datetime(self) -> dt.datetime:
+        if self._datetime is None:
+            self._datetime = dt.datetime.fromtimestamp(
+                self.timestamp / 1000, tz=dt.timezone.utc
+            )
+        return self._datetime
+
+    @property
+    def depth_image(self) -> np.ndarray:
+        return self._depth_image
+
+    @depth_image.setter
+    def depth_image(self, depth_image: Union[tuple, np.ndarray]):
+        # Arrays that already hold float32 pixels aren't copied.
+        self._depth_image = np.asarray(depth_image, dtype="<f4").reshape(-1)
+
+    @property
+    def color_image(self) -> bytes:
+        # The image is decoded, or its channels are swapped, on first access
+        # and the result is kept.
+        if self.color_image_format != "raw":
+            self._color_image = decode_image(
+                data=self._color_image,
+                width=self.color_image_width,
+                height=self.color_image_height,
+            )
+            self.color_image_format = "raw"
+        if self.color_image_order != "rgb":
+            self._color_image = swap_red_and_blue(self._color_image)
+            self.color_image_order = "rgb"
+        return self._color_image
+
+    def get_color_image(self, order: str = "rgb") -> bytes:
+        """
+        The color image in the requested channel order, swapping its channels
+        only if it is held in the other order.
+        """
+        assert order in COLOR_IMAGE_ORDERS
+        if order == "rgb":
+            return self.color_image
+        elif self.color_image_order == order:
+            return self._color_image
+        else:
+            return swap_red_and_blue(self.color_image)
+
+    @property
+    def encoded_color_image(self) -> bytes:
+        """
+        The color image as it is held, an image file of `color_image_format`
+        or its RGB pixels, without decoding it.
+        """
+        if self.color_image_format == "raw":
+            return self.color_image
+        return self._color_image
+
     def __repr__(self) -> str:
         return (
             f"{self.__class__.__name__}"
@@ -88,7 +273,7 @@ class Snapshot:
             self.color_image == other.color_image,
             self.depth_image_width == other.depth_image_width,
             self.depth_image_height == other.depth_image_height,
-            self.depth_image == other.depth_image,
+            np.array_equal(self.depth_image, other.depth_image),
             self.feelings == other.feelings
         ]
         fields = [
@@ -122,6 +307,24 @@ class Snapshot:
 
     @classmethod
     def from_parsed(cls, parsed: ProtoSnapshot) -> "Snapshot":
+        """
+        Build a snapshot of a parsed `ProtoSnapshot`, keeping a compressed
+        color image as is, after checking its dimensions in its header.
+
+        :raises InvalidColorImageError: If the color image is of an unknown
+            format, or isn't an image file of its width and height.
+        :raises ValueError: If the depth image's pixels can't be decoded,
+            or there aren't as many of them as its dimensions tell.
+
+        """
+        depth_image = decode_depth_image(parsed=parsed.depth_image)
+        if len(depth_image) != (
+            parsed.depth_image.width * parsed.depth_image.height
+        ):
+            raise ValueError(
+                f"The depth image has {len(depth_image)} pixels instead of "
+                f"{parsed.depth_image.width}x{parsed.depth_image.height}."
+            )
         return cls(
             timestamp=parsed.datetime,
             translation=(
@@ -138,9 +341,10 @@ class Snapshot:
             color_image_width=parsed.color_image.width,
             color_image_height=parsed.color_image.height,
             color_image=parsed.color_image.data,
+            color_image_format=_check_color_image(parsed=parsed.color_image),
             depth_image_width=parsed.depth_image.width,
             depth_image_height=parsed.depth_image.height,
-            depth_image=tuple(parsed.depth_image.data),
+            depth_image=depth_image,
             feelings=(
                 round(parsed.feelings.hunger, 6),
                 round(parsed.feelings.thirst, 6),
@@ -149,46 +353,131 @@ class Snapshot:
             ),
         )
 
-    def serialize(self) -> bytes:
-        proto_snapshot = ProtoSnapshot(
-            datetime=self.timestamp,
-            pose=Pose(
-                translation=Pose.Translation(
-                    x=self.translation[0],
-                    y=self.translation[1],
-                    z=self.translation[2],
-                ),
-                rotation=Pose.Rotation(
-                    x=self.rotation[0],
-                    y=self.rotation[1],
-                    z=self.rotation[2],
-                    w=self.rotation[3],
-                ),
-            ),
-            color_image=ColorImage(
+    def to_proto(
+        self,
+        fields: Optional[tuple] = None,
+        depth_image_encoding: str = "repeated",
+        color_image_hash: Optional[bytes] = None,
+        color_image_by_hash: bool = False,
+        color_image_format: str = "raw",
+        encoded_color_image: Optional[bytes] = None,
+    ) -> ProtoSnapshot:
+        """
+        Build a `ProtoSnapshot` of the snapshot, holding only the given
+        `fields` of `SNAPSHOT_FIELDS`, if any, and leaving the others unset.
+        The depth image's pixels are set in `depth_image_encoding`, one of
+        `DEPTH_IMAGE_ENCODINGS`, which only receivers that list it can
+        decode, except for "repeated".
+        `color_image_hash`, the `hash_color_image` of the color image as it
+        is sent, is set as its `data_hash` if given, and with
+        `color_image_by_hash` the image is referred to by it alone, leaving
+        its pixels out.
+        The color image is set in `color_image_format`, one of
+        `COLOR_IMAGE_FORMATS`, compressing it unless it is already held in
+        that format, or is given in it as `encoded_color_image`, e.g. since
+        it was compressed to be hashed.
+        """
+        if fields is None:
+            fields = SNAPSHOT_FIELDS
+        # Built with keyword arguments, since setting submessages afterwards
+        # would copy them, images included.
+        pose = {}
+        if "translation" in fields:
+            pose["translation"] = Pose.Translation(
+                x=self.translation[0],
+                y=self.translation[1],
+                z=self.translation[2],
+            )
+        if "rotation" in fields:
+            pose["rotation"] = Pose.Rotation(
+                x=self.rotation[0],
+                y=self.rotation[1],
+                z=self.rotation[2],
+                w=self.rotation[3],
+            )
+        messages = {}
+        if pose:
+            messages["pose"] = Pose(**pose)
+        if "color_image" in fields and color_image_by_hash:
+            messages["color_image"] = ColorImage(
                 width=self.color_image_width,
                 height=self.color_image_height,
-                data=self.color_image,
-            ),
-            depth_image=DepthImage(
+                data_hash=color_image_hash,
+                format=COLOR_IMAGE_PROTO_FORMATS[color_image_format],
+            )
+        elif "color_image" in fields:
+            messages["color_image"] = ColorImage(
+                width=self.color_image_width,
+                height=self.color_image_height,
+                # Protobuf only accepts `bytes`.
+                data=bytes(
+                    self.get_encoded_color_image(format=color_image_format)
+                    if encoded_color_image is None else encoded_color_image
+                ),
+                data_hash=color_image_hash,
+                format=COLOR_IMAGE_PROTO_FORMATS[color_image_format],
+            )
+        if "depth_image" in fields and depth_image_encoding != "repeated":
+            messages["depth_image"] = DepthImage(
                 width=self.depth_image_width,
                 height=self.depth_image_height,
-                data=self.depth_image,
-            ),
-            feelings=Feelings(
+                packed_data=encode_depth_image(
+                    depth_image=self.depth_image,
+                    encoding=depth_image_encoding,
+                ),
+                packed_encoding=(
+                    DEPTH_IMAGE_PACKED_ENCODINGS[depth_image_encoding]
+                ),
+            )
+        elif "depth_image" in fields:
+            messages["depth_image"] = DepthImage(
+                width=self.depth_image_width,
+                height=self.depth_image_height,
+                # Protobuf converts a list faster than an array.
+                data=self.depth_image.tolist(),
+            )
+        if "feelings" in fields:
+            messages["feelings"] = Feelings(
                 hunger=self.feelings[0],
                 thirst=self.feelings[1],
                 exhaustion=self.feelings[2],
                 happiness=self.feelings[3],
-            ),
+            )
+        return ProtoSnapshot(datetime=self.timestamp, **messages)
+
+    def serialize(self, depth_image_encoding: str = "repeated") -> bytes:
+        return frame(
+            proto_snapshot=self.to_proto(
+                depth_image_encoding=depth_image_encoding
+            )
         )
-        return b"".join(
-            [
-                struct.pack("<I", proto_snapshot.ByteSize()),
-                proto_snapshot.SerializeToString(),
-            ]
+
+    def get_encoded_color_image(self, format: str = "raw") -> bytes:
+        """
+        The color image in the requested format, one of
+        `COLOR_IMAGE_FORMATS`, compressing it only if it isn't held in that
+        format. Empty images stay empty.
+        """
+        assert format in COLOR_IMAGE_FORMATS
+        if self.color_image_format == format:
+            return self.encoded_color_image
+        if format == "raw" or not self.color_image_width:
+            return self.color_image
+        return encode_image(
+            image=self.color_image,
+            width=self.color_image_width,
+            height=self.color_image_height,
+            format=format,
         )
 
+    def project(self, fields: tuple) -> "SnapshotProjection":
+        """
+        A view of the snapshot in which only the given `fields` of
+        `SNAPSHOT_FIELDS` are set, sharing its buffers instead of copying
+        them as `clone_by_supported_fields` does.
+        """
+        return SnapshotProjection(snapshot=self, fields=fields)
+
     def clone_by_supported_fields(self, supported_fields: tuple) -> "Snapshot":
         if "translation" in supported_fields:
             translation = self.translation
@@ -201,11 +490,17 @@ class Snapshot:
         if "color_image" in supported_fields:
             color_image_width = self.color_image_width
             color_image_height = self.color_image_height
-            color_image = self.color_image
+            # Keeps the channel order and the format, so a pending swap or
+            # decoding stays deferred.
+            color_image = self._color_image
+            color_image_order = self.color_image_order
+            color_image_format = self.color_image_format
         else:
             color_image_width = EMPTY_DIM
             color_image_height = EMPTY_DIM
             color_image = EMPTY_COLOR_IMAGE
+            color_image_order = "rgb"
+            color_image_format = "raw"
         if "depth_image" in supported_fields:
             depth_image_width = self.depth_image_width
             depth_image_height = self.depth_image_height
@@ -215,7 +510,7 @@ class Snapshot:
             depth_image_height = EMPTY_DIM
             depth_image = EMPTY_DEPTH_IMAGE
         if "feelings" in supported_fields:
-            feelings = self.rotation
+            feelings = self.feelings
         else:
             feelings = EMPTY_FEELINGS
         return Snapshot(
@@ -229,4 +524,568 @@ class Snapshot:
             depth_image_height=depth_image_height,
             depth_image=depth_image,
             feelings=feelings,
+            color_image_order=color_image_order,
+            color_image_format=color_image_format,
+        )
+
+
+class SnapshotProjection:
+    """
+    A read-only view of a snapshot in which only some of its fields are
+    set, e.g. those a server supports. The other fields read as empty, and
+    the ones that are set are the snapshot's own objects, so no image is
+    copied or validated again. It serializes directly to a `ProtoSnapshot`
+    that holds only the fields that are set.
+
+    :param snapshot: The snapshot to view.
+    :type snapshot: Snapshot
+    :param fields: The fields of `SNAPSHOT_FIELDS` that are set.
+    :type fields: tuple
+
+    """
+    __slots__ = ("snapshot", "fields")
+
+    def __init__(self, snapshot: Snapshot, fields: tuple):
+        self.snapshot = snapshot
+        self.fields = tuple(fields)
+
+    def __getattr__(self, name: str) -> object:
+        # Only called for attributes that aren't slots.
+        field = PROJECTED_ATTRIBUTE_FIELDS.get(name)
+        if field is not None and field not in self.fields:
+            return PROJECTED_ATTRIBUTE_EMPTY_VALUES[name]
+        return getattr(self.snapshot, name)
+
+    def __getitem__(self, key: str) -> object:
+        return getattr(self, key)
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}"
+            f"(fields={self.fields!r}, snapshot={self.snapshot!r})"
+        )
+
+    def to_proto(
+        self,
+        depth_image_encoding: str = "repeated",
+        color_image_hash: Optional[bytes] = None,
+        color_image_by_hash: bool = False,
+        color_image_format: str = "raw",
+        encoded_color_image: Optional[bytes] = None,
+    ) -> ProtoSnapshot:
+        return self.snapshot.to_proto(
+            fields=self.fields,
+            depth_image_encoding=depth_image_encoding,
+            color_image_hash=color_image_hash,
+            color_image_by_hash=color_image_by_hash,
+            color_image_format=color_image_format,
+            encoded_color_image=encoded_color_image,
+        )
+
+    def serialize(self, depth_image_encoding: str = "repeated") -> bytes:
+        return frame(
+            proto_snapshot=self.to_proto(
+                depth_image_encoding=depth_image_encoding
+            )
+        )
+
+
+# The snapshot field that every projectable attribute belongs to, and the
+# value it reads as when that field isn't set.
+PROJECTED_ATTRIBUTE_FIELDS = {
+    "translation": "translation",
+    "rotation": "rotation",
+    "color_image_width": "color_image",
+    "color_image_height": "color_image",
+    "color_image": "color_image",
+    "encoded_color_image": "color_image",
+    "color_image_format": "color_image",
+    "depth_image_width": "depth_image",
+    "depth_image_height": "depth_image",
+    "depth_image": "depth_image",
+    "feelings": "feelings",
+}
+PROJECTED_ATTRIBUTE_EMPTY_VALUES = {
+    "translation": EMPTY_TRANSLATION,
+    "rotation": EMPTY_ROTATION,
+    "color_image_width": EMPTY_DIM,
+    "color_image_height": EMPTY_DIM,
+    "color_image": EMPTY_COLOR_IMAGE,
+    "encoded_color_image": EMPTY_COLOR_IMAGE,
+    "color_image_format": "raw",
+    "depth_image_width": EMPTY_DIM,
+    "depth_image_height": EMPTY_DIM,
+    "depth_image": np.empty(0, dtype="<f4"),
+    "feelings": EMPTY_FEELINGS,
+}
+
+
+def hash_color_image(color_image: bytes) -> bytes:
+    """
+    A hash of a color image as it is sent, i.e. its RGB pixels or its
+    compressed bytes, under which a receiver may keep the image so that it
+    is sent only once while it doesn't change. Receivers compute it again
+    to check the hashes they are sent.
+    """
+    return hashlib.blake2b(
+        color_image, digest_size=COLOR_IMAGE_HASH_SIZE_IN_BYTES
+    ).digest()
+
+
+def encode_depth_image(depth_image: np.ndarray, encoding: str) -> bytes:
+    """
+    The pixels of a depth image, in metres, as the `packed_data` of a
+    `DepthImage` in the given encoding, one of `DEPTH_IMAGE_PACKED_ENCODINGS`.
+    In "uint16_mm", pixels are rounded to whole millimetres, and those that
+    are negative, unknown (NaN) or beyond 65.535 metres are clipped.
+    """
+    if encoding == "uint16_mm":
+        millimetres = np.nan_to_num(
+            np.rint(depth_image * MILLIMETRES_IN_METRE), nan=0.0
         )
+        return np.clip(
+            millimetres, 0, np.iinfo("<u2").max
+        ).astype("<u2").tobytes()
+    dtype = DEPTH_IMAGE_PACKED_DTYPES[DEPTH_IMAGE_PACKED_ENCODINGS[encoding]]
+    return depth_image.astype(dtype).tobytes()
+
+
+def decode_depth_image(parsed: DepthImage) -> np.ndarray:
+    """
+    The pixels of a parsed `DepthImage` as a float32 array in metres, a
+    read-only view of `packed_data` if they were sent packed as 32-bit
+    floats, dequantized if they were sent in a lossy encoding, or else
+    converted from `data`.
+
+    :raises ValueError: If the pixels are of an unknown encoding, or aren't
+        a whole number of its values.
+    """
+    if parsed.packed_data:
+        dtype = DEPTH_IMAGE_PACKED_DTYPES.get(parsed.packed_encoding)
+        if dtype is None:
+            raise ValueError(
+                f"Unknown depth image encoding: {parsed.packed_encoding}."
+            )
+        depth_image = np.frombuffer(parsed.packed_data, dtype=dtype)
+        if parsed.packed_encoding == DepthImage.UINT16_MILLIMETRES:
+            return depth_image.astype("<f4") / MILLIMETRES_IN_METRE
+        return depth_image.astype("<f4", copy=False)
+    return np.fromiter(parsed.data, dtype="<f4", count=len(parsed.data))
+
+
+def _check_color_image(parsed: ColorImage) -> str:
+    # The format of a parsed color image, one of `COLOR_IMAGE_FORMATS`,
+    # whose dimensions, if it is an image file, are checked against its
+    # width and height, so a malformed image is rejected when it is received
+    # rather than when it is first decoded.
+    format = COLOR_IMAGE_FORMATS_BY_PROTO_FORMAT.get(parsed.format)
+    if format is None:
+        raise InvalidColorImageError(
+            f"Unknown color image format: {parsed.format}."
+        )
+    if format == "raw" or not parsed.data:
+        return format
+    try:
+        size = read_image_size(data=parsed.data)
+    except ValueError as error:
+        raise InvalidColorImageError(str(error)) from error
+    if size != (parsed.width, parsed.height):
+        raise InvalidColorImageError(
+            f"The color image is {size[0]}x{size[1]} instead of "
+            f"{parsed.width}x{parsed.height}."
+        )
+    return format
+
+
+def serialize_snapshot_batch(
+    user_information: bytes, snapshots: List[bytes]
+) -> bytes:
+    """
+    Serialize a `ProtoSnapshotBatch` from its serialized user information
+    and snapshots (without size prefixes). The messages are embedded by
+    writing their tags and lengths around them, instead of building the
+    batch message, which would copy every snapshot into it.
+    """
+    parts = [
+        BATCH_USER_INFORMATION_TAG,
+        encode_varint(value=len(user_information)),
+        user_information,
+    ]
+    for snapshot in snapshots:
+        parts += [
+            BATCH_SNAPSHOT_TAG,
+            encode_varint(value=len(snapshot)),
+            snapshot,
+        ]
+    return b"".join(parts)
+
+
+def frame(proto_snapshot: ProtoSnapshot) -> bytes:
+    # Serialized snapshots are prefixed with their size.
+    return b"".join(
+        [
+            struct.pack("<I", proto_snapshot.ByteSize()),
+            proto_snapshot.SerializeToString(),
+        ]
+    )
+
+
+class LazySnapshot(Snapshot):
+    """
+    A snapshot whose images are held as raw buffers, usually views into the
+    record it was read from, and decoded only when first accessed, so that
+    the memory and time spent on a snapshot scale with the fields that are
+    actually used.
+    The color image buffer holds pixels in `color_image_order`, and the depth
+    image buffer holds little-endian 32-bit floats.
+    """
+    __slots__ = ("_depth_image_buffer",)
+
+    def __init__(
+        self,
+        timestamp: int,
+        translation: tuple,
+        rotation: tuple,
+        color_image_width: int,
+        color_image_height: int,
+        color_image_buffer: bytes,
+        depth_image_width: int,
+        depth_image_height: int,
+        depth_image_buffer: bytes,
+        feelings: tuple,
+        color_image_order: str = "rgb",
+    ):
+        # `Snapshot.__init__` would decode the depth image to validate it.
+        self.timestamp = timestamp
+        self._datetime: Optional[dt.datetime] = None
+        assert len(translation) == 3
+        assert len(rotation) == 4
+        assert (
+            len(color_image_buffer) == NUM_BYTES_PIXEL_COLOR_IMAGE * color_image_width * color_image_height  # noqa: E501
+        )
+        assert (
+            len(depth_image_buffer) == FLOAT_SIZE_IN_BYTES * depth_image_width * depth_image_height  # noqa: E501
+        )
+        assert len(feelings) == 4
+        assert color_image_order in COLOR_IMAGE_ORDERS
+        self.translation = translation
+        self.rotation = rotation
+        self.color_image_width = color_image_width
+        self.color_image_height = color_image_height
+        # The color image is decoded, i.e. its channels are swapped if
+        # needed, by `Snapshot.color_image`.
+        self._color_image = color_image_buffer
+        self.color_image_order = color_image_order
+        self.color_image_format = "raw"
+        self.depth_image_width = depth_image_width
+        self.depth_image_height = depth_image_height
+        self._depth_image_buffer = depth_image_buffer
+        self._depth_image = None
+        self.feelings = feelings
+
+    @property
+    def depth_image(self) -> np.ndarray:
+        # A read-only view of the buffer, created on first access.
+        if self._depth_image is None:
+            self._depth_image = np.frombuffer(
+                self._depth_image_buffer, dtype="<f4"
+            )
+        return self._depth_image
+
+    @classmethod
+    def from_serialized(
+        cls, data: bytes, fields: Optional[tuple] = None
+    ) -> Snapshot:
+        """
+        Build a snapshot from a serialized `ProtoSnapshot` by scanning its
+        wire format, keeping its images as views into `data` instead of
+        parsing them. Only the `fields` of `SNAPSHOT_FIELDS` are read, if
+        given, and the rest are left empty.
+        A snapshot whose images can't be viewed, which `scan_serialized`
+        parses fully, is returned as the plain `Snapshot` it was parsed to.
+        """
+        parsed, color_image, depth_image = scan_serialized(
+            data=data, fields=fields
+        )
+        if any([
+            parsed.HasField("color_image"),
+            parsed.HasField("depth_image"),
+        ]):
+            return Snapshot.from_parsed(parsed=parsed)
+        color_image_width, color_image_height, color_image_buffer = (
+            color_image
+        )
+        depth_image_width, depth_image_height, depth_image_buffer = (
+            depth_image
+        )
+        return cls(
+            timestamp=parsed.datetime,
+            translation=(
+                parsed.pose.translation.x,
+                parsed.pose.translation.y,
+                parsed.pose.translation.z,
+            ),
+            rotation=(
+                parsed.pose.rotation.x,
+                parsed.pose.rotation.y,
+                parsed.pose.rotation.z,
+                parsed.pose.rotation.w,
+            ),
+            color_image_width=color_image_width,
+            color_image_height=color_image_height,
+            color_image_buffer=color_image_buffer,
+            depth_image_width=depth_image_width,
+            depth_image_height=depth_image_height,
+            depth_image_buffer=depth_image_buffer,
+            feelings=(
+                round(parsed.feelings.hunger, 6),
+                round(parsed.feelings.thirst, 6),
+                round(parsed.feelings.exhaustion, 6),
+                round(parsed.feelings.happiness, 6),
+            ),
+        )
+
+
+IMAGE_FIELD_NUMBERS = (
+    ProtoSnapshot.COLOR_IMAGE_FIELD_NUMBER,
+    ProtoSnapshot.DEPTH_IMAGE_FIELD_NUMBER,
+)
+# `ColorImage` and `DepthImage` share their field numbers.
+IMAGE_WIDTH_FIELD_NUMBER = ColorImage.WIDTH_FIELD_NUMBER
+IMAGE_HEIGHT_FIELD_NUMBER = ColorImage.HEIGHT_FIELD_NUMBER
+IMAGE_DATA_FIELD_NUMBER = ColorImage.DATA_FIELD_NUMBER
+# Only depth images have packed pixels, and the images' other fields differ:
+# the fields that hold their pixels, and the field that tells how they are
+# encoded, whose default is RGB pixels or 32-bit floats.
+IMAGE_PIXELS_FIELD_NUMBERS = {
+    ProtoSnapshot.COLOR_IMAGE_FIELD_NUMBER: (IMAGE_DATA_FIELD_NUMBER,),
+    ProtoSnapshot.DEPTH_IMAGE_FIELD_NUMBER: (
+        IMAGE_DATA_FIELD_NUMBER, DepthImage.PACKED_DATA_FIELD_NUMBER
+    ),
+}
+IMAGE_ENCODING_FIELD_NUMBERS = {
+    ProtoSnapshot.COLOR_IMAGE_FIELD_NUMBER: ColorImage.FORMAT_FIELD_NUMBER,
+    ProtoSnapshot.DEPTH_IMAGE_FIELD_NUMBER: (
+        DepthImage.PACKED_ENCODING_FIELD_NUMBER
+    ),
+}
+# The only encodings whose pixels can be located as is.
+IMAGE_SCANNED_ENCODINGS = {
+    ProtoSnapshot.COLOR_IMAGE_FIELD_NUMBER: ColorImage.RAW,
+    ProtoSnapshot.DEPTH_IMAGE_FIELD_NUMBER: DepthImage.FLOAT32,
+}
+EMPTY_SCANNED_IMAGE = (EMPTY_DIM, EMPTY_DIM, b"")
+
+
+def make_projection(fields: Optional[tuple] = None) -> dict:
+    """
+    The projection of a serialized `ProtoSnapshot`, as taken by
+    `utils.wire.project_fields`, that keeps only the given fields of
+    `SNAPSHOT_FIELDS` (all of them by default) and the timestamp.
+    """
+    if fields is None:
+        fields = SNAPSHOT_FIELDS
+    projection = {ProtoSnapshot.DATETIME_FIELD_NUMBER: None}
+    pose_projection = {}
+    if "translation" in fields:
+        pose_projection[Pose.TRANSLATION_FIELD_NUMBER] = None
+    if "rotation" in fields:
+        pose_projection[Pose.ROTATION_FIELD_NUMBER] = None
+    if len(pose_projection) == 2:
+        projection[ProtoSnapshot.POSE_FIELD_NUMBER] = None
+    elif pose_projection:
+        projection[ProtoSnapshot.POSE_FIELD_NUMBER] = pose_projection
+    for field, field_number in [
+        ("color_image", ProtoSnapshot.COLOR_IMAGE_FIELD_NUMBER),
+        ("depth_image", ProtoSnapshot.DEPTH_IMAGE_FIELD_NUMBER),
+        ("feelings", ProtoSnapshot.FEELINGS_FIELD_NUMBER),
+    ]:
+        if field in fields:
+            projection[field_number] = None
+    return projection
+
+
+def scan_serialized(data: bytes, fields: Optional[tuple] = None) -> tuple:
+    """
+    Scan the wire format of a serialized `ProtoSnapshot`, reading only the
+    given `fields` of `SNAPSHOT_FIELDS`, if any.
+    The images aren't parsed but located in `data`, while the rest of the
+    fields, which are small, are parsed as usual.
+    A depth image whose pixels aren't packed, which older encoders may
+    write, or are quantized, can't be located as a buffer of 32-bit floats,
+    and neither can a compressed color image be located as RGB pixels, so
+    such a snapshot is fully parsed instead.
+
+    :return: The parsed message, without its images unless it was fully
+        parsed, and the width, height and buffer of its color and depth
+        images.
+    :rtype: tuple
+
+    """
+    data = memoryview(data)
+    projection = make_projection(fields=fields)
+    images = {}
+    other_fields = []
+    for field in iter_fields(data=data):
+        if field.number not in projection:
+            continue
+        if all([
+            field.number in IMAGE_FIELD_NUMBERS,
+            field.wire_type == WIRE_TYPE_LENGTH_DELIMITED,
+        ]):
+            images[field.number] = _scan_image(data=data, field=field)
+        else:
+            other_fields.append(data[field.start:field.end])
+    color_image = images.get(
+        ProtoSnapshot.COLOR_IMAGE_FIELD_NUMBER, EMPTY_SCANNED_IMAGE
+    )
+    depth_image = images.get(
+        ProtoSnapshot.DEPTH_IMAGE_FIELD_NUMBER, EMPTY_SCANNED_IMAGE
+    )
+    if color_image is None or depth_image is None:
+        parsed = ProtoSnapshot.FromString(
+            project_fields(data=data, projection=projection)
+        )
+        color_image = (
+            parsed.color_image.width,
+            parsed.color_image.height,
+            parsed.color_image.data,
+        )
+        if parsed.color_image.format != ColorImage.RAW:
+            color_image = (
+                parsed.color_image.width,
+                parsed.color_image.height,
+                decode_image(
+                    data=parsed.color_image.data,
+                    width=parsed.color_image.width,
+                    height=parsed.color_image.height,
+                ),
+            )
+        depth_image = (
+            parsed.depth_image.width,
+            parsed.depth_image.height,
+            decode_depth_image(parsed=parsed.depth_image).tobytes(),
+        )
+        return parsed, color_image, depth_image
+
+    parsed = ProtoSnapshot.FromString(
+        project_fields(data=b"".join(other_fields), projection=projection)
+    )
+    return parsed, color_image, depth_image
+
+
+# The batch columns of the messages in `Pose`.
+POSE_COLUMNS = {
+    Pose.TRANSLATION_FIELD_NUMBER: "translations",
+    Pose.ROTATION_FIELD_NUMBER: "rotations",
+}
+# How the values of `double` and `float` fields are read.
+FIXED_VALUE_STRUCTS = {
+    WIRE_TYPE_FIXED64: struct.Struct("<d"),
+    WIRE_TYPE_FIXED32: struct.Struct("<f"),
+}
+
+
+def scan_into_columns(
+    data: bytes, row: int, columns: Dict[str, np.ndarray], depth_image: bool
+) -> tuple:
+    """
+    Scan the wire format of a serialized `ProtoSnapshot` into row `row` of
+    the preallocated columns of a batch, "timestamps" and those of
+    "translations", "rotations" and "feelings" that are given, decoding
+    their values straight into the columns instead of parsing the message.
+    Fields that aren't set, as proto3 leaves out zeros, are left as they
+    are, so the columns should be zeroed.
+
+    :return: The width, height and buffer of the depth image, located in
+        `data` if its pixels are packed 32-bit floats, or else decoded, if
+        `depth_image`, or an empty image.
+    :rtype: tuple
+
+    """
+    data = memoryview(data)
+    scanned_depth_image = EMPTY_SCANNED_IMAGE
+    for field in iter_fields(data=data):
+        if field.number == ProtoSnapshot.DATETIME_FIELD_NUMBER:
+            if field.wire_type == WIRE_TYPE_VARINT:
+                columns["timestamps"][row], _ = decode_varint(
+                    data=data, position=field.value_start
+                )
+        elif field.wire_type != WIRE_TYPE_LENGTH_DELIMITED:
+            continue
+        elif field.number == ProtoSnapshot.POSE_FIELD_NUMBER:
+            for subfield in iter_fields(
+                data=data, position=field.value_start, end=field.end
+            ):
+                column = columns.get(POSE_COLUMNS.get(subfield.number))
+                if column is not None and (
+                    subfield.wire_type == WIRE_TYPE_LENGTH_DELIMITED
+                ):
+                    _scan_values(data=data, field=subfield, values=column[row])
+        elif field.number == ProtoSnapshot.FEELINGS_FIELD_NUMBER:
+            if "feelings" in columns:
+                _scan_values(
+                    data=data, field=field, values=columns["feelings"][row]
+                )
+        elif field.number == ProtoSnapshot.DEPTH_IMAGE_FIELD_NUMBER:
+            if not depth_image:
+                continue
+            scanned_depth_image = _scan_image(data=data, field=field)
+            if scanned_depth_image is None:
+                # Unpacked or quantized pixels are decoded, which parses the
+                # depth image alone.
+                parsed = DepthImage.FromString(
+                    bytes(data[field.value_start:field.end])
+                )
+                scanned_depth_image = (
+                    parsed.width,
+                    parsed.height,
+                    decode_depth_image(parsed=parsed).tobytes(),
+                )
+    return scanned_depth_image
+
+
+def _scan_values(data: memoryview, field: Field, values: np.ndarray):
+    # The `double` or `float` fields of a message, e.g. `Pose.Translation`,
+    # into `values`, by their order: their field numbers are 1, 2, 3...
+    for subfield in iter_fields(
+        data=data, position=field.value_start, end=field.end
+    ):
+        value_struct = FIXED_VALUE_STRUCTS.get(subfield.wire_type)
+        if value_struct is not None and 0 < subfield.number <= len(values):
+            values[subfield.number - 1] = value_struct.unpack_from(
+                data, subfield.value_start
+            )[0]
+
+
+def _scan_image(data: memoryview, field: Field) -> Optional[tuple]:
+    # The width, height and pixels of a serialized image, or `None` if its
+    # pixels aren't a single length-delimited field of RGB pixels or 32-bit
+    # floats.
+    width, height, pixels = EMPTY_SCANNED_IMAGE
+    seen_pixels = False
+    for subfield in iter_fields(
+        data=data, position=field.value_start, end=field.end
+    ):
+        if subfield.number == IMAGE_WIDTH_FIELD_NUMBER:
+            width, _ = decode_varint(data=data, position=subfield.value_start)
+        elif subfield.number == IMAGE_HEIGHT_FIELD_NUMBER:
+            height, _ = decode_varint(
+                data=data, position=subfield.value_start
+            )
+        elif subfield.number in IMAGE_PIXELS_FIELD_NUMBERS[field.number]:
+            # A float per pixel in a packed repeated field, or the raw
+            # pixels in `packed_data`, which are laid out the same.
+            if seen_pixels or (
+                subfield.wire_type != WIRE_TYPE_LENGTH_DELIMITED
+            ):
+                return None
+            pixels = data[subfield.value_start:subfield.end]
+            seen_pixels = True
+        elif subfield.number == IMAGE_ENCODING_FIELD_NUMBERS[field.number]:
+            encoding, _ = decode_varint(
+                data=data, position=subfield.value_start
+            )
+            if encoding != IMAGE_SCANNED_ENCODINGS[field.number]:
+                return None
+    return width, height, pixels
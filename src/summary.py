@@ -0,0 +1,70 @@
+import datetime as dt
+from typing import Counter, Iterable
+
+import numpy as np
+
+
+class SampleSummary:
+    """
+    An overview of a sample: its number of snapshots, when it was recorded,
+    the gaps between consecutive snapshots, and the dimensions of their
+    images.
+
+    :param timestamps: The timestamps of the snapshots, in milliseconds.
+    :type timestamps: Iterable[int]
+    :param color_image_dimensions: The number of color images of every
+        (width, height).
+    :type color_image_dimensions: Counter[tuple]
+    :param depth_image_dimensions: The number of depth images of every
+        (width, height).
+    :type depth_image_dimensions: Counter[tuple]
+
+    """
+    def __init__(
+        self,
+        timestamps: Iterable[int],
+        color_image_dimensions: Counter[tuple],
+        depth_image_dimensions: Counter[tuple],
+    ):
+        self.timestamps = np.asarray(timestamps, dtype=np.uint64)
+        # Signed, so that snapshots out of order show as negative gaps.
+        self.gaps = np.diff(self.timestamps.astype(np.int64))
+        self.color_image_dimensions = color_image_dimensions
+        self.depth_image_dimensions = depth_image_dimensions
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __str__(self) -> str:
+        lines = [f"Snapshots: {len(self)}"]
+        if len(self) > 0:
+            lines += [
+                f"First timestamp: {format_timestamp(self.timestamps[0])}",
+                f"Last timestamp: {format_timestamp(self.timestamps[-1])}",
+            ]
+        if len(self.gaps) > 0:
+            largest = int(self.gaps.argmax())
+            lines.append(
+                f"Gaps: min {self.gaps.min()} ms, "
+                f"mean {self.gaps.mean():.1f} ms, "
+                f"max {self.gaps.max()} ms "
+                f"(between snapshots {largest + 1} and {largest + 2})"
+            )
+        for name, dimensions in [
+            ("Color images", self.color_image_dimensions),
+            ("Depth images", self.depth_image_dimensions),
+        ]:
+            lines.append(
+                f"{name}: " + ", ".join(
+                    f"{width}x{height} ({count})"
+                    for (width, height), count in dimensions.most_common()
+                )
+            )
+        return "\n".join(lines)
+
+
+def format_timestamp(timestamp: int) -> str:
+    datetime = dt.datetime.fromtimestamp(
+        int(timestamp) / 1000, tz=dt.timezone.utc
+    )
+    return f"{datetime.isoformat(timespec='milliseconds')} ({timestamp})"
@@ -21,6 +21,8 @@ class UserInformation:
             gender = "f"
         elif parsed.gender == ProtoUserInformation.Gender.OTHER:
             gender = "o"
+        else:
+            raise ValueError(f"Unknown gender: {parsed.gender}.")
 
         return cls(
             id=parsed.user_id,
@@ -29,19 +31,22 @@ class UserInformation:
             gender=gender
         )
 
-    def serialize(self) -> bytes:
+    def to_proto(self) -> ProtoUserInformation:
         if self.gender == "m":
             gender = ProtoUserInformation.Gender.MALE
         elif self.gender == "f":
             gender = ProtoUserInformation.Gender.FEMALE
         elif self.gender == "o":
             gender = ProtoUserInformation.Gender.OTHER
-        proto_user_information = ProtoUserInformation(
+        return ProtoUserInformation(
             user_id=self.id,
             username=self.username,
             birthday=self.birthday,
             gender=gender,
         )
+
+    def serialize(self) -> bytes:
+        proto_user_information = self.to_proto()
         return b"".join(
             [
                 struct.pack("<I", proto_user_information.ByteSize()),
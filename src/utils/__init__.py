@@ -1,10 +1,52 @@
 from .binary_converter import from_bytes, to_bytes
+from .block_file import BlockFile, BlockFileWriter
+from .codecs import Codec, find_codec, get_codec, register_codec
 from .connection import Connection
+from .file import (
+    RecordTooLargeError,
+    open_for_reading,
+    open_for_writing,
+    read_size_prefixed,
+    skip,
+    wait_for_growth,
+)
+from .image import (
+    decode_image,
+    encode_image,
+    read_image_size,
+    swap_red_and_blue,
+)
 from .listener import Listener
+from .mapped_file import MappedFile
+from .prefetcher import Prefetcher
+from .seekable_gzip import SeekableGzipFile, SyncFlushingGzipFile
+from .wire import decode_varint, iter_fields
 
 __all__ = [
+    "decode_image",
+    "decode_varint",
+    "encode_image",
+    "find_codec",
     "from_bytes",
+    "get_codec",
+    "iter_fields",
+    "open_for_reading",
+    "open_for_writing",
+    "read_image_size",
+    "read_size_prefixed",
+    "register_codec",
+    "skip",
+    "swap_red_and_blue",
     "to_bytes",
+    "wait_for_growth",
+    "BlockFile",
+    "BlockFileWriter",
+    "Codec",
     "Connection",
     "Listener",
+    "MappedFile",
+    "Prefetcher",
+    "RecordTooLargeError",
+    "SeekableGzipFile",
+    "SyncFlushingGzipFile",
 ]
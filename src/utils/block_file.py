@@ -0,0 +1,232 @@
+import bisect
+import collections
+import io
+import os
+import struct
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from .codecs import Codec, get_codec
+
+BLOCK_FILE_SUFFIX = ".blocks"
+BLOCK_FILE_MAGIC = b"MBLK"
+BLOCK_FILE_VERSION = 1
+# Magic, version and the name of the codec of the blocks.
+BLOCK_FILE_HEADER = struct.Struct("<4sB16s")
+# Compressed and uncompressed sizes of a block.
+BLOCK_HEADER = struct.Struct("<II")
+DEFAULT_BLOCK_SIZE_IN_BYTES = 2 ** 22
+
+
+class BlockFile:
+    """
+    A read-only, file-like object for block-framed files, in which the data
+    is split into blocks that are compressed independently of each other.
+    Reading a block hands the next ones to a thread pool, which decompresses
+    them concurrently while the current one is consumed: `zlib`, `bz2` and
+    `lzma` release the GIL while decompressing, so reads scale across cores.
+    Seeking goes straight to the block that holds the target, without
+    decompressing the ones before it.
+
+    :param path: A path to the block-framed file.
+    :type path: str
+    :param workers: The number of decompressing threads, defaults to the
+        number of CPUs.
+    :type workers: Optional[int]
+
+    """
+    def __init__(self, path: str, workers: Optional[int] = None):
+        self.path = path
+        self._file = open(path, "rb")
+        magic, version, codec_name = BLOCK_FILE_HEADER.unpack(
+            self._file.read(BLOCK_FILE_HEADER.size)
+        )
+        if magic != BLOCK_FILE_MAGIC or version != BLOCK_FILE_VERSION:
+            raise Exception(f"'{path}' isn't a supported block-framed file.")
+        self.codec: Codec = get_codec(
+            name=codec_name.rstrip(b"\x00").decode("ascii")
+        )
+        self._scan_blocks()
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._futures: Dict[int, Future] = {}
+        self._position = 0
+
+    def __len__(self) -> int:
+        return self._uncompressed_offsets[-1]
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            size = len(self) - self._position
+        chunks = []
+        while size > 0 and self._position < len(self):
+            i = bisect.bisect_right(
+                self._uncompressed_offsets, self._position
+            ) - 1
+            block = self._get_block(i=i)
+            start = self._position - self._uncompressed_offsets[i]
+            end = min(len(block), start + size)
+            chunks.append(memoryview(block)[start:end])
+            self._position += end - start
+            size -= end - start
+        return b"".join(chunks)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}.")
+        if position < 0:
+            raise ValueError(f"Negative seek position: {position}.")
+        self._position = position
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def seekable(self) -> bool:
+        return True
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._futures.clear()
+        self._file.close()
+
+    def __enter__(self) -> "BlockFile":
+        return self
+
+    def __exit__(self, *args: tuple):
+        self.close()
+
+    def _scan_blocks(self):
+        # Only the block headers are read, the blocks themselves are
+        # seeked past. A trailing block that wasn't completely written is
+        # left out.
+        self._compressed_offsets = []
+        self._compressed_sizes = []
+        self._uncompressed_offsets = [0]
+        file_size = os.fstat(self._file.fileno()).st_size
+        offset = BLOCK_FILE_HEADER.size
+        while offset + BLOCK_HEADER.size <= file_size:
+            self._file.seek(offset)
+            compressed_size, uncompressed_size = BLOCK_HEADER.unpack(
+                self._file.read(BLOCK_HEADER.size)
+            )
+            offset += BLOCK_HEADER.size
+            if offset + compressed_size > file_size:
+                break
+            self._compressed_offsets.append(offset)
+            self._compressed_sizes.append(compressed_size)
+            self._uncompressed_offsets.append(
+                self._uncompressed_offsets[-1] + uncompressed_size
+            )
+            offset += compressed_size
+
+    def _get_block(self, i: int) -> bytes:
+        # Blocks `i` up to `i + workers` are kept scheduled, and the others
+        # are dropped.
+        window = range(i, min(i + self.workers + 1, len(self._compressed_offsets)))  # noqa: E501
+        for j in list(self._futures):
+            if j not in window:
+                self._futures.pop(j).cancel()
+        for j in window:
+            if j not in self._futures:
+                # Reading is done here, in order, and only decompressing is
+                # done by the pool.
+                self._file.seek(self._compressed_offsets[j])
+                self._futures[j] = self._executor.submit(
+                    self.codec.decompress,
+                    self._file.read(self._compressed_sizes[j]),
+                )
+        return self._futures[i].result()
+
+
+class BlockFileWriter:
+    """
+    A file-like object that writes block-framed files (see `BlockFile`),
+    compressing full blocks concurrently in a thread pool.
+
+    :param path: A path to the block-framed file.
+    :type path: str
+    :param codec: The codec of the blocks.
+    :type codec: Codec
+    :param block_size: The number of uncompressed bytes in a block.
+    :type block_size: int
+    :param workers: The number of compressing threads, defaults to the
+        number of CPUs.
+    :type workers: Optional[int]
+
+    """
+    def __init__(
+        self,
+        path: str,
+        codec: Codec,
+        block_size: int = DEFAULT_BLOCK_SIZE_IN_BYTES,
+        workers: Optional[int] = None,
+    ):
+        self.codec = codec
+        self.block_size = block_size
+        self.workers = workers or os.cpu_count() or 1
+        self._file = open(path, "wb")
+        self._file.write(
+            BLOCK_FILE_HEADER.pack(
+                BLOCK_FILE_MAGIC,
+                BLOCK_FILE_VERSION,
+                codec.name.encode("ascii"),
+            )
+        )
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._pending = collections.deque()
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(block=bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return memoryview(data).nbytes
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self._buffer:
+            self._submit(block=bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._write_block()
+        self._executor.shutdown()
+        self._file.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def __enter__(self) -> "BlockFileWriter":
+        return self
+
+    def __exit__(self, *args: tuple):
+        self.close()
+
+    def _submit(self, block: bytes):
+        self._pending.append(
+            (len(block), self._executor.submit(self.codec.compress, block))
+        )
+        if len(self._pending) > 2 * self.workers:
+            self._write_block()
+
+    def _write_block(self):
+        # Blocks are written in order, whichever finishes first.
+        uncompressed_size, future = self._pending.popleft()
+        compressed = future.result()
+        self._file.write(
+            BLOCK_HEADER.pack(len(compressed), uncompressed_size)
+        )
+        self._file.write(compressed)
@@ -0,0 +1,131 @@
+import bz2
+import lzma
+import zlib
+from collections import namedtuple
+from typing import Dict, Optional
+
+from .seekable_gzip import SeekableGzipFile, SyncFlushingGzipFile
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# A compression format. `compress` and `decompress` work on whole buffers,
+# as used for the blocks of a `BlockFile`, and `reader` and `writer` open a
+# compressed file, given its path, as a file-like object.
+Codec = namedtuple(
+    "Codec", ["name", "suffix", "compress", "decompress", "reader", "writer"]
+)
+
+CODECS: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec):
+    """
+    Register a codec, making files with its suffix readable and writable by
+    the drivers and writers, and its name usable for blocks.
+
+    Args:
+        codec (Codec): The codec to register.
+    """
+    CODECS[codec.name] = codec
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Get a registered codec by its name.
+
+    Args:
+        name (str): The name of the codec.
+
+    Returns:
+        Codec: The codec.
+    """
+    if name not in CODECS:
+        raise Exception(
+            f"Codec '{name}' is not supported, or its package isn't "
+            f"installed."
+        )
+    return CODECS[name]
+
+
+def find_codec(path: str) -> Optional[Codec]:
+    """
+    Find the codec of a compressed file by its suffix.
+
+    Args:
+        path (str): A path to the file.
+
+    Returns:
+        Optional[Codec]: The codec, or `None` if the file isn't compressed.
+    """
+    for codec in CODECS.values():
+        if path.endswith(codec.suffix):
+            return codec
+    return None
+
+
+register_codec(
+    Codec(
+        name="gzip",
+        suffix=".gz",
+        # Blocks are zlib streams, the same deflate data without the gzip
+        # header.
+        compress=zlib.compress,
+        decompress=zlib.decompress,
+        reader=SeekableGzipFile,
+        writer=SyncFlushingGzipFile,
+    )
+)
+register_codec(
+    Codec(
+        name="bz2",
+        suffix=".bz2",
+        compress=bz2.compress,
+        decompress=bz2.decompress,
+        reader=lambda path: bz2.open(path, "rb"),
+        writer=lambda path: bz2.open(path, "wb"),
+    )
+)
+register_codec(
+    Codec(
+        name="lzma",
+        suffix=".xz",
+        compress=lzma.compress,
+        decompress=lzma.decompress,
+        reader=lambda path: lzma.open(path, "rb"),
+        writer=lambda path: lzma.open(path, "wb"),
+    )
+)
+if lz4 is not None:
+    register_codec(
+        Codec(
+            name="lz4",
+            suffix=".lz4",
+            compress=lz4.frame.compress,
+            decompress=lz4.frame.decompress,
+            reader=lambda path: lz4.frame.open(path, "rb"),
+            writer=lambda path: lz4.frame.open(path, "wb"),
+        )
+    )
+if zstandard is not None:
+    register_codec(
+        Codec(
+            name="zstd",
+            suffix=".zst",
+            # Compressors and decompressors aren't thread-safe, so one is
+            # created per block.
+            compress=lambda data: zstandard.ZstdCompressor().compress(data),
+            decompress=lambda data: (
+                zstandard.ZstdDecompressor().decompress(data)
+            ),
+            reader=lambda path: zstandard.open(path, "rb"),
+            writer=lambda path: zstandard.open(path, "wb"),
+        )
+    )
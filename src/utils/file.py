@@ -0,0 +1,169 @@
+import io
+import os
+import struct
+import threading
+import time
+from typing import BinaryIO, Optional
+
+from .block_file import BLOCK_FILE_SUFFIX, BlockFile, BlockFileWriter
+from .codecs import find_codec, get_codec
+from .mapped_file import MappedFile
+
+SIZE_PREFIX = struct.Struct("<I")
+
+
+def skip(file: BinaryIO, size: int) -> bool:
+    """
+    Move a file's position `size` bytes forward without reading the data in
+    between, when the file supports it.
+
+    Args:
+        file (BinaryIO): A seekable file opened for binary reading.
+        size (int): The number of bytes to skip.
+
+    Returns:
+        bool: Whether all the skipped bytes exist in the file. Seeking past
+        the end of a file doesn't fail, so the last skipped byte is read to
+        tell.
+    """
+    if size == 0:
+        return True
+    file.seek(size - 1, io.SEEK_CUR)
+    return len(file.read(1)) == 1
+
+
+class RecordTooLargeError(ValueError):
+    """
+    A size-prefixed record is larger than the reader accepts.
+    """
+
+
+def read_size_prefixed(
+    file: BinaryIO, max_size: Optional[int] = None
+) -> Optional[bytes]:
+    """
+    Read a record prefixed with its size, a little-endian uint32, from a
+    file or a stream, whose reads may return fewer bytes than asked for.
+
+    Args:
+        file (BinaryIO): A file opened for binary reading.
+        max_size (Optional[int]): The maximal size of the record, if any,
+        checked before it is read, since the size may come from an
+        untrusted peer.
+
+    Returns:
+        Optional[bytes]: The record, or `None` if the file ended before it.
+        A file that ends in the middle of a record raises an `EOFError`, and
+        a record larger than `max_size` a `RecordTooLargeError`.
+    """
+    size = _read_exactly(file=file, size=SIZE_PREFIX.size)
+    if size is None:
+        return None
+    (size,) = SIZE_PREFIX.unpack(size)
+    if max_size is not None and size > max_size:
+        raise RecordTooLargeError(
+            f"A record of {size} bytes is larger than {max_size} bytes."
+        )
+    record = _read_exactly(file=file, size=size)
+    if record is None:
+        raise EOFError("The file ended in the middle of a record.")
+    return record
+
+
+def open_for_reading(path: str, use_mmap: bool = False) -> BinaryIO:
+    """
+    Open a file for binary reading, decompressing it if its suffix is that
+    of a registered codec, or of a block-framed file.
+
+    Args:
+        path (str): A path to the file.
+        use_mmap (bool): Whether to memory-map the file, if it isn't
+        compressed.
+
+    Returns:
+        BinaryIO: The file.
+    """
+    if path.endswith(BLOCK_FILE_SUFFIX):
+        # The codec is recorded in the file.
+        return BlockFile(path)
+    codec = find_codec(path)
+    if codec is not None:
+        return codec.reader(path)
+    if use_mmap:
+        return MappedFile(path)
+    return open(path, "rb")
+
+
+def open_for_writing(path: str) -> BinaryIO:
+    """
+    Open a file for binary writing, compressing it if its suffix is that of
+    a registered codec. Gzip files stay seekable for `SeekableGzipFile`.
+    A block-framed file is compressed with the codec of the suffix before
+    its own (e.g. `.xz.blocks`), or with gzip's.
+
+    Args:
+        path (str): A path to the file.
+
+    Returns:
+        BinaryIO: The file.
+    """
+    if path.endswith(BLOCK_FILE_SUFFIX):
+        codec = find_codec(path[:-len(BLOCK_FILE_SUFFIX)])
+        return BlockFileWriter(path, codec=codec or get_codec(name="gzip"))
+    codec = find_codec(path)
+    if codec is not None:
+        return codec.writer(path)
+    return open(path, "wb")
+
+
+def wait_for_growth(
+    path: str,
+    size: int,
+    interval: float,
+    timeout: Optional[float] = None,
+    stop: Optional[threading.Event] = None,
+) -> bool:
+    """
+    Wait until a file that is being appended to grows past `size` bytes,
+    checking its size every `interval` seconds.
+    The wait ends early once `stop` is set, so that another thread may end
+    it.
+
+    Args:
+        path (str): A path to the file.
+        size (int): The file's size when it was last read.
+        interval (float): The number of seconds between checks, which bounds
+        the latency of noticing new data.
+        timeout (Optional[float]): The maximal number of seconds to wait, or
+        `None` to wait indefinitely.
+        stop (Optional[threading.Event]): An event that ends the wait once
+        it is set, if any.
+
+    Returns:
+        bool: Whether the file grew before the timeout, or before `stop`
+        was set.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while os.path.getsize(path) <= size:
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        if stop is None:
+            time.sleep(interval)
+        elif stop.wait(interval):
+            return False
+    return True
+
+
+def _read_exactly(file: BinaryIO, size: int) -> Optional[bytes]:
+    # `None` if the file ended before the first byte.
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = file.read(remaining)
+        if not chunk:
+            if remaining == size:
+                return None
+            raise EOFError("The file ended in the middle of a record.")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
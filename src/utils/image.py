@@ -0,0 +1,91 @@
+import io
+
+from PIL import Image
+
+NUM_CHANNELS_COLOR_IMAGE = 3
+
+
+def swap_red_and_blue(image: bytes) -> bytearray:
+    """
+    Swap the first and the third channels of a 3 channel image, converting it
+    from BGR to RGB or vice versa.
+    Each channel is copied with a single extended slice assignment instead of
+    a Python level loop over the pixels.
+
+    Args:
+        image (bytes): The pixels of the image, row by row.
+
+    Returns:
+        bytearray: The pixels of the image with the channels swapped.
+    """
+    swapped = bytearray(image)
+    swapped[0::NUM_CHANNELS_COLOR_IMAGE] = image[2::NUM_CHANNELS_COLOR_IMAGE]
+    swapped[2::NUM_CHANNELS_COLOR_IMAGE] = image[0::NUM_CHANNELS_COLOR_IMAGE]
+    return swapped
+
+
+def encode_image(image: bytes, width: int, height: int, format: str) -> bytes:
+    """
+    Compress an RGB image into an image file, e.g. a JPEG or a PNG.
+
+    Args:
+        image (bytes): The RGB pixels of the image, row by row.
+        width (int): The width of the image.
+        height (int): The height of the image.
+        format (str): The format of the file, as named by Pillow.
+
+    Returns:
+        bytes: The image file.
+    """
+    output = io.BytesIO()
+    Image.frombuffer("RGB", (width, height), image).save(output, format=format)
+    return output.getvalue()
+
+
+def read_image_size(data: bytes) -> tuple:
+    """
+    Read the dimensions of an image file, e.g. a JPEG or a PNG, from its
+    header, without decoding its pixels.
+
+    Args:
+        data (bytes): The image file.
+
+    Returns:
+        tuple: The width and the height of the image.
+
+    Raises:
+        ValueError: If the data isn't an image file.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except OSError as error:
+        raise ValueError("Not an image file.") from error
+
+
+def decode_image(data: bytes, width: int, height: int) -> bytes:
+    """
+    Decompress an image file, e.g. a JPEG or a PNG, into RGB pixels.
+
+    Args:
+        data (bytes): The image file.
+        width (int): The width the image is expected to have.
+        height (int): The height the image is expected to have.
+
+    Returns:
+        bytes: The RGB pixels of the image, row by row.
+
+    Raises:
+        ValueError: If the data isn't an image file of the expected
+            dimensions.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.size != (width, height):
+                raise ValueError(
+                    f"The image is {image.width}x{image.height} instead of "
+                    f"{width}x{height}."
+                )
+            return image.convert("RGB").tobytes()
+    except OSError as error:
+        raise ValueError("Not an image file.") from error
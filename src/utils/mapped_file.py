@@ -0,0 +1,69 @@
+import io
+import mmap
+import os
+from typing import Optional
+
+
+class MappedFile:
+    """
+    A read-only, file-like object backed by a memory mapping of a file.
+    `read` hands out `memoryview` slices of the mapping instead of copies, so
+    the pages are loaded lazily by the OS and can be reclaimed by it at any
+    time, keeping the resident memory roughly constant.
+
+    :param path: A path to the file to map.
+    :type path: str
+
+    """
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                # Empty files can't be mapped.
+                self._mmap: Optional[mmap.mmap] = None
+                self._view = memoryview(b"")
+            else:
+                self._mmap = mmap.mmap(
+                    file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+                self._view = memoryview(self._mmap)
+        self._position = 0
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    def read(self, size: int = -1) -> memoryview:
+        start = self._position
+        if size < 0:
+            end = len(self._view)
+        else:
+            end = min(start + size, len(self._view))
+        self._position = end
+        return self._view[start:end]
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}.")
+        if position < 0:
+            raise ValueError(f"Negative seek position: {position}.")
+        self._position = position
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    @property
+    def closed(self) -> bool:
+        return self._view is None
+
+    def close(self):
+        # Slices that were handed out keep the mapping alive, so instead of
+        # unmapping it here (which fails while they exist) the references are
+        # dropped and the mapping is released together with the last slice.
+        self._view = None
+        self._mmap = None
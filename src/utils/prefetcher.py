@@ -0,0 +1,123 @@
+import collections
+import threading
+from typing import Any, Callable, Iterator, Optional
+
+
+class Prefetcher:
+    """
+    An iterator over the items of another iterator, which a background
+    thread produces ahead of time into a bounded buffer, so that producing
+    the next items (e.g. reading and decompressing them) overlaps with
+    consuming the current one (e.g. uploading it).
+    An exception raised by the wrapped iterator is re-raised by `__next__`,
+    after the items produced before it.
+    An iterator that may wait indefinitely for its next item, e.g. one that
+    follows a growing file, should stop waiting once `stop` is set, which
+    `close` does before waiting for the background thread.
+
+    :param iterator: The iterator to prefetch from.
+    :type iterator: Iterator
+    :param depth: The maximal number of buffered items.
+    :type depth: int
+    :param max_bytes: The maximal total size of the buffered items, if any.
+        An item larger than that is still buffered, alone.
+    :type max_bytes: Optional[int]
+    :param size: A function that estimates the size of an item in bytes,
+        required by `max_bytes`.
+    :type size: Optional[Callable[[Any], int]]
+    :param stop: An event that is set on `close`, if any, which the wrapped
+        iterator checks while waiting.
+    :type stop: Optional[threading.Event]
+
+    """
+    def __init__(
+        self,
+        iterator: Iterator,
+        depth: int = 8,
+        max_bytes: Optional[int] = None,
+        size: Optional[Callable[[Any], int]] = None,
+        stop: Optional[threading.Event] = None,
+    ):
+        assert depth > 0
+        assert max_bytes is None or size is not None
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self._iterator = iterator
+        self._size = size
+        self._stop = threading.Event() if stop is None else stop
+        self._buffer = collections.deque()
+        self._buffered_bytes = 0
+        self._condition = threading.Condition()
+        self._exhausted = False
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def __iter__(self) -> "Prefetcher":
+        return self
+
+    def __next__(self) -> object:
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._buffer or self._exhausted
+            )
+            if self._buffer:
+                item, size = self._buffer.popleft()
+                self._buffered_bytes -= size
+                self._condition.notify_all()
+                return item
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        raise StopIteration
+
+    def close(self):
+        """
+        Stop prefetching and wait for the background thread to finish the
+        item it is producing, if any, telling the wrapped iterator to stop
+        waiting for it through `stop`.
+        """
+        self._stop.set()
+        with self._condition:
+            self._closed = True
+            self._buffer.clear()
+            self._buffered_bytes = 0
+            self._condition.notify_all()
+        self._thread.join()
+
+    def __enter__(self) -> "Prefetcher":
+        return self
+
+    def __exit__(self, *args: tuple):
+        self.close()
+
+    def _produce(self):
+        try:
+            for item in self._iterator:
+                size = 0 if self._size is None else self._size(item)
+                with self._condition:
+                    self._condition.wait_for(
+                        lambda: self._closed or self._has_room(size=size)
+                    )
+                    if self._closed:
+                        return
+                    self._buffer.append((item, size))
+                    self._buffered_bytes += size
+                    self._condition.notify_all()
+        except BaseException as error:
+            # Handed over to the consuming thread.
+            self._error = error
+        finally:
+            with self._condition:
+                self._exhausted = True
+                self._condition.notify_all()
+
+    def _has_room(self, size: int) -> bool:
+        if not self._buffer:
+            return True
+        if len(self._buffer) >= self.depth:
+            return False
+        if self.max_bytes is None:
+            return True
+        return self._buffered_bytes + size <= self.max_bytes
@@ -0,0 +1,385 @@
+import bisect
+import gzip
+import io
+import os
+import struct
+import zlib
+from collections import namedtuple
+from typing import List, Optional
+
+CHUNK_SIZE_IN_BYTES = 2 ** 16
+# Deflate back-references reach at most 32 KiB back, so this much of the
+# preceding output is all that is needed to resume decompression.
+WINDOW_SIZE_IN_BYTES = 2 ** 15
+DEFAULT_CHECKPOINT_INTERVAL_IN_BYTES = 2 ** 22
+GZIP_TRAILER_SIZE_IN_BYTES = 8
+# A sync flush ends with an empty stored block, which leaves the compressed
+# stream byte aligned right after these bytes.
+SYNC_FLUSH_MARKER = b"\x00\x00\xff\xff"
+# A candidate restart point is verified by decompressing at least this much
+# of what follows it both ways.
+MIN_VERIFICATION_SIZE_IN_BYTES = 2 ** 10
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+RAW_DEFLATE_WBITS = -zlib.MAX_WBITS
+
+CHECKPOINTS_MAGIC = b"MGZI"
+CHECKPOINTS_VERSION = 1
+# Magic, version, compressed file size and number of checkpoints.
+CHECKPOINTS_HEADER = struct.Struct("<4sBQI")
+# Compressed offset, uncompressed offset and window size (-1 for a member's
+# start, where no window is needed).
+CHECKPOINT_HEADER = struct.Struct("<QQi")
+
+# A point in the compressed file from which decompression can resume.
+# `window` is `None` at the start of a gzip member, otherwise it is the output
+# preceding the point and decompression resumes as raw deflate.
+Checkpoint = namedtuple(
+    "Checkpoint", ["compressed_offset", "uncompressed_offset", "window"]
+)
+
+
+class SeekableGzipFile:
+    """
+    A read-only, file-like object for gzip files that seeks without
+    decompressing from the start of the file, in the spirit of zlib's `zran`.
+    While reading, it records a checkpoint roughly every
+    `checkpoint_interval` bytes of output: the compressed and uncompressed
+    offsets of a point where the deflate stream is byte aligned, together
+    with the 32 KiB of output that precede it. A seek then resumes from the
+    closest checkpoint before the target. Checkpoints are persisted in a
+    sidecar file (`<path>.gzidx`), so later readers, possibly running in
+    parallel on different ranges of the file, start with them.
+
+    Python's `zlib` can't resume at an arbitrary bit offset, so restart
+    points are the starts of gzip members and the byte aligned points left by
+    sync flushes, which `pigz` and `GzipFile.flush(zlib.Z_SYNC_FLUSH)` emit.
+    Files with neither still read correctly, but seeking backwards in them
+    decompresses from the start.
+
+    :param path: A path to the gzip file.
+    :type path: str
+    :param checkpoint_interval: The minimal number of uncompressed bytes
+        between checkpoints.
+    :type checkpoint_interval: int
+
+    """
+    def __init__(
+        self,
+        path: str,
+        checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL_IN_BYTES,
+    ):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoints_path = f"{path}.gzidx"
+        self._file = open(path, "rb")
+        self._compressed_size = os.fstat(self._file.fileno()).st_size
+        self.checkpoints: List[Checkpoint] = (
+            self._load_checkpoints() or [Checkpoint(0, 0, None)]
+        )
+        self._new_checkpoints = False
+        self._restart(checkpoint=self.checkpoints[0])
+
+    def read(self, size: int = -1) -> bytes:
+        while (size < 0 or len(self._buffer) < size) and not self._eof:
+            self._fill()
+        if size < 0 or size >= len(self._buffer):
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        else:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        self._position += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            target = offset
+        elif whence == io.SEEK_CUR:
+            target = self._position + offset
+        else:
+            raise ValueError("Seeking from the end isn't supported.")
+        if target < 0:
+            raise ValueError(f"Negative seek position: {target}.")
+
+        frontier = self._position + len(self._buffer)
+        checkpoint = self.checkpoints[
+            bisect.bisect_right(
+                self.checkpoints,
+                target,
+                key=lambda checkpoint: checkpoint.uncompressed_offset,
+            ) - 1
+        ]
+        if target < self._position or checkpoint.uncompressed_offset > frontier:  # noqa: E501
+            # Going forward from the current position would decompress more
+            # than going forward from the checkpoint.
+            self._restart(checkpoint=checkpoint)
+        while self._position < target:
+            if not self._buffer:
+                if self._eof:
+                    break
+                self._fill()
+            skipped = min(len(self._buffer), target - self._position)
+            del self._buffer[:skipped]
+            self._position += skipped
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def seekable(self) -> bool:
+        return True
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._save_checkpoints()
+        self._file.close()
+
+    def __enter__(self) -> "SeekableGzipFile":
+        return self
+
+    def __exit__(self, *args: tuple):
+        self.close()
+
+    def _restart(self, checkpoint: Checkpoint):
+        self._file.seek(checkpoint.compressed_offset)
+        self._input_offset = checkpoint.compressed_offset
+        self._position = checkpoint.uncompressed_offset
+        self._buffer = bytearray()
+        self._eof = False
+        self._trailer_to_skip = 0
+        if checkpoint.window is None:
+            # Created when the member's header is reached.
+            self._decompressor = None
+            self._window = b""
+        else:
+            self._decompressor = zlib.decompressobj(
+                wbits=RAW_DEFLATE_WBITS, zdict=checkpoint.window
+            )
+            self._raw = True
+            self._window = checkpoint.window
+
+    def _fill(self):
+        data = self._file.read(CHUNK_SIZE_IN_BYTES)
+        if not data:
+            self._eof = True
+            self._save_checkpoints()
+            if self._decompressor is not None or self._trailer_to_skip:
+                raise EOFError(
+                    "Compressed file ended before the end-of-stream marker "
+                    "was reached."
+                )
+            return
+        while data:
+            data = self._feed(data)
+
+    def _feed(self, data: bytes) -> bytes:
+        # Decompress a prefix of `data`, the compressed bytes right after the
+        # ones fed so far, and return the rest.
+        if self._trailer_to_skip:
+            skipped = min(self._trailer_to_skip, len(data))
+            self._trailer_to_skip -= skipped
+            return self._consume(data, skipped)
+        if self._decompressor is None:
+            # Between members, which may be padded with zeros.
+            padding = len(data) - len(data.lstrip(b"\x00"))
+            if padding:
+                return self._consume(data, padding)
+            self._add_checkpoint(window=None)
+            self._decompressor = zlib.decompressobj(wbits=GZIP_WBITS)
+            self._raw = False
+
+        # Stop right after every candidate restart point.
+        marker = data.find(SYNC_FLUSH_MARKER)
+        if marker < 0:
+            return self._inflate(data)
+        end = marker + len(SYNC_FLUSH_MARKER)
+        rest = self._inflate(data[:end])
+        if rest or self._decompressor is None:
+            # The stream ended before the marker.
+            return rest + data[end:]
+        rest = data[end:]
+        if any([
+            not self._is_checkpoint_due(),
+            len(rest) < MIN_VERIFICATION_SIZE_IN_BYTES,
+        ]):
+            return rest
+        window = self._window
+        compressed_offset = self._input_offset
+        uncompressed_offset = self._position + len(self._buffer)
+        try:
+            expected = zlib.decompressobj(
+                wbits=RAW_DEFLATE_WBITS, zdict=window
+            ).decompress(rest)
+        except zlib.error:
+            # The marker's bytes happened to appear inside a block.
+            expected = None
+        rest = self._inflate(rest)
+        if expected and self._buffer[
+            uncompressed_offset - self._position:
+        ][:len(expected)] == expected:
+            self._add_checkpoint(
+                window=window,
+                compressed_offset=compressed_offset,
+                uncompressed_offset=uncompressed_offset,
+            )
+        return rest
+
+    def _inflate(self, data: bytes) -> bytes:
+        output = self._decompressor.decompress(data)
+        if output:
+            self._buffer += output
+            if len(output) >= WINDOW_SIZE_IN_BYTES:
+                self._window = output[-WINDOW_SIZE_IN_BYTES:]
+            else:
+                self._window = (
+                    self._window + output
+                )[-WINDOW_SIZE_IN_BYTES:]
+        if not self._decompressor.eof:
+            return self._consume(data, len(data))
+        rest = self._decompressor.unused_data
+        if self._raw:
+            # Raw deflate leaves the member's trailer to be skipped.
+            self._trailer_to_skip = GZIP_TRAILER_SIZE_IN_BYTES
+        self._decompressor = None
+        return self._consume(data, len(data) - len(rest))
+
+    def _consume(self, data: bytes, size: int) -> bytes:
+        self._input_offset += size
+        return data[size:]
+
+    def _is_checkpoint_due(self) -> bool:
+        frontier = self._position + len(self._buffer)
+        last_checkpoint = self.checkpoints[-1]
+        return frontier >= (
+            last_checkpoint.uncompressed_offset + self.checkpoint_interval
+        )
+
+    def _add_checkpoint(
+        self,
+        window: Optional[bytes],
+        compressed_offset: Optional[int] = None,
+        uncompressed_offset: Optional[int] = None,
+    ):
+        if compressed_offset is None:
+            compressed_offset = self._input_offset
+        if uncompressed_offset is None:
+            uncompressed_offset = self._position + len(self._buffer)
+        last_checkpoint = self.checkpoints[-1]
+        if not self._is_checkpoint_due() or (
+            uncompressed_offset <= last_checkpoint.uncompressed_offset
+        ):
+            # Too close to the previous checkpoint, or already known since
+            # the file is read again after a seek.
+            return
+        self.checkpoints.append(
+            Checkpoint(compressed_offset, uncompressed_offset, window)
+        )
+        self._new_checkpoints = True
+
+    def _load_checkpoints(self) -> Optional[List[Checkpoint]]:
+        try:
+            with open(self.checkpoints_path, "rb") as file:
+                header = file.read(CHECKPOINTS_HEADER.size)
+                if len(header) < CHECKPOINTS_HEADER.size:
+                    return None
+                (
+                    magic, version, compressed_size, count
+                ) = CHECKPOINTS_HEADER.unpack(header)
+                if any([
+                    magic != CHECKPOINTS_MAGIC,
+                    version != CHECKPOINTS_VERSION,
+                    compressed_size > self._compressed_size,
+                ]):
+                    # Checkpoints in a file that was appended to stay valid,
+                    # unlike in a file that was replaced by a shorter one.
+                    return None
+                checkpoints = []
+                for _ in range(count):
+                    (
+                        compressed_offset, uncompressed_offset, window_size
+                    ) = CHECKPOINT_HEADER.unpack(
+                        file.read(CHECKPOINT_HEADER.size)
+                    )
+                    window = (
+                        None if window_size < 0 else file.read(window_size)
+                    )
+                    checkpoints.append(
+                        Checkpoint(
+                            compressed_offset, uncompressed_offset, window
+                        )
+                    )
+        except (OSError, struct.error):
+            return None
+        return checkpoints
+
+    def _save_checkpoints(self):
+        if not self._new_checkpoints:
+            return
+        temporary_path = f"{self.checkpoints_path}.tmp"
+        try:
+            with open(temporary_path, "wb") as file:
+                file.write(
+                    CHECKPOINTS_HEADER.pack(
+                        CHECKPOINTS_MAGIC,
+                        CHECKPOINTS_VERSION,
+                        self._compressed_size,
+                        len(self.checkpoints),
+                    )
+                )
+                for checkpoint in self.checkpoints:
+                    window_size = (
+                        -1 if checkpoint.window is None
+                        else len(checkpoint.window)
+                    )
+                    file.write(
+                        CHECKPOINT_HEADER.pack(
+                            checkpoint.compressed_offset,
+                            checkpoint.uncompressed_offset,
+                            window_size,
+                        )
+                    )
+                    if checkpoint.window is not None:
+                        file.write(checkpoint.window)
+            os.replace(temporary_path, self.checkpoints_path)
+        except OSError:
+            # The checkpoints still work from memory.
+            return
+        self._new_checkpoints = False
+
+
+class SyncFlushingGzipFile(gzip.GzipFile):
+    """
+    A gzip file for writing that ends a deflate block with a sync flush
+    roughly every `flush_interval` bytes of input, leaving restart points
+    for `SeekableGzipFile`, at the cost of a slightly lower compression
+    ratio.
+
+    :param path: A path to the gzip file.
+    :type path: str
+    :param flush_interval: The minimal number of uncompressed bytes between
+        sync flushes.
+    :type flush_interval: int
+
+    """
+    def __init__(
+        self,
+        path: str,
+        flush_interval: int = DEFAULT_CHECKPOINT_INTERVAL_IN_BYTES,
+    ):
+        super().__init__(filename=path, mode="wb")
+        self.flush_interval = flush_interval
+        self._unflushed_size = 0
+
+    def write(self, data: bytes) -> int:
+        size = super().write(data)
+        self._unflushed_size += size
+        if self._unflushed_size >= self.flush_interval:
+            self.flush(zlib.Z_SYNC_FLUSH)
+            self._unflushed_size = 0
+        return size
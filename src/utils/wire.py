@@ -0,0 +1,152 @@
+from collections import namedtuple
+from typing import Iterator, Optional, Tuple
+
+# Protobuf wire types.
+WIRE_TYPE_VARINT = 0
+WIRE_TYPE_FIXED64 = 1
+WIRE_TYPE_LENGTH_DELIMITED = 2
+WIRE_TYPE_FIXED32 = 5
+
+MAX_VARINT_SIZE_IN_BYTES = 10
+
+
+def decode_varint(data: bytes, position: int = 0) -> Tuple[int, int]:
+    """
+    Decode a protobuf base 128 varint.
+
+    Args:
+        data (bytes): The binary data to read from.
+        position (int): The index of the varint's first byte in `data`.
+
+    Returns:
+        Tuple[int, int]: The decoded value and the index of the first byte
+        after the varint.
+    """
+    value = 0
+    shift = 0
+    while True:
+        if position >= len(data):
+            raise ValueError("Truncated varint.")
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+        if shift >= 7 * MAX_VARINT_SIZE_IN_BYTES:
+            raise ValueError("Varint is too long.")
+
+
+def encode_varint(value: int) -> bytes:
+    """
+    Encode a non-negative integer as a protobuf base 128 varint.
+
+    Args:
+        value (int): The value to encode.
+
+    Returns:
+        bytes: The varint.
+    """
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def make_tag(field_number: int, wire_type: int) -> int:
+    return (field_number << 3) | wire_type
+
+
+# A field of a serialized message. `start` is where its tag starts and
+# `value_start`:`end` is its value, without the length prefix for
+# length-delimited fields.
+Field = namedtuple(
+    "Field", ["number", "wire_type", "start", "value_start", "end"]
+)
+
+
+def iter_fields(
+    data: bytes, position: int = 0, end: Optional[int] = None
+) -> Iterator[Field]:
+    """
+    Iterate over the fields of a serialized protobuf message without parsing
+    their values.
+
+    Args:
+        data (bytes): The binary data to read from.
+        position (int): The index of the message's first byte in `data`.
+        end (Optional[int]): The index after the message's last byte in
+        `data`. Defaults to the end of `data`.
+
+    Yields:
+        Field: The fields of the message, in the order they appear.
+    """
+    end = len(data) if end is None else end
+    while position < end:
+        start = position
+        tag, position = decode_varint(data=data, position=position)
+        number, wire_type = tag >> 3, tag & 0x7
+        if wire_type == WIRE_TYPE_VARINT:
+            _, value_end = decode_varint(data=data, position=position)
+        elif wire_type == WIRE_TYPE_FIXED64:
+            value_end = position + 8
+        elif wire_type == WIRE_TYPE_LENGTH_DELIMITED:
+            size, position = decode_varint(data=data, position=position)
+            value_end = position + size
+        elif wire_type == WIRE_TYPE_FIXED32:
+            value_end = position + 4
+        else:
+            raise ValueError(f"Unsupported wire type: {wire_type}.")
+        if value_end > end:
+            raise ValueError("Truncated message.")
+        yield Field(number, wire_type, start, position, value_end)
+        position = value_end
+
+
+def project_fields(
+    data: bytes, projection: dict, position: int = 0, end: Optional[int] = None
+) -> bytes:
+    """
+    Drop the fields of a serialized protobuf message that aren't in
+    `projection`, without parsing the message.
+
+    Args:
+        data (bytes): The binary data to read from.
+        projection (dict): Maps the numbers of the fields to keep to `None`,
+        to keep them whole, or to the projection of their embedded message.
+        position (int): The index of the message's first byte in `data`.
+        end (Optional[int]): The index after the message's last byte in
+        `data`. Defaults to the end of `data`.
+
+    Returns:
+        bytes: The serialized projected message.
+    """
+    kept = []
+    for field in iter_fields(data=data, position=position, end=end):
+        if field.number not in projection:
+            continue
+        field_projection = projection[field.number]
+        if field_projection is None or (
+            field.wire_type != WIRE_TYPE_LENGTH_DELIMITED
+        ):
+            kept.append(data[field.start:field.end])
+            continue
+        value = project_fields(
+            data=data,
+            projection=field_projection,
+            position=field.value_start,
+            end=field.end,
+        )
+        kept.append(
+            encode_varint(
+                make_tag(
+                    field_number=field.number,
+                    wire_type=WIRE_TYPE_LENGTH_DELIMITED,
+                )
+            )
+        )
+        kept.append(encode_varint(len(value)))
+        kept.append(value)
+    return b"".join(kept)
@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from src.utils import (
+    BlockFile,
+    BlockFileWriter,
+    find_codec,
+    get_codec,
+    open_for_reading,
+    open_for_writing,
+)
+from src.utils.codecs import CODECS
+
+BLOCK_SIZE = 1000
+
+
+@pytest.fixture
+def data() -> bytes:
+    return bytes(random.choices(b"abcdefghij", k=10 * BLOCK_SIZE + 123))
+
+
+@pytest.fixture(params=sorted(CODECS))
+def path(request, tmp_path, data: bytes) -> str:  # noqa: ANN001
+    path = str(tmp_path / "data.blocks")
+    with BlockFileWriter(
+        path,
+        codec=get_codec(name=request.param),
+        block_size=BLOCK_SIZE,
+        workers=2,
+    ) as file:
+        for i in range(0, len(data), 777):
+            file.write(data[i:i + 777])
+    return path
+
+
+def test_read(path: str, data: bytes):
+    with BlockFile(path, workers=2) as file:
+        assert len(file) == len(data)
+        assert file.read(10) == data[:10]
+        assert file.read(2 * BLOCK_SIZE) == data[10:10 + 2 * BLOCK_SIZE]
+        assert file.read() == data[10 + 2 * BLOCK_SIZE:]
+        assert file.read() == b""
+
+
+def test_seek(path: str, data: bytes):
+    with BlockFile(path, workers=2) as file:
+        for _ in range(100):
+            position = random.randrange(len(data))
+            assert file.seek(position) == position
+            assert file.read(1500) == data[position:position + 1500]
+
+
+def test_truncated_block(path: str, data: bytes):
+    with open(path, "r+b") as file:
+        file.truncate(file.seek(0, 2) - 1)
+    with BlockFile(path) as file:
+        # The last, partial block is left out.
+        assert file.read() == data[:10 * BLOCK_SIZE]
+
+
+def test_find_codec():
+    assert find_codec("sample.mind.gz").name == "gzip"
+    assert find_codec("sample.mind.bz2").name == "bz2"
+    assert find_codec("sample.mind.xz").name == "lzma"
+    assert find_codec("sample.mind") is None
+
+
+@pytest.mark.parametrize("name", [
+    "data.bin", "data.gz", "data.bz2", "data.xz", "data.blocks",
+    "data.xz.blocks",
+])
+def test_open_for_writing(tmp_path, name: str, data: bytes):  # noqa: ANN001
+    path = str(tmp_path / name)
+    with open_for_writing(path) as file:
+        file.write(data)
+    file = open_for_reading(path, use_mmap=True)
+    assert file.read() == data
+    file.close()
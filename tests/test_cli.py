@@ -1,5 +1,9 @@
 import subprocess
 
+from furl import furl
+
+from .test_reader import binary_snapshot_list, binary_user_information
+
 
 def test_run_server():
     process = subprocess.Popen(
@@ -28,6 +32,27 @@ def test_reader():
     assert b"missing argument" in stderr.lower()
 
 
+def test_reader_summary(tmp_path):  # noqa: ANN001
+    path = tmp_path / "sample.mind"
+    path.write_bytes(binary_user_information() + binary_snapshot_list())
+    process = subprocess.Popen(
+        [
+            "python",
+            "-m",
+            "project",
+            "client",
+            "read",
+            "--summary",
+            str(furl().set(scheme="binary", path=str(path))),
+        ],
+        stdout=subprocess.PIPE,
+    )
+    stdout, _ = process.communicate()
+    assert process.returncode == 0
+    assert b"Snapshots: 2" in stdout
+    assert b"Gaps: min 1000 ms" in stdout
+
+
 # @contextlib.contextmanager
 # def _argv(*args):
 #     command = lambda: None
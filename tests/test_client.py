@@ -1,11 +1,39 @@
+import asyncio
+import collections
 import multiprocessing
 import socket
 import struct
 # import subprocess
+import threading
 import time
+from typing import Callable, Iterator, Optional
+
+import flask
+
+from project_pb2 import ProtoSnapshotBatch
 
 import pytest
 
+import requests
+
+from src.client import (
+    ServerConfig,
+    SnapshotUploader,
+    StreamingSnapshotUploader,
+    WindowedSnapshotUploader,
+    negotiate,
+    run,
+)
+from src.reader import Reader
+from src.server import ColorImageCache, Server
+from src.snapshot import COLOR_IMAGE_FORMATS_HEADER, SNAPSHOT_FIELDS
+from src.user_information import UserInformation
+
+from werkzeug.serving import make_server
+
+from .test_reader import protobuf_snapshot_list, protobuf_user_information
+from .test_snapshot import snapshot  # noqa: F401
+
 
 _SERVER_ADDRESS = "127.0.0.1", 5000
 _SERVER_BACKLOG = 1000
@@ -36,6 +64,448 @@ def get_message():  # noqa: ANN201
         process.join()
 
 
+@pytest.fixture(params=[True, False])
+def http_server(request):  # noqa: ANN001, ANN201
+    # A server that records the requests it gets, with or without
+    # `/snapshots`.
+    app = flask.Flask(__name__)
+    requests = []
+
+    @app.route("/snapshot", methods=["POST"])
+    def post_snapshot():  # noqa: ANN201
+        requests.append(("/snapshot", flask.request.get_data()))
+        return {"status": "success"}
+
+    if request.param:
+        @app.route("/snapshots", methods=["POST"])
+        def post_snapshots():  # noqa: ANN201
+            requests.append(("/snapshots", flask.request.get_data()))
+            return {"status": "success"}
+
+    server = make_server("127.0.0.1", 0, app)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        yield f"127.0.0.1:{server.server_port}", request.param, requests
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def test_snapshot_uploader(http_server, snapshot):  # noqa: ANN001, F811
+    address, supports_batches, requests = http_server
+    uploader = SnapshotUploader(
+        address=address,
+        user_information=UserInformation(
+            id=1, username="a", birthday=0, gender="m"
+        ),
+        fields=SNAPSHOT_FIELDS,
+        batch_size=2,
+    )
+    responses = [uploader.upload(snapshot=snapshot) for _ in range(3)]
+    responses.append(uploader.flush())
+    assert uploader.num_sent == 3
+    if supports_batches:
+        assert [response is not None for response in responses] == [
+            False, True, False, True
+        ]
+        assert [path for path, _ in requests] == ["/snapshots"] * 2
+        batches = [
+            ProtoSnapshotBatch.FromString(data) for _, data in requests
+        ]
+        assert [len(batch.snapshots) for batch in batches] == [2, 1]
+        assert batches[0].user_information.user_id == 1
+        assert batches[0].snapshots[0].datetime == snapshot.timestamp
+    else:
+        # The first batch is sent again, a snapshot at a time, and so is
+        # the rest.
+        assert [path for path, _ in requests] == ["/snapshot"] * 3
+        assert uploader.batch_size == 1
+
+
+@pytest.mark.parametrize("batch_size", [1, 2])
+@pytest.mark.parametrize("color_image_format", ["raw", "png"])
+def test_snapshot_uploader_color_image_dedup(
+    tmp_path,  # noqa: ANN001
+    snapshot,  # noqa: ANN001, F811
+    batch_size: int,
+    color_image_format: str,
+):
+    server = Server(
+        host="127.0.0.1", port=0, data_dir_path=str(tmp_path / "data")
+    )
+    sizes = []
+    server.app.before_request(
+        lambda: sizes.append(flask.request.content_length)
+    )
+    http_server = make_server("127.0.0.1", 0, server.app)
+    thread = threading.Thread(target=http_server.serve_forever)
+    thread.start()
+    try:
+        uploader = SnapshotUploader(
+            address=f"127.0.0.1:{http_server.server_port}",
+            user_information=UserInformation(
+                id=1, username="a", birthday=0, gender="m"
+            ),
+            fields=SNAPSHOT_FIELDS,
+            batch_size=batch_size,
+            color_image_cache_size=server.color_images.size,
+            color_image_format=color_image_format,
+        )
+        for _ in range(2 * batch_size):
+            response = uploader.upload(snapshot=snapshot)
+        assert response.status_code == 200
+        # Only the first request carries the color image, which the server
+        # checked against its hash.
+        assert sizes[0] - sizes[1] >= len(
+            snapshot.get_encoded_color_image(format=color_image_format)
+        )
+
+        # The server lost its images, e.g. since it restarted, so they are
+        # sent again.
+        server.color_images = ColorImageCache(size=server.color_images.size)
+        for _ in range(batch_size):
+            response = uploader.upload(snapshot=snapshot)
+        assert response.status_code == 200
+        assert sizes[2] == sizes[1]
+        assert sizes[3] == sizes[0]
+        assert server.parsed_snapshots == 3 * batch_size
+    finally:
+        http_server.shutdown()
+        thread.join()
+
+
+def test_color_image_hashes_forgotten_concurrently(
+    snapshot,  # noqa: ANN001, F811
+):
+    # The encoder thread records an image's hash while another thread
+    # forgets them all, e.g. on a changed config, right in between.
+    uploader = SnapshotUploader(
+        address="127.0.0.1:0",
+        user_information=UserInformation(
+            id=1, username="a", birthday=0, gender="m"
+        ),
+        fields=SNAPSHOT_FIELDS,
+        color_image_cache_size=4,
+    )
+    forgotten = threading.Event()
+
+    class InterruptedHashes(collections.OrderedDict):
+        def __setitem__(self, key: bytes, value: None):
+            super().__setitem__(key, value)
+            forgetter = threading.Thread(
+                target=lambda: [
+                    uploader._forget_color_images(), forgotten.set()
+                ],
+                daemon=True,
+            )
+            forgetter.start()
+            # Forgetting waits for the hash to be recorded.
+            assert not forgotten.wait(timeout=0.1)
+
+    uploader._color_image_hashes = InterruptedHashes()
+    _, color_image_by_hash = uploader._to_proto(
+        snapshot=snapshot.project(fields=SNAPSHOT_FIELDS)
+    )
+    assert color_image_by_hash is False
+    assert forgotten.wait(timeout=5)
+    assert not uploader._color_image_hashes
+
+
+class CountingSession(requests.Session):
+    num_requests = 0
+
+    def send(
+        self, request: requests.PreparedRequest, **kwargs: dict
+    ) -> requests.Response:
+        self.num_requests += 1
+        return super().send(request, **kwargs)
+
+
+def test_server_config_and_session(tmp_path, snapshot):  # noqa: ANN001, F811
+    server = Server(
+        host="127.0.0.1", port=0, data_dir_path=str(tmp_path / "data")
+    )
+    requests_ = []
+    server.app.before_request(lambda: requests_.append(flask.request.path))
+    http_server = make_server("127.0.0.1", 0, server.app)
+    thread = threading.Thread(target=http_server.serve_forever)
+    thread.start()
+    address = f"127.0.0.1:{http_server.server_port}"
+    try:
+        with CountingSession() as session:
+            config = ServerConfig(session=session, address=address)
+            assert config.supported_fields == tuple(server.supported_fields)
+            assert "jpeg" in config.color_image_formats
+            # Not revalidated before it expires, and unchanged after.
+            assert not config.revalidate()
+            assert len(requests_) == 1
+            config._expires_at = 0.0
+            assert not config.revalidate()
+            assert len(requests_) == 2
+
+            server.config_headers[COLOR_IMAGE_FORMATS_HEADER] = "raw"
+            server.config_etag = "changed"
+            config._expires_at = 0.0
+            assert config.revalidate()
+            options = negotiate(
+                config=config,
+                readable_fields=("feelings",),
+                quantize_depth=None,
+                dedup_color_images=False,
+                color_image_format="jpeg",
+            )
+            assert options["fields"] == ("feelings",)
+            assert options["color_image_format"] == "raw"
+
+            uploader = SnapshotUploader(
+                address=address,
+                user_information=UserInformation(
+                    id=1, username="a", birthday=0, gender="m"
+                ),
+                fields=SNAPSHOT_FIELDS,
+                session=session,
+            )
+            for _ in range(3):
+                assert uploader.upload(snapshot=snapshot).status_code == 200
+            assert uploader.num_requests == 3
+            # All the requests are sent in the session.
+            assert session.num_requests == len(requests_) == 6
+    finally:
+        http_server.shutdown()
+        thread.join()
+
+
+def test_streaming_snapshot_uploader(tmp_path, snapshot):  # noqa: ANN001, F811
+    server = Server(
+        host="127.0.0.1", port=0, data_dir_path=str(tmp_path / "data")
+    )
+    requests_ = []
+    server.app.before_request(
+        lambda: requests_.append(
+            (flask.request.path, flask.request.headers["Transfer-Encoding"])
+        )
+    )
+    http_server = make_server("127.0.0.1", 0, server.app)
+    thread = threading.Thread(target=http_server.serve_forever)
+    thread.start()
+    try:
+        uploader = StreamingSnapshotUploader(
+            address=f"127.0.0.1:{http_server.server_port}",
+            user_information=UserInformation(
+                id=1, username="a", birthday=0, gender="m"
+            ),
+            fields=SNAPSHOT_FIELDS,
+            color_image_cache_size=16,
+        )
+        response = uploader.upload_all(snapshots=[snapshot] * 5)
+        assert response.json() == {"status": "success", "snapshots": 5}
+        assert uploader.num_sent == server.parsed_snapshots == 5
+        # The whole stream is a single chunked request, and its images are
+        # never referred to by their hashes.
+        assert requests_ == [("/stream", "chunked")]
+        assert uploader.color_image_cache_size == 0
+    finally:
+        http_server.shutdown()
+        thread.join()
+
+
+@pytest.mark.parametrize("batch_size", [1, 2])
+def test_windowed_snapshot_uploader(
+    tmp_path, snapshot, batch_size: int  # noqa: ANN001, F811
+):
+    window = 4
+    server = Server(
+        host="127.0.0.1", port=0, data_dir_path=str(tmp_path / "data")
+    )
+    statuses = []
+    processed = []
+    # The server holds every request until `window` requests are in flight
+    # (or a while passes, for the first one, which is alone since it
+    # carries the color image, and the last ones), and records the most that
+    # ever were.
+    in_flight = threading.Condition()
+    counts = {"in_flight": 0, "peak": 0}
+
+    def hold_request():
+        with in_flight:
+            counts["in_flight"] += 1
+            counts["peak"] = max(counts["peak"], counts["in_flight"])
+            in_flight.notify_all()
+            in_flight.wait_for(
+                lambda: counts["in_flight"] >= window, timeout=0.5
+            )
+
+    server.app.before_request(hold_request)
+    server.process_snapshot = (
+        lambda user_information, snapshot: processed.append(snapshot)
+    )
+
+    @server.app.after_request
+    def record_status(response: flask.Response) -> flask.Response:
+        statuses.append(response.status_code)
+        with in_flight:
+            counts["in_flight"] -= 1
+        return response
+
+    http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+    thread = threading.Thread(target=http_server.serve_forever)
+    thread.start()
+    try:
+        uploader = WindowedSnapshotUploader(
+            window=window,
+            address=f"127.0.0.1:{http_server.server_port}",
+            user_information=UserInformation(
+                id=1, username="a", birthday=0, gender="m"
+            ),
+            fields=SNAPSHOT_FIELDS,
+            batch_size=batch_size,
+            color_image_cache_size=server.color_images.size,
+        )
+        num_requests = 3 * window
+        responses = []
+        asyncio.run(
+            uploader.upload_all(
+                snapshots=[snapshot] * (num_requests * batch_size),
+                on_response=responses.append,
+            )
+        )
+        assert uploader.num_sent == num_requests * batch_size
+        assert len(processed) == num_requests * batch_size
+        assert processed[-1] == snapshot
+        assert len(responses) == uploader.num_requests == num_requests
+        # The requests that refer to the color image by its hash waited for
+        # the one that carries it, so none was rejected.
+        assert statuses == [200] * num_requests
+        # Requests are sent `window` at a time, and no more.
+        assert counts["peak"] == window
+    finally:
+        http_server.shutdown()
+        thread.join()
+
+
+class FakeSession(requests.Session):
+    # Answers requests without sending them, calling `on_send` with each,
+    # except for the `fail_at`th, which fails as if the connection broke.
+    def __init__(
+        self,
+        fail_at: Optional[int] = None,
+        on_send: Optional[Callable[[requests.PreparedRequest], None]] = None,
+    ):
+        super().__init__()
+        self.fail_at = fail_at
+        self.on_send = on_send
+        self.num_requests = 0
+        self._lock = threading.Lock()
+
+    def send(
+        self, request: requests.PreparedRequest, **kwargs: dict
+    ) -> requests.Response:
+        with self._lock:
+            self.num_requests += 1
+            if self.num_requests == self.fail_at:
+                raise requests.ConnectionError("Connection broke.")
+        if self.on_send is not None:
+            self.on_send(request)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b"{}"
+        return response
+
+
+def test_windowed_snapshot_uploader_error(snapshot):  # noqa: ANN001, F811
+    session = FakeSession(fail_at=2)
+    uploader = WindowedSnapshotUploader(
+        window=4,
+        address="127.0.0.1:0",
+        user_information=UserInformation(
+            id=1, username="a", birthday=0, gender="m"
+        ),
+        fields=SNAPSHOT_FIELDS,
+        session=session,
+    )
+    with pytest.raises(requests.ConnectionError):
+        asyncio.run(uploader.upload_all(snapshots=[snapshot] * 10))
+    # The failed snapshot isn't counted as sent.
+    assert uploader.num_sent == session.num_requests - 1
+
+
+def test_windowed_snapshot_uploader_slow_input(
+    snapshot,  # noqa: ANN001, F811
+):
+    # Snapshots that are recorded one at a time, as a followed sample's, are
+    # each sent before the next is recorded, however large the window is.
+    sent = threading.Semaphore(0)
+    uploader = WindowedSnapshotUploader(
+        window=8,
+        address="127.0.0.1:0",
+        user_information=UserInformation(
+            id=1, username="a", birthday=0, gender="m"
+        ),
+        fields=SNAPSHOT_FIELDS,
+        session=FakeSession(on_send=lambda request: sent.release()),
+    )
+
+    def recorded() -> Iterator:
+        for i in range(4):
+            if i > 0:
+                assert sent.acquire(timeout=5), "The snapshot wasn't sent."
+            yield snapshot
+
+    asyncio.run(uploader.upload_all(snapshots=recorded()))
+    assert uploader.num_sent == 4
+
+
+@pytest.mark.parametrize("follow", [False, True])
+def test_run_closes_prefetcher(
+    tmp_path, monkeypatch, follow: bool  # noqa: ANN001
+):
+    sample_path = tmp_path / "sample.mind"
+    # When the upload fails, a sample with more snapshots than are read
+    # ahead is still being read, and a followed one is waited for to grow,
+    # indefinitely, once its snapshots are read.
+    sample_path.write_bytes(b"".join([
+        protobuf_user_information(),
+        protobuf_snapshot_list() * (1 if follow else 4),
+    ]))
+    server = Server(
+        host="127.0.0.1", port=0, data_dir_path=str(tmp_path / "data")
+    )
+    http_server = make_server("127.0.0.1", 0, server.app)
+    thread = threading.Thread(target=http_server.serve_forever)
+    thread.start()
+    prefetchers = []
+    prefetch = Reader.prefetch
+
+    def recorded_prefetch(reader: Reader, **kwargs: dict) -> object:
+        prefetchers.append(prefetch(reader, **kwargs))
+        return prefetchers[-1]
+
+    def failed_upload(uploader: SnapshotUploader, **kwargs: dict):
+        # Fails once the rest of the sample is read ahead.
+        (prefetcher,) = prefetchers
+        with prefetcher._condition:
+            prefetcher._condition.wait_for(lambda: prefetcher._buffer)
+        raise requests.ConnectionError()
+
+    monkeypatch.setattr(Reader, "prefetch", recorded_prefetch)
+    monkeypatch.setattr(SnapshotUploader, "upload", failed_upload)
+    try:
+        with pytest.raises(requests.ConnectionError):
+            run.callback(
+                address=f"127.0.0.1:{http_server.server_port}",
+                url=f"protobuf://{sample_path}",
+                prefetch=1,
+                follow=follow,
+            )
+    finally:
+        http_server.shutdown()
+        thread.join()
+    # The reading thread is stopped, though the upload failed.
+    (prefetcher,) = prefetchers
+    assert not prefetcher._thread.is_alive()
+
+
 # TODO: Add client tests.
 # def test_connection(get_message):  # noqa: ANN001
 #     host, port = _SERVER_ADDRESS
@@ -0,0 +1,61 @@
+import subprocess
+
+from furl import furl
+
+import pytest
+
+from src.convert import convert_sample
+from src.reader import Reader
+
+from .test_reader import binary_snapshot_list, binary_user_information
+
+
+@pytest.mark.parametrize("intermediate", [
+    ("protobuf", "sample.pb"),
+    ("protobuf", "sample.pb.gz"),
+    ("binary", "sample.mind.gz"),
+    ("binary", "sample.mind.bz2"),
+    ("protobuf", "sample.pb.blocks"),
+    ("protobuf", "sample.pb.xz.blocks"),
+    ("columnar", "sample"),
+])
+def test_round_trip(tmp_path, intermediate: tuple):  # noqa: ANN001
+    source = tmp_path / "source.mind"
+    source.write_bytes(binary_user_information() + binary_snapshot_list())
+    scheme, name = intermediate
+    urls = [
+        furl().set(scheme="binary", path=str(source)),
+        furl().set(scheme=scheme, path=str(tmp_path / name)),
+        furl().set(scheme="binary", path=str(tmp_path / "destination.mind")),
+    ]
+    for src_url, dst_url in zip(urls, urls[1:]):
+        num_snapshots, num_bytes, _ = convert_sample(
+            src_url=str(src_url), dst_url=str(dst_url)
+        )
+        assert num_snapshots == 2
+        assert num_bytes > 0
+    assert (tmp_path / "destination.mind").read_bytes() == source.read_bytes()
+    assert [
+        snapshot.timestamp for snapshot in Reader(url=str(urls[1]))
+    ] == [snapshot.timestamp for snapshot in Reader(url=str(urls[0]))]
+
+
+def test_convert_cli(tmp_path):  # noqa: ANN001
+    source = tmp_path / "source.mind"
+    source.write_bytes(binary_user_information() + binary_snapshot_list())
+    process = subprocess.Popen(
+        [
+            "python",
+            "-m",
+            "project",
+            "client",
+            "convert",
+            str(furl().set(scheme="binary", path=str(source))),
+            str(furl().set(scheme="protobuf", path=str(tmp_path / "a.pb"))),
+        ],
+        stdout=subprocess.PIPE,
+    )
+    stdout, _ = process.communicate()
+    assert process.returncode == 0
+    assert b"Converted 2 snapshots" in stdout
+    assert b"snapshots/s" in stdout
@@ -0,0 +1,47 @@
+import io
+
+import numpy as np
+
+import pytest
+
+from src.utils import MappedFile
+
+DATA = b"Hello, world!"
+
+
+@pytest.fixture
+def mapped_file(tmp_path) -> MappedFile:  # noqa: ANN001
+    path = tmp_path / "data.bin"
+    path.write_bytes(DATA)
+    return MappedFile(str(path))
+
+
+def test_read(mapped_file: MappedFile):
+    chunk = mapped_file.read(5)
+    assert isinstance(chunk, memoryview)
+    assert chunk == DATA[:5]
+    assert mapped_file.tell() == 5
+    assert mapped_file.read() == DATA[5:]
+    assert mapped_file.read(1) == b""
+
+
+def test_seek(mapped_file: MappedFile):
+    assert mapped_file.seek(7) == 7
+    assert mapped_file.read(5) == b"world"
+    assert mapped_file.seek(-1, io.SEEK_END) == len(DATA) - 1
+    assert mapped_file.read() == b"!"
+    with pytest.raises(ValueError):
+        mapped_file.seek(-1)
+
+
+def test_views_outlive_close(mapped_file: MappedFile):
+    view = np.frombuffer(mapped_file.read(4), dtype=np.uint8)
+    mapped_file.close()
+    assert mapped_file.closed
+    assert view.tobytes() == DATA[:4]
+
+
+def test_empty_file(tmp_path):  # noqa: ANN001
+    path = tmp_path / "empty.bin"
+    path.write_bytes(b"")
+    assert MappedFile(str(path)).read() == b""
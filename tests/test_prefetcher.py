@@ -0,0 +1,75 @@
+import queue
+from typing import Iterator, List
+
+import pytest
+
+from src.utils import Prefetcher
+
+
+def test_prefetch():
+    assert list(Prefetcher(iterator=iter(range(100)), depth=3)) == list(
+        range(100)
+    )
+
+
+def requesting(items: List[object], requested: queue.Queue) -> Iterator:
+    # Yields the items, putting the index of each in `requested` when it is
+    # requested, i.e. once the previous item was buffered.
+    for i, item in enumerate(items):
+        requested.put(i)
+        yield item
+
+
+def test_depth():
+    requested = queue.Queue()
+    prefetcher = Prefetcher(
+        iterator=requesting(items=range(10), requested=requested), depth=2
+    )
+    assert next(prefetcher) == 0
+    # One item is consumed, two are buffered and one more is waiting for
+    # room, so the next one isn't requested until another is consumed.
+    assert [requested.get(timeout=5) for _ in range(4)] == [0, 1, 2, 3]
+    with prefetcher._condition:
+        assert len(prefetcher._buffer) == 2
+    assert requested.empty()
+    assert next(prefetcher) == 1
+    assert requested.get(timeout=5) == 4
+    assert list(prefetcher) == list(range(2, 10))
+
+
+def test_max_bytes():
+    requested = queue.Queue()
+    prefetcher = Prefetcher(
+        iterator=requesting(
+            items=[b"a" * 10] * 4 + [b"b" * 100], requested=requested
+        ),
+        depth=10,
+        max_bytes=15,
+        size=len,
+    )
+    # The second item waits for room, since both don't fit.
+    assert [requested.get(timeout=5) for _ in range(2)] == [0, 1]
+    with prefetcher._condition:
+        assert len(prefetcher._buffer) == 1
+    assert requested.empty()
+    # An item larger than the limit is still produced.
+    assert list(prefetcher) == [b"a" * 10] * 4 + [b"b" * 100]
+
+
+def test_error():
+    def items() -> Iterator[int]:
+        yield 1
+        raise ValueError("Corrupt sample.")
+
+    prefetcher = Prefetcher(iterator=items())
+    assert next(prefetcher) == 1
+    with pytest.raises(ValueError):
+        next(prefetcher)
+    with pytest.raises(StopIteration):
+        next(prefetcher)
+
+
+def test_close():
+    with Prefetcher(iterator=iter(range(100)), depth=1) as prefetcher:
+        assert next(prefetcher) == 0
+    assert not prefetcher._thread.is_alive()
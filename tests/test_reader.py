@@ -1,7 +1,12 @@
+import gzip
 import struct
+import threading
+import time
 
 from furl import furl
 
+import numpy as np
+
 from project_pb2 import (
     ColorImage,
     DepthImage,
@@ -13,8 +18,18 @@ from project_pb2 import (
 
 import pytest
 
+from src.batch import SnapshotBatch
+from src.drivers import ColumnarWriter, ProtobufDriver
 from src.reader import Reader
-from src.snapshot import Snapshot
+from src.snapshot import (
+    DEPTH_IMAGE_ENCODINGS,
+    EMPTY_COLOR_IMAGE,
+    EMPTY_DIM,
+    EMPTY_FEELINGS,
+    EMPTY_TRANSLATION,
+    LazySnapshot,
+    Snapshot,
+)
 
 from .test_utils import (
     COLOR_IMAGE_1,
@@ -181,16 +196,36 @@ def protobuf_snapshot_list() -> bytes:
 
 
 @pytest.fixture(params=[
-    ("binary", binary_user_information(), binary_snapshot_list()),
-    ("protobuf", protobuf_user_information(), protobuf_snapshot_list()),
+    ("binary", binary_user_information(), binary_snapshot_list(), ""),
+    ("binary", binary_user_information(), binary_snapshot_list(), ".gz"),
+    ("protobuf", protobuf_user_information(), protobuf_snapshot_list(), ""),
+    (
+        "protobuf",
+        protobuf_user_information(),
+        protobuf_snapshot_list(),
+        ".gz",
+    ),
+    # Converted from the protobuf sample.
+    ("columnar", protobuf_user_information(), protobuf_snapshot_list(), ""),
 ])
 def url(
     request,  # noqa: ANN001
     tmp_path,  # noqa: ANN001
 ) -> str:
-    scheme, user_information, snapshot_list = request.param
-    path = tmp_path / "sample.mind"
-    with path.open(mode="wb") as file:
+    scheme, user_information, snapshot_list, suffix = request.param
+    path = tmp_path / f"sample.mind{suffix}"
+    if scheme == "columnar":
+        source_path = tmp_path / "source.mind"
+        source_path.write_bytes(user_information + snapshot_list)
+        source = Reader(url=str(furl().set(scheme="protobuf", path=str(source_path))))  # noqa: E501
+        with ColumnarWriter(
+            path=str(path), user_information=source.user_information
+        ) as writer:
+            for snapshot in source:
+                writer.write(snapshot=snapshot)
+        return furl().set(scheme=scheme, path=str(path))
+    open_file = gzip.open if suffix == ".gz" else open
+    with open_file(path, mode="wb") as file:
         file.write(user_information)
         file.write(snapshot_list)
     return furl().set(scheme=scheme, path=str(path))
@@ -216,3 +251,317 @@ def test_reader_as_snapshot_generator(reader: Reader):
     assert isinstance(snapshot, Snapshot)
     with pytest.raises(StopIteration):
         next(reader_iterator)
+
+
+def test_reader_snapshot_fields(reader: Reader):
+    snapshot_1, snapshot_2 = list(reader)
+    for snapshot, expected in [
+        (
+            snapshot_1,
+            (
+                TIMESTAMP_1,
+                TRANSLATION_1,
+                ROTATION_1,
+                DEPTH_IMAGE_WIDTH_1,
+                DEPTH_IMAGE_HEIGHT_1,
+                DEPTH_IMAGE_1,
+                FEELINGS_1,
+            ),
+        ),
+        (
+            snapshot_2,
+            (
+                TIMESTAMP_2,
+                TRANSLATION_2,
+                ROTATION_2,
+                DEPTH_IMAGE_WIDTH_2,
+                DEPTH_IMAGE_HEIGHT_2,
+                DEPTH_IMAGE_2,
+                FEELINGS_2,
+            ),
+        ),
+    ]:
+        (
+            timestamp,
+            translation,
+            rotation,
+            depth_image_width,
+            depth_image_height,
+            depth_image,
+            feelings,
+        ) = expected
+        assert snapshot.timestamp == timestamp
+        assert tuple(snapshot.translation) == translation
+        assert tuple(snapshot.rotation) == rotation
+        assert snapshot.depth_image_width == depth_image_width
+        assert snapshot.depth_image_height == depth_image_height
+        assert tuple(snapshot.depth_image) == depth_image
+        assert tuple(snapshot.feelings) == pytest.approx(feelings)
+
+
+def test_lazy_reader(url: str):
+    lazy_snapshots = list(Reader(url=str(url), lazy=True))
+    assert all(
+        isinstance(snapshot, LazySnapshot) for snapshot in lazy_snapshots
+    )
+    assert lazy_snapshots == list(Reader(url=str(url)))
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_reader_fields(url: str, lazy: bool):
+    reader = Reader(
+        url=str(url), lazy=lazy, fields=("rotation", "depth_image")
+    )
+    snapshot_1, snapshot_2 = list(reader)
+    for snapshot, rotation, depth_image in [
+        (snapshot_1, ROTATION_1, DEPTH_IMAGE_1),
+        (snapshot_2, ROTATION_2, DEPTH_IMAGE_2),
+    ]:
+        assert snapshot.translation == EMPTY_TRANSLATION
+        assert tuple(snapshot.rotation) == rotation
+        assert snapshot.color_image_width == EMPTY_DIM
+        assert snapshot.color_image_height == EMPTY_DIM
+        assert snapshot.color_image == EMPTY_COLOR_IMAGE
+        assert tuple(snapshot.depth_image) == depth_image
+        assert snapshot.feelings == EMPTY_FEELINGS
+    assert reader[1].timestamp == TIMESTAMP_2
+
+
+def test_prefetch(url: str):
+    reader = Reader(url=str(url))
+    assert [
+        snapshot.timestamp for snapshot in reader.prefetch(
+            depth=1, max_bytes=1
+        )
+    ] == [TIMESTAMP_1, TIMESTAMP_2]
+
+
+def test_parallel_parsing(url: str):
+    if furl(url).scheme != "protobuf":
+        with pytest.raises(Exception):
+            Reader(url=str(url), workers=2)
+        return
+    snapshots = list(Reader(url=str(url), workers=2))
+    assert snapshots == list(Reader(url=str(url)))
+    # A chunk per snapshot.
+    driver = ProtobufDriver(str(furl(url).path))
+    driver.get_user_information()
+    assert list(
+        driver.iter_snapshots_parallel(workers=2, chunk_size=1)
+    ) == snapshots
+    assert list(
+        Reader(url=str(url), fields=("feelings",), workers=2)
+    ) == list(Reader(url=str(url), fields=("feelings",)))
+
+
+def test_iter_batches(reader: Reader):
+    batch_1, batch_2 = reader.iter_batches(size=1)
+    for batch in [batch_1, batch_2]:
+        assert isinstance(batch, SnapshotBatch)
+        assert len(batch) == 1
+    assert batch_1.timestamps.dtype == np.uint64
+    assert batch_1.timestamps.tolist() == [TIMESTAMP_1]
+    assert batch_2.translations.tolist() == [list(TRANSLATION_2)]
+    assert batch_2.rotations.tolist() == [list(ROTATION_2)]
+    assert batch_2.feelings.dtype == np.float32
+    assert batch_2.feelings.tolist() == [pytest.approx(FEELINGS_2)]
+    assert batch_2.depth_images.shape == (
+        1, DEPTH_IMAGE_HEIGHT_2, DEPTH_IMAGE_WIDTH_2
+    )
+    assert tuple(batch_2.depth_images.ravel()) == DEPTH_IMAGE_2
+
+
+def test_iter_batches_fields(url: str):
+    reader = Reader(url=str(url), fields=("translation", "depth_image"))
+    (batch,) = reader.iter_batches(size=10)
+    assert batch.timestamps.tolist() == [TIMESTAMP_1, TIMESTAMP_2]
+    assert batch.translations.shape == (2, 3)
+    assert batch.rotations is None
+    assert batch.feelings is None
+    # The dimensions of the depth images differ, so they aren't stacked.
+    assert [depth_image.shape for depth_image in batch.depth_images] == [
+        (DEPTH_IMAGE_HEIGHT_1, DEPTH_IMAGE_WIDTH_1),
+        (DEPTH_IMAGE_HEIGHT_2, DEPTH_IMAGE_WIDTH_2),
+    ]
+
+
+@pytest.mark.parametrize("depth_image_encoding", DEPTH_IMAGE_ENCODINGS)
+def test_iter_batches_depth_image_encodings(
+    tmp_path, depth_image_encoding: str  # noqa: ANN001
+):
+    source_path = tmp_path / "source.mind"
+    source_path.write_bytes(
+        protobuf_user_information() + protobuf_snapshot_list()
+    )
+    source = Reader(url=f"protobuf://{source_path}")
+    snapshots = list(source)
+    path = tmp_path / "sample.mind"
+    path.write_bytes(b"".join([
+        source.user_information.serialize(),
+        *[
+            snapshot.serialize(depth_image_encoding=depth_image_encoding)
+            for snapshot in snapshots
+        ],
+    ]))
+    (batch,) = Reader(url=f"protobuf://{path}").iter_batches(size=10)
+    assert batch.timestamps.tolist() == [TIMESTAMP_1, TIMESTAMP_2]
+    assert batch.rotations.tolist() == [list(ROTATION_1), list(ROTATION_2)]
+    for depth_image, snapshot in zip(batch.depth_images, snapshots):
+        assert depth_image.shape == (
+            snapshot.depth_image_height, snapshot.depth_image_width
+        )
+        # Quantized pixels are within a millimetre.
+        assert np.allclose(
+            depth_image.ravel(), snapshot.depth_image, atol=1e-3
+        )
+
+
+def test_random_access(reader: Reader):
+    assert reader.num_snapshots() == 2
+    assert reader[0].timestamp == TIMESTAMP_1
+    assert reader[1].timestamp == TIMESTAMP_2
+    assert reader[-1].timestamp == TIMESTAMP_2
+    with pytest.raises(IndexError):
+        reader[2]
+    # Random access doesn't affect iteration.
+    assert [snapshot.timestamp for snapshot in reader] == [
+        TIMESTAMP_1, TIMESTAMP_2
+    ]
+
+
+def test_iter_range(reader: Reader):
+    assert [
+        snapshot.timestamp for snapshot in reader.iter_range(
+            start_timestamp=TIMESTAMP_1 + 1
+        )
+    ] == [TIMESTAMP_2]
+    assert [
+        snapshot.timestamp for snapshot in reader.iter_range(
+            end_timestamp=TIMESTAMP_2
+        )
+    ] == [TIMESTAMP_1]
+    assert list(reader.iter_range(TIMESTAMP_2 + 1, TIMESTAMP_2 + 2)) == []
+
+
+def test_index_grows_with_sample(tmp_path):  # noqa: ANN001
+    path = tmp_path / "sample.mind"
+    snapshot_list = binary_snapshot_list()
+    # The second snapshot is still being written.
+    path.write_bytes(binary_user_information() + snapshot_list[:-1])
+    url = str(furl().set(scheme="binary", path=str(path)))
+    assert Reader(url=url).num_snapshots() == 1
+    assert (tmp_path / "sample.mind.binary.idx").is_file()
+
+    path.write_bytes(binary_user_information() + snapshot_list)
+    reader = Reader(url=url)
+    assert reader.num_snapshots() == 2
+    assert reader[1].timestamp == TIMESTAMP_2
+
+
+def test_index_of_replaced_sample(tmp_path):  # noqa: ANN001
+    path = tmp_path / "sample.mind"
+    snapshot_list = binary_snapshot_list()
+    path.write_bytes(binary_user_information() + snapshot_list)
+    url = str(furl().set(scheme="binary", path=str(path)))
+    # Iterating doesn't index the sample.
+    assert len(list(Reader(url=url))) == 2
+    assert not (tmp_path / "sample.mind.binary.idx").exists()
+
+    path.write_bytes(binary_user_information() + snapshot_list[:-1])
+    assert Reader(url=url).num_snapshots() == 1
+
+    # A larger sample that doesn't start with the indexed snapshots is
+    # indexed from scratch.
+    replaced_timestamp = TIMESTAMP_1 + 1
+    path.write_bytes(b"".join([
+        binary_user_information(),
+        struct.pack("<Q", replaced_timestamp),
+        snapshot_list[struct.calcsize("<Q"):],
+    ]))
+    reader = Reader(url=url)
+    assert reader.num_snapshots() == 2
+    assert reader.index.timestamps[0] == replaced_timestamp
+
+
+@pytest.mark.parametrize("scheme", ["binary", "protobuf"])
+def test_follow(tmp_path, scheme: str):  # noqa: ANN001
+    path = tmp_path / "sample.mind"
+    if scheme == "binary":
+        user_information = binary_user_information()
+        snapshot_list = binary_snapshot_list()
+    else:
+        user_information = protobuf_user_information()
+        snapshot_list = protobuf_snapshot_list()
+    path.write_bytes(user_information)
+
+    def record():
+        # Written in pieces, so snapshots are partly written at times.
+        with open(path, "ab", buffering=0) as file:
+            for i in range(0, len(snapshot_list), 7):
+                file.write(snapshot_list[i:i + 7])
+                time.sleep(0.005)
+
+    recorder = threading.Thread(target=record)
+    recorder.start()
+    reader = Reader(
+        url=str(furl().set(scheme=scheme, path=str(path))),
+        follow=True,
+        poll_interval=0.001,
+        idle_timeout=0.5,
+    )
+    timestamps = [snapshot.timestamp for snapshot in reader]
+    recorder.join()
+    assert timestamps == [TIMESTAMP_1, TIMESTAMP_2]
+
+
+def test_close_followed_prefetch(tmp_path):  # noqa: ANN001
+    path = tmp_path / "sample.mind"
+    path.write_bytes(protobuf_user_information() + protobuf_snapshot_list())
+    # Followed without an idle timeout, so only closing ends the wait for
+    # more snapshots.
+    reader = Reader(url=f"protobuf://{path}", follow=True, poll_interval=60)
+    prefetcher = reader.prefetch(depth=1)
+    assert next(prefetcher).timestamp == TIMESTAMP_1
+    # Once the last snapshot is buffered, the sample is waited for.
+    with prefetcher._condition:
+        prefetcher._condition.wait_for(lambda: prefetcher._buffer)
+    closer = threading.Thread(target=prefetcher.close, daemon=True)
+    closer.start()
+    closer.join(timeout=5)
+    assert not closer.is_alive(), "Closing waited for the sample to grow."
+    assert not prefetcher._thread.is_alive()
+
+
+def test_follow_compressed_sample(tmp_path):  # noqa: ANN001
+    path = tmp_path / "sample.mind.gz"
+    with gzip.open(path, "wb") as file:
+        file.write(binary_user_information())
+    with pytest.raises(Exception):
+        Reader(
+            url=str(furl().set(scheme="binary", path=str(path))),
+            follow=True,
+        )
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_summarize(url: str, indexed: bool):
+    if indexed:
+        # Builds the sidecar index.
+        Reader(url=str(url)).num_snapshots()
+    reader = Reader(url=str(url))
+    if indexed and not str(url).startswith("columnar"):
+        # The summary is taken from the index, without scanning the sample.
+        reader.driver.scan_snapshot = None
+    summary = reader.summarize()
+    assert len(summary) == 2
+    assert summary.timestamps.tolist() == [TIMESTAMP_1, TIMESTAMP_2]
+    assert summary.gaps.tolist() == [TIMESTAMP_2 - TIMESTAMP_1]
+    assert summary.color_image_dimensions == {
+        (COLOR_IMAGE_WIDTH_1, COLOR_IMAGE_HEIGHT_1): 1,
+        (COLOR_IMAGE_WIDTH_2, COLOR_IMAGE_HEIGHT_2): 1,
+    }
+    assert summary.depth_image_dimensions == {
+        (DEPTH_IMAGE_WIDTH_1, DEPTH_IMAGE_HEIGHT_1): 1,
+        (DEPTH_IMAGE_WIDTH_2, DEPTH_IMAGE_HEIGHT_2): 1,
+    }
+    assert "Snapshots: 2" in str(summary)
@@ -0,0 +1,94 @@
+import gzip
+import random
+import zlib
+
+import pytest
+
+from src.utils import SeekableGzipFile, SyncFlushingGzipFile
+
+CHECKPOINT_INTERVAL = 2 ** 15
+FLUSH_INTERVAL = 2 ** 14
+
+
+@pytest.fixture
+def data() -> bytes:
+    words = [
+        bytes(random.choices(b"abcdefghij", k=random.randint(1, 8)))
+        for _ in range(100)
+    ]
+    return b" ".join(random.choices(words, k=50000))
+
+
+@pytest.fixture
+def path(tmp_path, data: bytes) -> str:  # noqa: ANN001
+    path = tmp_path / "data.gz"
+    with gzip.open(path, "wb") as file:
+        for i in range(0, len(data), FLUSH_INTERVAL):
+            file.write(data[i:i + FLUSH_INTERVAL])
+            file.flush(zlib.Z_SYNC_FLUSH)
+    return str(path)
+
+
+def test_read(path: str, data: bytes):
+    with SeekableGzipFile(
+        path, checkpoint_interval=CHECKPOINT_INTERVAL
+    ) as file:
+        assert file.read(10) == data[:10]
+        assert file.read() == data[10:]
+        assert file.read() == b""
+        assert len(file.checkpoints) > 1
+
+
+def test_seek(path: str, data: bytes):
+    with SeekableGzipFile(
+        path, checkpoint_interval=CHECKPOINT_INTERVAL
+    ) as file:
+        for _ in range(100):
+            position = random.randrange(len(data))
+            assert file.seek(position) == position
+            assert file.read(100) == data[position:position + 100]
+
+
+def test_checkpoints_are_persisted(path: str, data: bytes):
+    with SeekableGzipFile(
+        path, checkpoint_interval=CHECKPOINT_INTERVAL
+    ) as file:
+        file.read()
+        checkpoints = file.checkpoints
+    with SeekableGzipFile(
+        path, checkpoint_interval=CHECKPOINT_INTERVAL
+    ) as file:
+        assert file.checkpoints == checkpoints
+        position = checkpoints[-1].uncompressed_offset + 1
+        file.seek(position)
+        assert file.read(100) == data[position:position + 100]
+
+
+def test_multiple_members(tmp_path):  # noqa: ANN001
+    path = tmp_path / "data.gz"
+    path.write_bytes(gzip.compress(b"first") + gzip.compress(b"second"))
+    with SeekableGzipFile(str(path)) as file:
+        assert file.read() == b"firstsecond"
+        file.seek(3)
+        assert file.read() == b"stsecond"
+
+
+def test_truncated_file(tmp_path):  # noqa: ANN001
+    path = tmp_path / "data.gz"
+    path.write_bytes(gzip.compress(b"data" * 100)[:-10])
+    with SeekableGzipFile(str(path)) as file:
+        with pytest.raises(EOFError):
+            file.read()
+
+
+def test_sync_flushing_gzip_file(tmp_path, data: bytes):  # noqa: ANN001
+    path = str(tmp_path / "flushed.gz")
+    with SyncFlushingGzipFile(path, flush_interval=FLUSH_INTERVAL) as file:
+        for i in range(0, len(data), 1000):
+            file.write(data[i:i + 1000])
+    assert gzip.decompress(open(path, "rb").read()) == data
+    with SeekableGzipFile(
+        path, checkpoint_interval=CHECKPOINT_INTERVAL
+    ) as file:
+        file.read()
+        assert len(file.checkpoints) > 1
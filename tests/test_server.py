@@ -1,16 +1,41 @@
 import inspect
 import signal
 import socket
+import struct
 import subprocess
 import threading
 import time
 from pathlib import Path
 
+from project_pb2 import ColorImage
+
 import pytest
 
 from src import parsers
-from src.server import Context, load_parsers
+from src.reader import Reader
+from src.server import (
+    ColorImageCache,
+    ColorImageHashMismatchError,
+    Context,
+    Server,
+    load_parsers,
+)
+from src.snapshot import (
+    COLOR_IMAGE_CACHE_SIZE_HEADER,
+    COLOR_IMAGE_FORMATS_HEADER,
+    DEPTH_IMAGE_ENCODINGS,
+    DEPTH_IMAGE_ENCODINGS_HEADER,
+    UPLOAD_ENDPOINTS_HEADER,
+    frame,
+    hash_color_image,
+    serialize_snapshot_batch,
+)
 
+from .test_reader import (
+    ID,
+    protobuf_snapshot_list,
+    protobuf_user_information,
+)
 from .test_utils import TIMESTAMP, USER_ID
 
 
@@ -86,3 +111,347 @@ def test_connection(server_process: subprocess.Popen):
     finally:
         server_process.send_signal(signal.SIGINT)
         thread.join()
+
+
+@pytest.mark.parametrize("depth_image_encoding", DEPTH_IMAGE_ENCODINGS)
+def test_depth_image_encodings(
+    tmp_path, depth_image_encoding: str  # noqa: ANN001
+):
+    sample_path = tmp_path / "sample.mind"
+    sample_path.write_bytes(
+        protobuf_user_information() + protobuf_snapshot_list()
+    )
+    reader = Reader(url=f"protobuf://{sample_path}")
+    snapshot = next(iter(reader))
+    server = Server(
+        host="127.0.0.1", port=5000, data_dir_path=str(tmp_path / "data")
+    )
+    client = server.app.test_client()
+    response = client.get("/config")
+    assert depth_image_encoding in (
+        response.headers[DEPTH_IMAGE_ENCODINGS_HEADER].split(", ")
+    )
+
+    data = b"".join([
+        reader.user_information.serialize(),
+        snapshot.serialize(depth_image_encoding=depth_image_encoding),
+    ])
+    _, received = server.get_user_id_and_snapshot(data=data)
+    assert received == snapshot
+    response = client.post("/snapshot", data=data)
+    assert response.json == {"status": "success"}
+
+
+def test_snapshots_endpoint(tmp_path):  # noqa: ANN001
+    sample_path = tmp_path / "sample.mind"
+    sample_path.write_bytes(
+        protobuf_user_information() + protobuf_snapshot_list()
+    )
+    reader = Reader(url=f"protobuf://{sample_path}")
+    snapshots = list(reader)
+    server = Server(
+        host="127.0.0.1", port=5000, data_dir_path=str(tmp_path / "data")
+    )
+    user_information = reader.user_information.to_proto()
+    data = serialize_snapshot_batch(
+        user_information=user_information.SerializeToString(),
+        snapshots=[
+            snapshot.to_proto().SerializeToString() for snapshot in snapshots
+        ],
+    )
+    response = server.app.test_client().post("/snapshots", data=data)
+    assert response.json == {"status": "success", "snapshots": 2}
+    assert server.parsed_snapshots == 2
+    assert len(list((tmp_path / "data" / str(ID)).iterdir())) == 2
+
+
+def test_stream_endpoint(tmp_path):  # noqa: ANN001
+    sample_path = tmp_path / "sample.mind"
+    sample_path.write_bytes(
+        protobuf_user_information() + protobuf_snapshot_list()
+    )
+    reader = Reader(url=f"protobuf://{sample_path}")
+    snapshots = list(reader)
+    server = Server(
+        host="127.0.0.1", port=5000, data_dir_path=str(tmp_path / "data")
+    )
+    client = server.app.test_client()
+    assert "stream" in client.get("/config").headers[UPLOAD_ENDPOINTS_HEADER]
+    data = reader.user_information.serialize() + b"".join(
+        frame(proto_snapshot=snapshot.to_proto()) for snapshot in snapshots
+    )
+    response = client.post("/stream", data=data)
+    assert response.json == {"status": "success", "snapshots": 2}
+    assert server.parsed_snapshots == 2
+    assert len(list((tmp_path / "data" / str(ID)).iterdir())) == 2
+
+    # The snapshots before a truncated record are still processed.
+    response = client.post("/stream", data=data[:-1])
+    assert response.status_code == 400
+    assert response.json["snapshots"] == 1
+    assert server.parsed_snapshots == 3
+
+    # And so are the ones before a corrupt record.
+    response = client.post(
+        "/stream", data=data + struct.pack("<I", 2) + b"\xff\xff"
+    )
+    assert response.status_code == 400
+    assert response.json["snapshots"] == 2
+
+    # Records larger than the server accepts aren't read.
+    server.max_stream_record_size = max(
+        len(frame(proto_snapshot=snapshot.to_proto()))
+        for snapshot in snapshots
+    ) - 5
+    response = client.post("/stream", data=data)
+    assert response.status_code == 413
+    assert response.json["snapshots"] == 1
+
+
+def test_color_image_cache():
+    cache = ColorImageCache(size=2)
+    images = [bytes([i]) * 12 for i in range(3)]
+    hashes = [hash_color_image(color_image=image) for image in images]
+    # Images without hashes aren't kept.
+    assert cache.resolve(user_id=1, parsed=ColorImage(data=images[0]))
+    assert not cache.resolve(user_id=1, parsed=ColorImage(data_hash=hashes[0]))
+
+    for image, data_hash in zip(images[:2], hashes[:2]):
+        assert cache.resolve(
+            user_id=1, parsed=ColorImage(data=image, data_hash=data_hash)
+        )
+    parsed = ColorImage(data_hash=hashes[0])
+    assert cache.resolve(user_id=1, parsed=parsed)
+    assert parsed.data == images[0]
+    # Every user has a cache of their own.
+    assert not cache.resolve(user_id=2, parsed=ColorImage(data_hash=hashes[0]))
+
+    # The least recently used image is evicted.
+    assert cache.resolve(
+        user_id=1, parsed=ColorImage(data=images[2], data_hash=hashes[2])
+    )
+    assert not cache.resolve(user_id=1, parsed=ColorImage(data_hash=hashes[1]))
+    assert cache.resolve(user_id=1, parsed=ColorImage(data_hash=hashes[0]))
+
+    # Images that don't match their hashes aren't kept.
+    with pytest.raises(ColorImageHashMismatchError):
+        cache.resolve(
+            user_id=2, parsed=ColorImage(data=images[1], data_hash=hashes[0])
+        )
+    assert not cache.resolve(user_id=2, parsed=ColorImage(data_hash=hashes[0]))
+
+
+def test_color_image_cache_users():
+    cache = ColorImageCache(size=2, max_users=2)
+    image = bytes(12)
+    data_hash = hash_color_image(color_image=image)
+    for user_id in [1, 2]:
+        assert cache.resolve(
+            user_id=user_id, parsed=ColorImage(data=image, data_hash=data_hash)
+        )
+    # Users that are only asked about aren't kept.
+    assert not cache.resolve(user_id=3, parsed=ColorImage(data_hash=data_hash))
+    assert len(cache._images) == 2
+    # The images of the least recently active user are dropped.
+    assert cache.resolve(user_id=1, parsed=ColorImage(data_hash=data_hash))
+    assert cache.resolve(
+        user_id=3, parsed=ColorImage(data=image, data_hash=data_hash)
+    )
+    assert len(cache._images) == 2
+    assert not cache.resolve(user_id=2, parsed=ColorImage(data_hash=data_hash))
+    assert cache.resolve(user_id=1, parsed=ColorImage(data_hash=data_hash))
+
+
+def test_color_image_by_hash(tmp_path):  # noqa: ANN001
+    sample_path = tmp_path / "sample.mind"
+    sample_path.write_bytes(
+        protobuf_user_information() + protobuf_snapshot_list()
+    )
+    reader = Reader(url=f"protobuf://{sample_path}")
+    snapshot = next(iter(reader))
+    server = Server(
+        host="127.0.0.1", port=5000, data_dir_path=str(tmp_path / "data")
+    )
+    client = server.app.test_client()
+    assert int(client.get("/config").headers[COLOR_IMAGE_CACHE_SIZE_HEADER])
+
+    color_image_hash = hash_color_image(color_image=snapshot.color_image)
+    data_by_hash = b"".join([
+        reader.user_information.serialize(),
+        frame(
+            proto_snapshot=snapshot.to_proto(
+                color_image_hash=color_image_hash, color_image_by_hash=True
+            )
+        ),
+    ])
+    # The server doesn't have the image yet.
+    response = client.post("/snapshot", data=data_by_hash)
+    assert response.status_code == 409
+    assert server.parsed_snapshots == 0
+
+    data = b"".join([
+        reader.user_information.serialize(),
+        frame(
+            proto_snapshot=snapshot.to_proto(color_image_hash=color_image_hash)
+        ),
+    ])
+    assert client.post("/snapshot", data=data).status_code == 200
+    _, received = server.get_user_id_and_snapshot(data=data_by_hash)
+    assert received == snapshot
+    assert client.post("/snapshot", data=data_by_hash).status_code == 200
+    assert server.parsed_snapshots == 2
+
+    # Compressed images are hashed as they are sent.
+    jpeg_data = b"".join([
+        reader.user_information.serialize(),
+        frame(
+            proto_snapshot=snapshot.to_proto(
+                color_image_hash=hash_color_image(
+                    color_image=snapshot.get_encoded_color_image(format="jpeg")
+                ),
+                color_image_format="jpeg",
+            )
+        ),
+    ])
+    assert client.post("/snapshot", data=jpeg_data).status_code == 200
+    # An image sent under another image's hash is rejected.
+    assert client.post("/snapshot", data=b"".join([
+        reader.user_information.serialize(),
+        frame(
+            proto_snapshot=snapshot.to_proto(
+                color_image_hash=color_image_hash, color_image_format="jpeg"
+            )
+        ),
+    ])).status_code == 400
+    assert server.parsed_snapshots == 3
+
+
+def test_compressed_color_image_passthrough(tmp_path):  # noqa: ANN001
+    sample_path = tmp_path / "sample.mind"
+    sample_path.write_bytes(
+        protobuf_user_information() + protobuf_snapshot_list()
+    )
+    reader = Reader(url=f"protobuf://{sample_path}")
+    snapshot = next(iter(reader))
+    server = Server(
+        host="127.0.0.1", port=5000, data_dir_path=str(tmp_path / "data")
+    )
+    client = server.app.test_client()
+    assert "jpeg" in (
+        client.get("/config").headers[COLOR_IMAGE_FORMATS_HEADER].split(", ")
+    )
+
+    proto_snapshot = snapshot.to_proto(color_image_format="jpeg")
+    data = b"".join([
+        reader.user_information.serialize(),
+        frame(proto_snapshot=proto_snapshot),
+    ])
+    assert client.post("/snapshot", data=data).status_code == 200
+    [color_image_path] = (tmp_path / "data").rglob("color_image.jpg")
+    # Written as it was sent, without being decoded.
+    assert color_image_path.read_bytes() == proto_snapshot.color_image.data
+
+
+@pytest.mark.parametrize("color_image", [
+    # Of a format the server doesn't know.
+    {"format": 3},
+    # A JPEG file whose dimensions aren't the ones it is sent with.
+    {"width": 1},
+])
+def test_invalid_color_image(tmp_path, color_image: dict):  # noqa: ANN001
+    sample_path = tmp_path / "sample.mind"
+    sample_path.write_bytes(
+        protobuf_user_information() + protobuf_snapshot_list()
+    )
+    reader = Reader(url=f"protobuf://{sample_path}")
+    snapshot = next(iter(reader))
+    server = Server(
+        host="127.0.0.1", port=5000, data_dir_path=str(tmp_path / "data")
+    )
+    client = server.app.test_client()
+
+    proto_snapshot = snapshot.to_proto(color_image_format="jpeg")
+    for name, value in color_image.items():
+        setattr(proto_snapshot.color_image, name, value)
+    data = b"".join([
+        reader.user_information.serialize(),
+        frame(proto_snapshot=proto_snapshot),
+    ])
+    response = client.post("/snapshot", data=data)
+    assert response.status_code == 400
+    assert response.json["error"] == "Invalid color image."
+    # A batch is rejected whole, its valid snapshots included.
+    batch_data = serialize_snapshot_batch(
+        user_information=(
+            reader.user_information.to_proto().SerializeToString()
+        ),
+        snapshots=[
+            snapshot.to_proto().SerializeToString(),
+            proto_snapshot.SerializeToString(),
+        ],
+    )
+    response = client.post("/snapshots", data=batch_data)
+    assert response.status_code == 400
+    assert response.json["error"] == "Invalid color image."
+    assert server.parsed_snapshots == 0
+
+
+@pytest.mark.parametrize("field, name, value", [
+    # Packed pixels that aren't a whole number of 32-bit floats.
+    ("depth_image", "packed_data", b"\x00" * 5),
+    # Fewer pixels than the depth image's dimensions tell.
+    ("depth_image", "width", 100),
+    ("user_information", "gender", 5),
+])
+def test_invalid_snapshot(
+    tmp_path, field: str, name: str, value: object  # noqa: ANN001
+):
+    sample_path = tmp_path / "sample.mind"
+    sample_path.write_bytes(
+        protobuf_user_information() + protobuf_snapshot_list()
+    )
+    reader = Reader(url=f"protobuf://{sample_path}")
+    snapshot = next(iter(reader))
+    server = Server(
+        host="127.0.0.1", port=5000, data_dir_path=str(tmp_path / "data")
+    )
+    client = server.app.test_client()
+
+    proto_user_information = reader.user_information.to_proto()
+    proto_snapshot = snapshot.to_proto()
+    messages = {
+        "user_information": proto_user_information,
+        "depth_image": proto_snapshot.depth_image,
+    }
+    setattr(messages[field], name, value)
+    user_information = proto_user_information.SerializeToString()
+    data = b"".join([
+        struct.pack("<I", len(user_information)),
+        user_information,
+        frame(proto_snapshot=proto_snapshot),
+    ])
+    response = client.post("/snapshot", data=data)
+    assert response.status_code == 400
+    assert response.json["error"] == "Invalid snapshot."
+    batch_data = serialize_snapshot_batch(
+        user_information=user_information,
+        snapshots=[proto_snapshot.SerializeToString()],
+    )
+    response = client.post("/snapshots", data=batch_data)
+    assert response.status_code == 400
+    assert response.json["error"] == "Invalid snapshot."
+    assert server.parsed_snapshots == 0
+
+
+def test_config_revalidation(tmp_path):  # noqa: ANN001
+    server = Server(
+        host="127.0.0.1", port=5000, data_dir_path=str(tmp_path / "data")
+    )
+    client = server.app.test_client()
+    response = client.get("/config")
+    assert response.json == server.supported_fields
+    assert "max-age" in response.headers["Cache-Control"]
+    etag = response.headers["ETag"]
+    response = client.get("/config", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
@@ -1,5 +1,8 @@
 import random
 import struct
+import tracemalloc
+
+import numpy as np
 
 from project_pb2 import (
     ColorImage,
@@ -7,19 +10,29 @@ from project_pb2 import (
     Feelings,
     Pose,
     ProtoSnapshot,
+    ProtoSnapshotBatch,
+    ProtoUserInformation,
 )
 
 import pytest
 
 from src.snapshot import (
+    COLOR_IMAGE_FORMATS,
     EMPTY_COLOR_IMAGE,
     EMPTY_DEPTH_IMAGE,
     EMPTY_DIM,
     EMPTY_FEELINGS,
     EMPTY_ROTATION,
     EMPTY_TRANSLATION,
-    Snapshot
+    InvalidColorImageError,
+    LazySnapshot,
+    Snapshot,
+    decode_depth_image,
+    encode_depth_image,
+    hash_color_image,
+    serialize_snapshot_batch,
 )
+from src.utils import swap_red_and_blue
 
 from .test_utils import (
     COLOR_IMAGE_1,
@@ -227,3 +240,239 @@ def test_clone_by_supported_fields(snapshot: Snapshot):
 
 def test_from_parsed(snapshot: Snapshot, proto_snapshot: ProtoSnapshot):
     assert Snapshot.from_parsed(parsed=proto_snapshot) == snapshot
+
+
+def test_deferred_color_channel_swap(snapshot: Snapshot):
+    bgr = swap_red_and_blue(COLOR_IMAGE_1)
+    bgr_snapshot = Snapshot(
+        timestamp=TIMESTAMP_1,
+        translation=TRANSLATION_1,
+        rotation=ROTATION_1,
+        color_image_width=COLOR_IMAGE_WIDTH_1,
+        color_image_height=COLOR_IMAGE_HEIGHT_1,
+        color_image=bgr,
+        depth_image_width=DEPTH_IMAGE_WIDTH_1,
+        depth_image_height=DEPTH_IMAGE_HEIGHT_1,
+        depth_image=DEPTH_IMAGE_1,
+        feelings=FEELINGS_1,
+        color_image_order="bgr",
+    )
+    assert bgr_snapshot.get_color_image(order="bgr") == bgr
+    assert bgr_snapshot.color_image_order == "bgr"
+    assert bgr_snapshot.color_image == COLOR_IMAGE_1
+    assert bgr_snapshot.color_image_order == "rgb"
+    assert bgr_snapshot.get_color_image(order="bgr") == bgr
+    assert bgr_snapshot == snapshot
+    assert bgr_snapshot.serialize() == snapshot.serialize()
+
+
+def test_lazy_snapshot(snapshot: Snapshot, proto_snapshot: ProtoSnapshot):
+    data = proto_snapshot.SerializeToString()
+    lazy_snapshot = LazySnapshot.from_serialized(data=data)
+    assert isinstance(lazy_snapshot, LazySnapshot)
+    assert lazy_snapshot._depth_image is None
+    assert lazy_snapshot == snapshot
+    assert lazy_snapshot.serialize() == snapshot.serialize()
+
+
+def test_lazy_snapshot_unpacked_depth_image(snapshot: Snapshot):
+    # Field 4 (the depth image) with its width, height and pixels, the latter
+    # written one by one as older encoders may do.
+    dimensions = bytes(
+        [0x08, DEPTH_IMAGE_WIDTH_1, 0x10, DEPTH_IMAGE_HEIGHT_1]
+    )
+    pixels = b"".join(
+        b"\x1d" + struct.pack("<f", pixel) for pixel in DEPTH_IMAGE_1
+    )
+    depth_image = b"".join([dimensions, pixels])
+    without_depth_image = snapshot.clone_by_supported_fields(
+        supported_fields=("translation", "rotation", "color_image", "feelings")
+    ).serialize()[4:]
+    data = b"".join(
+        [without_depth_image, bytes([0x22, len(depth_image)]), depth_image]
+    )
+    parsed_snapshot = LazySnapshot.from_serialized(data=data)
+    assert not isinstance(parsed_snapshot, LazySnapshot)
+    assert parsed_snapshot == snapshot
+
+
+def test_lazy_snapshot_hashed_color_image(snapshot: Snapshot):
+    # The color image's `data_hash` shares its field number with the depth
+    # image's `packed_data`, but isn't a second buffer of pixels.
+    color_image_hash = hash_color_image(color_image=snapshot.color_image)
+    data = snapshot.to_proto(
+        color_image_hash=color_image_hash
+    ).SerializeToString()
+    lazy_snapshot = LazySnapshot.from_serialized(data=data)
+    assert isinstance(lazy_snapshot, LazySnapshot)
+    assert lazy_snapshot.color_image == snapshot.color_image
+    assert lazy_snapshot == snapshot
+
+
+def test_snapshot_memory():
+    # A depth image of the headset's resolution, without a color image,
+    # which is kept as compact `bytes` either way.
+    width, height = 224, 172
+    proto_snapshot = ProtoSnapshot(
+        datetime=TIMESTAMP_1,
+        depth_image=DepthImage(
+            width=width,
+            height=height,
+            data=np.random.rand(width * height).astype("<f4"),
+        ),
+    )
+
+    tracemalloc.start()
+    try:
+        snapshots = [
+            Snapshot.from_parsed(parsed=proto_snapshot) for _ in range(10)
+        ]
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # Attributes are slots, rather than a dictionary per snapshot.
+    assert not hasattr(snapshots[0], "__dict__")
+    # Each snapshot takes its depth image as float32 pixels, and little
+    # more: its timestamp, pose and feelings, and the array's header.
+    overhead = size / len(snapshots) - 4 * width * height
+    assert overhead < 1024
+
+
+def test_project(snapshot: Snapshot):
+    supported_fields = ("translation", "color_image", "feelings")
+    projection = snapshot.project(fields=supported_fields)
+    clone = snapshot.clone_by_supported_fields(
+        supported_fields=supported_fields
+    )
+    for attribute in [
+        "timestamp",
+        "translation",
+        "rotation",
+        "color_image_width",
+        "color_image_height",
+        "color_image",
+        "depth_image_width",
+        "depth_image_height",
+        "feelings",
+    ]:
+        assert projection[attribute] == clone[attribute]
+    assert np.array_equal(projection.depth_image, clone.depth_image)
+    # The buffers are shared.
+    assert projection.color_image is snapshot.color_image
+    assert Snapshot.from_parsed(
+        parsed=ProtoSnapshot.FromString(projection.serialize()[4:])
+    ) == clone
+    # Fields that aren't set aren't serialized at all.
+    assert not ProtoSnapshot.FromString(
+        projection.serialize()[4:]
+    ).HasField("depth_image")
+
+
+def test_packed_depth_image(snapshot: Snapshot):
+    data = snapshot.serialize(depth_image_encoding="packed")[4:]
+    parsed = ProtoSnapshot.FromString(data)
+    assert len(parsed.depth_image.data) == 0
+    assert parsed.depth_image.packed_data == struct.pack(
+        f"<{len(DEPTH_IMAGE_1)}f", *DEPTH_IMAGE_1
+    )
+    assert Snapshot.from_parsed(parsed=parsed) == snapshot
+    assert LazySnapshot.from_serialized(data=data) == snapshot
+
+
+@pytest.mark.parametrize(
+    "encoding, tolerance", [("float16", 1e-3), ("uint16_mm", 5e-4)]
+)
+def test_quantized_depth_image(
+    snapshot: Snapshot, encoding: str, tolerance: float
+):
+    depth_image = np.array([0.0, 0.5004, 1.2345, 3.9], dtype="<f4")
+    snapshot.depth_image = depth_image
+    data = snapshot.serialize(depth_image_encoding=encoding)[4:]
+    parsed = ProtoSnapshot.FromString(data)
+    # Two bytes per pixel instead of four.
+    assert len(parsed.depth_image.packed_data) == 2 * len(depth_image)
+    received = Snapshot.from_parsed(parsed=parsed).depth_image
+    assert received.dtype == np.float32
+    assert np.allclose(received, depth_image, rtol=tolerance, atol=tolerance)
+    # The lazy snapshot falls back to parsing, since the pixels aren't
+    # 32-bit floats.
+    assert np.array_equal(
+        LazySnapshot.from_serialized(data=data).depth_image, received
+    )
+
+
+def test_encode_depth_image_in_millimetres():
+    depth_image = np.array([-1.0, np.nan, 0.0015, 70.0], dtype="<f4")
+    packed_data = encode_depth_image(
+        depth_image=depth_image, encoding="uint16_mm"
+    )
+    assert struct.unpack("<4H", packed_data) == (0, 0, 2, 65535)
+    assert list(
+        decode_depth_image(
+            parsed=DepthImage(
+                packed_data=packed_data,
+                packed_encoding=DepthImage.UINT16_MILLIMETRES,
+            )
+        )
+    ) == pytest.approx([0.0, 0.0, 0.002, 65.535])
+
+
+@pytest.mark.parametrize("color_image_format", ["jpeg", "png"])
+def test_compressed_color_image(
+    snapshot: Snapshot, color_image_format: str
+):
+    data = snapshot.to_proto(
+        color_image_format=color_image_format
+    ).SerializeToString()
+    parsed = ProtoSnapshot.FromString(data)
+    assert parsed.color_image.format != ColorImage.RAW
+    received = Snapshot.from_parsed(parsed=parsed)
+    assert received.color_image_format == color_image_format
+    # Passed on as is, without being compressed again.
+    assert received.get_encoded_color_image(
+        format=color_image_format
+    ) == parsed.color_image.data
+    # Decoded on first access.
+    assert len(received.color_image) == len(COLOR_IMAGE_1)
+    assert received.color_image_format == "raw"
+    assert LazySnapshot.from_serialized(data=data).color_image == (
+        received.color_image
+    )
+    if color_image_format == "png":
+        assert received == snapshot
+
+
+def test_invalid_color_image(snapshot: Snapshot):
+    parsed = snapshot.to_proto(color_image_format="png")
+    parsed.color_image.height += 1
+    with pytest.raises(InvalidColorImageError):
+        Snapshot.from_parsed(parsed=parsed)
+    # Images read from a sample are checked when they are decoded.
+    with pytest.raises(ValueError):
+        LazySnapshot.from_serialized(
+            data=parsed.SerializeToString()
+        ).color_image
+    parsed.color_image.data = b"not an image"
+    with pytest.raises(InvalidColorImageError):
+        Snapshot.from_parsed(parsed=parsed)
+    # An unknown format is rejected, rather than looked up out of range.
+    parsed = snapshot.to_proto()
+    parsed.color_image.format = len(COLOR_IMAGE_FORMATS)
+    with pytest.raises(InvalidColorImageError):
+        Snapshot.from_parsed(parsed=parsed)
+
+
+def test_serialize_snapshot_batch(snapshot: Snapshot):
+    user_information = ProtoUserInformation(user_id=ID, username=NAME)
+    snapshots = [
+        snapshot.to_proto(),
+        snapshot.to_proto(fields=("feelings",)),
+    ]
+    assert serialize_snapshot_batch(
+        user_information=user_information.SerializeToString(),
+        snapshots=[
+            proto_snapshot.SerializeToString() for proto_snapshot in snapshots
+        ],
+    ) == ProtoSnapshotBatch(
+        user_information=user_information, snapshots=snapshots
+    ).SerializeToString()